@@ -1,11 +1,22 @@
 # -*- coding: utf-8 -*-
 
-from .testing import HttpTestServer, HttpsTestServer, SmtpTestServer
-from .smtp_server import SmtpServer, start_smtp_server, smtp_server
+from ._compat import PY2
+from .testing import HttpTestServer, HttpsTestServer
 from .http_server import (Server, start_server, start_ssl_server, http_server,
                           https_server, HttpResponse)
+from .cluster import ServerCluster, start_cluster, http_cluster
 
 
 __all__ = ['HttpTestServer', 'HttpsTestServer', 'Server', 'HttpResponse',
            'start_server', 'start_ssl_server', 'http_server', 'https_server',
-           'SmtpServer', 'start_smtp_server', 'smtp_server', 'SmtpTestServer']
+           'ServerCluster', 'start_cluster', 'http_cluster']
+
+
+if not PY2:
+    from .testing import AsyncHttpTestServer, SmtpTestServer
+    from .async_server import AsyncServer, start_async_server, async_http_server
+    from .smtp_server import SmtpServer, start_smtp_server, smtp_server
+
+    __all__ += ['AsyncHttpTestServer', 'AsyncServer', 'start_async_server',
+                'async_http_server', 'SmtpServer', 'start_smtp_server',
+                'smtp_server', 'SmtpTestServer']
@@ -1,20 +1,26 @@
 import sys
-import collections
+
+try:
+    from collections.abc import Mapping
+except ImportError:  # python 2
+    from collections import Mapping
 
 
 PY2 = sys.version_info[0] == 2
 
 
 if PY2:
+    from Queue import Queue, Full
     from SocketServer import ThreadingMixIn
     from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
 else:
+    from queue import Queue, Full
     from socketserver import ThreadingMixIn
     from http.server import HTTPServer, BaseHTTPRequestHandler
 
 
 def iteritems(iterable):
-    if isinstance(iterable, collections.Mapping):
+    if isinstance(iterable, Mapping):
         return iterable.iteritems() if PY2 else iterable.items()
     else:
         return iterable
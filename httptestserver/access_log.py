@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Access log
+----------
+
+Sampled access log of the requests served, written from a background
+thread.
+
+Serving a request only puts its record in a queue, formatting and writing
+it is left to a :class:`logging.handlers.QueueListener`, so it adds almost
+nothing to the request latency. Records are written as compact JSON
+objects, one per line (wrapped below):
+
+.. code::
+
+    >>> access_log = AccessLog('access.log', sample=0.1)
+    >>> server = start_server(quiet=True, access_log=access_log)
+    >>> requests.get(server.url('/users/1'))
+
+    {"t":1700000000.123,"client":"127.0.0.1","method":"GET","path":"/users/1",
+     "route":"GET /users/{id}","status":200,"length":4,"ms":0.412}
+
+Along with the ``quiet`` server option, which skips the info logs of every
+request and the access lines written to `stderr`, it is the cheapest way to
+keep track of the requests served at high rates.
+"""
+import json
+import random
+import logging
+from threading import Lock
+from logging.handlers import QueueListener
+
+from ._compat import Queue, Full
+
+
+DEFAULT_QUEUE_SIZE = 10000  # records waiting to be written, new ones dropped
+LOGGER = 'httptestserver.access'
+MESSAGE = '%(client)s %(method)s %(path)s %(status)s %(length)s %(ms)sms'
+
+
+class AccessFormatter(logging.Formatter):
+    """Formats access records as compact JSON objects"""
+    def format(self, record):
+        entry = {'t': round(record.created, 3)}
+        entry.update(record.args)
+        return json.dumps(entry, separators=(',', ':'))
+
+
+class AccessLog(object):
+    """Access log of the servers created with it as their *access_log*
+
+    A server starts the log as it starts and stops it as it stops, the log
+    can be shared by several servers.
+    """
+    def __init__(self, target=None, sample=1.0, seed=None,
+                 queue_size=DEFAULT_QUEUE_SIZE):
+        """
+        :param target: *(default: stderr)* Path of the file to write to, or
+         a :class:`logging.Handler`. Handlers without a formatter get an
+         :class:`AccessFormatter`.
+        :param sample: *(default: 1.0)* Fraction of the requests logged.
+        :param seed: *(default: None)* Seed of the sampling, so the same
+         requests are logged on every run.
+        :param queue_size: *(default: 10000)* Max number of records waiting
+         to be written, new ones are dropped and counted in :attr:`dropped`.
+        """
+        if isinstance(target, logging.Handler):
+            self.handler = target
+        elif target is None:
+            self.handler = logging.StreamHandler()
+        else:
+            self.handler = logging.FileHandler(target)
+        if self.handler.formatter is None:
+            self.handler.setFormatter(AccessFormatter())
+
+        self.sample = sample
+        self.dropped = 0
+        self._random = random.Random(seed)
+        self._queue = Queue(maxsize=queue_size)
+        self._listener = QueueListener(self._queue, self.handler)
+        self._users = 0
+        self._lock = Lock()
+
+    def record(self, client_address, method, path, route, status, length,
+               seconds):
+        """Queues the record of a request served, if it is sampled"""
+        if self.sample < 1 and self._random.random() >= self.sample:
+            return
+
+        record = logging.LogRecord(LOGGER, logging.INFO, __file__, 0, MESSAGE,
+                                   ({'client': client_address[0],
+                                     'method': method,
+                                     'path': path,
+                                     'route': route,
+                                     'status': status,
+                                     'length': length,
+                                     'ms': round(seconds * 1000, 3)},), None)
+        try:
+            self._queue.put_nowait(record)
+        except Full:
+            with self._lock:
+                self.dropped += 1
+
+    def start(self):
+        """Starts writing records, once for all the servers using the log"""
+        with self._lock:
+            self._users += 1
+            if self._users == 1:
+                self._listener.start()
+
+    def stop(self):
+        """Writes the records queued and stops once no server uses the log"""
+        with self._lock:
+            if not self._users:
+                return
+            self._users -= 1
+            if not self._users:
+                self._listener.stop()
+                self.handler.flush()
+
+    def __repr__(self):
+        return '<AccessLog sample {}>'.format(self.sample)
@@ -0,0 +1,540 @@
+# -*- coding: utf-8 -*-
+"""
+Async Server
+------------
+
+HTTP python server running on an :mod:`asyncio` event loop which exposes the
+same behaviour as :class:`~httptestserver.http_server.Server`.
+
+Every connection is served from a single background thread, so thousands of
+concurrent keep-alive connections can be kept open without spawning a thread
+for each one of them.
+
+.. code::
+
+    >>> server = start_async_server()
+    >>> server.data['response_content'] = b'this is response body text'
+    >>> response = requests.get(server.url('/test'))
+    >>> response.content
+    'this is response body text'
+"""
+import io
+import time
+import socket
+import asyncio
+import logging
+import functools
+import contextlib
+from http.client import parse_headers
+from threading import Thread, Event
+
+from ._compat import iteritems, BaseHTTPRequestHandler
+from .body import parse_chunk_size, DEFAULT_CHUNK_SIZE
+from .content import (is_stream, stream_headers, is_chunked, open_content,
+                      content_length, iter_content, encode_chunks)
+from .cache import response_key, SerializedResponse
+from .history import PhaseTimings
+from .http_server import (DEFAULT_HOST, DEFAULT_PORT, DEFAULT_IDLE_TIMEOUT,
+                          ServerState, RequestHandlerMixin, HttpResponse)
+
+
+log = logging.getLogger('httptestserver.async')
+
+DEFAULT_BACKLOG = socket.SOMAXCONN  # pending connections in the listen queue
+DEFAULT_LIMIT = 2 ** 16             # max bytes of request line + headers
+
+
+def start_async_server(host=None, port=None, **kwargs):
+    """Create a started asyncio HTTP server listening in *host*:*port*
+
+    :param host: *(default: 127.0.0.1)* Host for the server to listen.
+    :param port: *(default: random)* Port of the server to listen (should not be in use).
+    :param kwargs: Extra options for :class:`AsyncServer`.
+    :returns: A created and started :class:`AsyncServer`
+    """
+    return AsyncServer.start_server(host or DEFAULT_HOST, port or DEFAULT_PORT,
+                                    **kwargs)
+
+
+class AsyncHandler(RequestHandlerMixin, object):
+    """Handles a single request of an asyncio connection
+
+    Mirrors :class:`~httptestserver.http_server.Handler`: requests are served
+    with the :attr:`AsyncServer.config` snapshot taken when they start, and
+    request attributes (``command``, ``path``, ``request_version``,
+    ``headers``, ``body``...) are kept in :attr:`request_data`, copied to
+    :attr:`AsyncServer.data` and saved in :attr:`AsyncServer.history`.
+
+    Hooks are run inside the event loop, so a blocking hook delays every
+    other connection of the server.
+
+    Requests are logged at info level, unless the server is *quiet*.
+    """
+    protocol_version = 'HTTP/1.1'
+    server_version = 'httptestserver'
+    responses = BaseHTTPRequestHandler.responses
+
+    def __init__(self, server, reader, writer, client_address):
+        self.server = server
+        self.rfile = reader
+        self.wfile = writer
+        self.client_address = client_address
+        self.close_connection = True
+        self.command = None
+        self.output = []  # response data pending to be flushed
+        self.stream = None  # content streamed after the output
+        self.shaper = None
+        self.route = None
+        self.params = None
+        self.timings = None
+        self.config = None
+        self.request_data = None
+
+    async def parse_request(self):
+        """Reads the request line and headers from the connection
+
+        :raises ValueError: If the request line is malformed.
+        :raises asyncio.IncompleteReadError: If the client closes the
+         connection.
+        """
+        raw = await self.rfile.readuntil(b'\r\n\r\n')
+        requestline, _, raw_headers = raw.partition(b'\r\n')
+
+        self.raw_requestline = requestline
+        self.requestline = requestline.decode('iso-8859-1')
+        words = self.requestline.split()
+        if len(words) != 3 or not words[2].startswith('HTTP/'):
+            raise ValueError('Bad request line: {!r}'.format(self.requestline))
+
+        self.timings = PhaseTimings()
+        self.body = None
+        self.command, self.path, self.request_version = words
+        self.headers = parse_headers(io.BytesIO(raw_headers))
+
+        connection = self.headers.get('Connection', '').lower()
+        if self.request_version >= 'HTTP/1.1':
+            self.close_connection = connection == 'close'
+        else:
+            self.close_connection = connection != 'keep-alive'
+
+    async def handle_request(self):
+        """Handles server request/response"""
+        self.verbose = not self.server.quiet and log.isEnabledFor(logging.INFO)
+        if self.verbose:
+            log.info('Processing %s request', self.command)
+        self.timestamp = time.time()
+        timings = self.timings
+        timings.mark('parse')
+        self.take_config()
+        self.shaper = self.create_shaper()
+
+        self.server.process_hook('before_request')
+        timings.mark('before_request')
+        if not await self.read_content():  # Read request body
+            return
+        timings.mark('read_content')
+        self.update_state()           # Save server current state
+        timings.mark('update_state')
+        entry = self.save_history()   # Save current state in history
+        timings.mark('save_history')
+
+        self.server.process_hook('before_response', self.request_data)
+        timings.mark('before_response')
+        response = await self.process_request()
+        timings.mark('process_request')
+        self.server.process_hook('after_response', self.request_data, response)
+        self.save_response(entry, response)
+        timings.mark('after_response')
+
+        self.send_http_response(response)
+        timings.mark('send_response')
+        self.server.process_hook('after_request', self.request_data, response)
+        timings.mark('after_request')
+        self.finish_request()
+
+        timings.mark('finish_request')
+        self.observe(response)
+
+        # Response is only flushed once server state and stats are final, so
+        # a client reading the response always finds the server ready.
+        await self.flush()
+
+    async def read_content(self):
+        """Reads the request body (if any), it must be consumed whatever the
+        method is so the next request on the connection can be parsed
+
+        :returns: `False` if the body is malformed, in which case a 400
+         error is sent and the connection closed.
+        """
+        self.body = None
+        content_length = self.headers['Content-Length']
+        try:
+            if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+                if self.verbose:
+                    log.info('Transfer-Encoding: chunked')
+                self.body = await self.read_body(self.iter_chunks())
+            elif content_length is not None:
+                if self.verbose:
+                    log.info('Content-Length: %s', content_length)
+                self.body = await self.read_body(
+                    self.iter_content(int(content_length)))
+            else:
+                return True
+        except ValueError:
+            log.warning('Malformed request body from %s:%d',
+                        *self.client_address[:2])
+            await self.send_error(400)
+            return False
+        self.request_data['body'] = self.body
+        return True
+
+    async def read_body(self, chunks):
+        body, callback = self.server.create_body(), self.chunk_callback()
+        async for chunk in chunks:
+            body.write(chunk)
+            if callback is not None:
+                callback(chunk)
+        return body.finish()
+
+    async def iter_content(self, length):
+        while length > 0:
+            chunk = await self.rfile.readexactly(min(DEFAULT_CHUNK_SIZE, length))
+            length -= len(chunk)
+            if self.shaper is not None:
+                await asyncio.sleep(self.shaper.read_delay(len(chunk)))
+            yield chunk
+
+    async def iter_chunks(self):
+        # See httptestserver.body.iter_chunks
+        while True:
+            remaining = parse_chunk_size(await self.rfile.readline())
+            if remaining == 0:
+                break
+
+            async for chunk in self.iter_content(remaining):
+                yield chunk
+
+            if (await self.rfile.readline()).strip():
+                raise ValueError('Chunk data is longer than announced')
+
+        while (await self.rfile.readline()).strip():
+            pass  # trailers
+
+    async def process_request(self):
+        # Simulate timeouts
+        timeout = self.match_route()
+        if timeout is not None:
+            if self.verbose:
+                log.info('Server sleeping for: %d s', timeout)
+            await asyncio.sleep(timeout)
+
+        return self.create_response()
+
+    def send_http_response(self, response):
+        if self.verbose:
+            log.info('Server returning status code %d', response.status)
+        if is_stream(response.content):
+            return self.send_stream_head(response)
+
+        cache, key = self.server.response_cache, None
+        if cache is not None and self.is_static(response):
+            key = response_key(response, self.close_connection,
+                               self.command == 'HEAD')
+        if key is None:
+            entry = self.serialize_response(response)
+        else:
+            entry = cache.get(key, functools.partial(
+                self.serialize_response, response))
+        self.output.append(entry.render())
+
+    def serialize_response(self, response):
+        """Serializes a response with `bytes` content, see
+        :class:`~httptestserver.cache.SerializedResponse`"""
+        content = response.content or b''
+        head, tail = self.serialize_head(
+            response.status, iteritems(response.headers), len(content))
+        if self.command == 'HEAD':
+            content = b''
+        return SerializedResponse(head, tail + content, response.content)
+
+    def send_stream_head(self, response):
+        content = response.content
+        headers = list(iteritems(response.headers))
+        headers.extend(stream_headers(
+            headers, content, self.request_version >= 'HTTP/1.1'))
+        if content_length(content) is None and not is_chunked(headers):
+            self.close_connection = True  # content ends with connection
+
+        head, tail = self.serialize_head(response.status, headers)
+        self.output.append(SerializedResponse(head, tail).render())
+        if self.command != 'HEAD':
+            # Streamed once the head is flushed, settings are kept now
+            # as server data might be reset before
+            self.stream = (content, is_chunked(headers),
+                           self.request_data.get('response_chunk_size',
+                                                 DEFAULT_CHUNK_SIZE),
+                           self.request_data.get('response_chunk_delay'))
+
+    def serialize_head(self, status, headers, length=None):
+        """Status line and headers, split around the ``Date`` header
+
+        Adds the ``Content-Length`` of a content of *length* bytes and the
+        ``Connection`` header, unless given in *headers*.
+
+        :returns: A `(head, tail)` tuple of `bytes`.
+        """
+        head = '{}\r\nServer: {}\r\n'.format(self.status_line(status),
+                                              self.server_version)
+        lines, names = [], set()
+        for field, value in headers:
+            names.add(field.lower())
+            lines.append('{}: {}\r\n'.format(field, value))
+
+        framed = names & set(['content-length', 'transfer-encoding'])
+        if length is not None and not framed:
+            lines.append('Content-Length: {}\r\n'.format(length))
+        if self.close_connection and 'connection' not in names:
+            lines.append('Connection: close\r\n')
+        lines.append('\r\n')
+
+        return (head.encode('iso-8859-1'),
+                ''.join(lines).encode('iso-8859-1'))
+
+    async def send_error(self, status):
+        self.close_connection = True
+        self.send_http_response(HttpResponse(status, (), None))
+        await self.flush()
+
+    async def flush(self):
+        output = b''.join(self.output)
+        del self.output[:]
+        await self.write(output)
+
+        if self.stream is not None:
+            stream, self.stream = self.stream, None
+            await self.send_stream(*stream)
+
+    async def send_stream(self, content, chunked, chunk_size, delay):
+        """Sends a path, a file or an iterable content, waiting for the
+        client to read each chunk before sending the next one"""
+        with open_content(content) as content:
+            length = content_length(content)
+            if length is not None and not chunked and self.shaper is None:
+                return await self.send_file(content, length, chunk_size, delay)
+
+            chunks = iter_content(content, chunk_size)
+            if chunked:
+                chunks = encode_chunks(chunks)
+            for index, chunk in enumerate(chunks):
+                if index and delay:
+                    await asyncio.sleep(delay)
+                await self.write(chunk)
+
+    async def send_file(self, file, length, chunk_size, delay):
+        """Sends *length* bytes of *file* with :meth:`loop.sendfile`"""
+        if self.verbose:
+            log.info('Server sending file: %d bytes', length)
+        offset, sent = file.tell(), 0
+        count = chunk_size if delay else length
+        while sent < length:
+            if sent and delay:
+                await asyncio.sleep(delay)
+            chunk = await self.server.loop.sendfile(
+                self.wfile.transport, file, offset + sent,
+                min(count, length - sent))
+            if not chunk:
+                break  # file truncated
+            sent += chunk
+
+    async def write(self, data):
+        """Writes *data* throttled by the request shaper, waiting for the
+        client to read it"""
+        if self.shaper is None:
+            self.wfile.write(data)
+            return await self.wfile.drain()
+
+        for delay, piece in self.shaper.write_schedule(data):
+            if delay:
+                await asyncio.sleep(delay)
+            self.wfile.write(piece)
+            await self.wfile.drain()
+
+    def status_line(self, status):
+        reason = self.responses.get(status, ('',))[0]
+        return '{} {} {}'.format(self.protocol_version, status, reason)
+
+
+
+class AsyncServer(ServerState, Thread):
+    """HTTP Server powered by an :mod:`asyncio` event loop
+
+    Starts in a child thread which runs the event loop, every connection is
+    handled as a coroutine of that loop instead of a new thread, keeping
+    HTTP/1.1 connections alive until the client closes them or they remain
+    idle for *idle_timeout* seconds.
+
+    Exposes the same :attr:`data`, :attr:`history`, :attr:`hooks`,
+    :attr:`connection_stats` and :meth:`url` api than
+    :class:`~httptestserver.http_server.Server`.
+    """
+    def __init__(self, host, port, scheme='http', handler=AsyncHandler,
+                 backlog=DEFAULT_BACKLOG, limit=DEFAULT_LIMIT,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT, max_requests=None,
+                 **kwargs):
+        """Creates a new :class:`AsyncServer`
+
+        :param host: Host for the server to listen.
+        :param port: Port of the server to listen (should free).
+        :param scheme: *(default: http)* Scheme used to compose urls.
+        :param handler: (default: :class:`AsyncHandler`) Request handler class.
+        :param backlog: *(default: SOMAXCONN)* Size of the listen queue.
+        :param limit: *(default: 64KiB)* Max size of request line and headers,
+         it bounds the memory used by each connection buffer.
+        :param idle_timeout: *(default: 60)* Seconds to wait for a new request
+         on an open connection. `None` waits forever.
+        :param max_requests: *(default: None)* Number of requests after which
+         a connection is closed, unlimited by default.
+        :param kwargs: History options, see
+         :class:`~httptestserver.http_server.ServerState`.
+        """
+        Thread.__init__(self)
+        ServerState.__init__(self, **kwargs)
+        self.daemon = True  # finish along with parent process
+        self.scheme = scheme
+        self.handler = handler
+        self.limit = limit
+        self.idle_timeout = idle_timeout
+        self.max_requests = max_requests
+
+        # Bind on creation so the port is known before the loop starts
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((host, port))
+        self.socket.listen(backlog)
+        self.server_address = self.socket.getsockname()
+
+        self.loop = asyncio.new_event_loop()
+        self._serving = Event()
+        self._connections = set()
+
+    @classmethod
+    def start_server(cls, host, port, **kwargs):
+        """Creates and starts an :class:`AsyncServer`
+
+        :param host: Host for the server to listen.
+        :param port: Port of the server to listen (should not be in use).
+        :returns: A created and started :class:`AsyncServer`
+        """
+        log.info('Starting async http server %s:%d', host, port)
+        server = cls(host, port, 'http', **kwargs)
+        server.start()
+        return server
+
+    @property
+    def host(self):
+        return self.server_address[0]
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    @property
+    def connections(self):
+        """Number of currently open connections"""
+        return len(self._connections)
+
+    async def handle_connection(self, reader, writer):
+        client_address = writer.get_extra_info('peername')[:2]
+        self._connections.add(writer)
+        self.open_connection()
+        connected, served = time.time(), 0
+        try:
+            close = False
+            while not close:
+                handler = self.handler(self, reader, writer, client_address)
+                try:
+                    await asyncio.wait_for(handler.parse_request(),
+                                           self.idle_timeout)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+                    break
+                except (asyncio.LimitOverrunError, ValueError):
+                    await handler.send_error(400)
+                    break
+
+                served += 1
+                if self.max_requests and served >= self.max_requests:
+                    handler.close_connection = True
+                await handler.handle_request()
+                close = handler.close_connection
+        except ConnectionError:
+            pass
+        except Exception:
+            log.exception('Error processing request from %s:%d',
+                          *client_address)
+        finally:
+            self._connections.discard(writer)
+            self.count_connection(served, time.time() - connected)
+            writer.close()
+
+    def stop(self):
+        """Stops the server thread, closing all the open connections"""
+        if self.is_alive():
+            self._serving.wait()
+            if not self.loop.is_closed():  # closed if failed to start
+                self.loop.call_soon_threadsafe(self.loop.stop)
+            self.join()
+        else:
+            self.close()
+
+    def close(self):
+        """Closes the socket of a server which is not running"""
+        self.socket.close()
+        self.loop.close()
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            server = self.loop.run_until_complete(asyncio.start_server(
+                self.handle_connection, sock=self.socket, limit=self.limit))
+        except BaseException:
+            self.close()
+            raise
+        finally:
+            self._serving.set()  # stop() waits until started or failed
+        try:
+            log.info('Starting server')
+            if self.access_log is not None:
+                self.access_log.start()
+            self.loop.run_forever()
+        finally:
+            if self.access_log is not None:
+                self.access_log.stop()
+            server.close()
+            for writer in list(self._connections):
+                writer.close()
+            self.cancel_tasks()
+            self.loop.close()
+            log.info('Stopping server at: %s:%d', self.host, self.port)
+
+    def cancel_tasks(self):
+        tasks = asyncio.all_tasks(self.loop)
+        for task in tasks:
+            task.cancel()
+        self.loop.run_until_complete(
+            asyncio.gather(*tasks, return_exceptions=True))
+
+
+@contextlib.contextmanager
+def async_http_server(*args, **kwargs):
+    """Context of a started :class:`AsyncServer`
+
+    .. code::
+
+        with async_http_server() as server:
+            # use server
+
+    See function :func:`start_async_server`.
+    """
+    server = start_async_server(*args, **kwargs)
+    yield server
+    server.stop()
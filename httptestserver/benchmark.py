@@ -0,0 +1,407 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark
+---------
+
+Load generator and benchmark scenarios for the servers of the package.
+
+Each scenario starts a server, sends it a burst of requests from several
+client threads and reports the throughput, the client side latency
+percentiles, the growth of the process resident memory and the number of
+threads the server used:
+
+.. code::
+
+    $ python -m httptestserver.benchmark --requests 5000 --output new.json
+    http                  4210.3 req/s  p50 0.91ms  p99 3.20ms  p999 8.01ms
+    ...
+    $ python -m httptestserver.benchmark --compare old.json new.json
+
+Results are written as JSON, along with the package and Python versions,
+so runs of different versions can be compared. Each 1 MiB request of the
+``large-body`` scenario counts as a hundred, see :data:`REQUESTS_DIVISORS`.
+
+Scenarios are run with :func:`run` or :func:`run_scenario`:
+
+.. code::
+
+    >>> result = run_scenario('http-keep-alive', requests=1000)
+    >>> result['requests_per_second']
+    5340.2
+"""
+import os
+import sys
+import ssl
+import json
+import time
+import smtplib
+import argparse
+import platform
+import threading
+import http.client
+
+from .smtp_server import smtp_server
+from .http_server import http_server, https_server
+
+
+DEFAULT_REQUESTS = 2000
+DEFAULT_CONCURRENCY = 8
+LARGE_BODY_SIZE = 1024 * 1024  # bytes sent and received by large-body
+
+REQUESTS_DIVISORS = {'large-body': 100}
+"""Scenarios :func:`run` sends fewer requests to, the requests asked for
+divided by the given number, as each of them moves much more data"""
+
+MESSAGE = """\
+From: bench@httptestserver
+To: sink@httptestserver
+Subject: benchmark
+
+Benchmark message.
+"""
+
+
+def rss():
+    """Resident memory of the process in bytes, `None` if unknown"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError):
+        pass
+    try:
+        import resource
+    except ImportError:  # windows
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == 'darwin' else usage * 1024
+
+
+def percentile(sorted_values, q):
+    """Value at the *q* quantile of a sorted list, nearest rank"""
+    if not sorted_values:
+        return None
+    index = min(int(q * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+CLIENT_THREAD = 'benchmark-client'
+
+
+def server_threads():
+    """Number of live threads, leaving out the benchmark ones"""
+    return sum(1 for thread in threading.enumerate()
+               if not thread.name.startswith(CLIENT_THREAD))
+
+
+class ThreadSampler(threading.Thread):
+    """Samples the peak number of server threads until stopped"""
+    def __init__(self, interval=0.001):
+        threading.Thread.__init__(self, name=CLIENT_THREAD + '-sampler')
+        self.daemon = True
+        self.interval = interval
+        self.baseline = self.peak = server_threads()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.peak = max(self.peak, server_threads())
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class LoadGenerator(object):
+    """Sends *requests* calls of *send* from *concurrency* client threads
+
+    *send* gets the client state created by *connect* for its thread, and
+    returns a new state when the previous one cannot be reused. Latencies
+    are measured around each call.
+    """
+    def __init__(self, connect, send, requests=DEFAULT_REQUESTS,
+                 concurrency=DEFAULT_CONCURRENCY):
+        self.connect = connect
+        self.send = send
+        self.requests = requests
+        self.concurrency = concurrency
+        self.latencies = []
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def client(self, count):
+        latencies, errors = [], 0
+        state = None
+        for _ in range(count):
+            started = time.time()
+            try:
+                if state is None:
+                    state = self.connect()
+                state = self.send(state)
+            except (OSError, http.client.HTTPException, smtplib.SMTPException):
+                errors += 1
+                state = None
+                continue
+            latencies.append(time.time() - started)
+        with self._lock:
+            self.latencies.extend(latencies)
+            self.errors += errors
+
+    def run(self):
+        """Runs the load, returning its elapsed seconds"""
+        shares = [self.requests // self.concurrency] * self.concurrency
+        for index in range(self.requests % self.concurrency):
+            shares[index] += 1
+
+        clients = [threading.Thread(target=self.client, args=(count,),
+                                    name=CLIENT_THREAD)
+                   for count in shares if count]
+        started = time.time()
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        return time.time() - started
+
+
+def http_client(server, keep_alive=True, body=None):
+    """*connect* and *send* functions of a :class:`LoadGenerator` for an
+    http or https *server*"""
+    if server.scheme == 'https':
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+
+        def connect():
+            return http.client.HTTPSConnection(server.host, server.port,
+                                               context=context)
+    else:
+        def connect():
+            return http.client.HTTPConnection(server.host, server.port)
+
+    method = 'GET' if body is None else 'POST'
+    headers = {} if keep_alive else {'Connection': 'close'}
+
+    def send(connection):
+        connection.request(method, '/bench', body, headers)
+        response = connection.getresponse()
+        response.read()
+        if response.will_close:
+            connection.close()
+            return None
+        return connection
+
+    return connect, send
+
+
+def smtp_client(server):
+    """*connect* and *send* functions of a :class:`LoadGenerator` sending
+    a burst of messages to a smtp *server* through a single session per
+    client"""
+    def connect():
+        return smtplib.SMTP(server.host, server.port)
+
+    def send(session):
+        session.sendmail('bench@httptestserver', ['sink@httptestserver'],
+                         MESSAGE)
+        return session
+
+    return connect, send
+
+
+def bench_http(requests, concurrency, keep_alive=False):
+    with http_server(keep_alive=keep_alive, history_size=1,
+                     quiet=True) as server:
+        server.data['response_content'] = b'benchmark'
+        return measure(server, http_client(server, keep_alive),
+                       requests, concurrency)
+
+
+def bench_https(requests, concurrency):
+    with https_server(keep_alive=True, history_size=1,
+                      quiet=True) as server:
+        server.data['response_content'] = b'benchmark'
+        return measure(server, http_client(server), requests, concurrency)
+
+
+def bench_large_body(requests, concurrency):
+    body = b'x' * LARGE_BODY_SIZE
+    with http_server(keep_alive=True, history_size=1, store_body=False,
+                     quiet=True) as server:
+        server.data['response_content'] = body
+        return measure(server, http_client(server, body=body),
+                       requests, concurrency)
+
+
+def bench_smtp(requests, concurrency):
+    with smtp_server(history_size=1) as server:
+        return measure(server, smtp_client(server), requests, concurrency)
+
+
+SCENARIOS = {
+    'http': bench_http,
+    'http-keep-alive': lambda *args: bench_http(*args, keep_alive=True),
+    'https': bench_https,
+    'large-body': bench_large_body,
+    'smtp-burst': bench_smtp,
+}
+
+
+def measure(server, client, requests, concurrency):
+    """Runs a :class:`LoadGenerator` against *server* and summarizes it"""
+    connect, send = client
+    load = LoadGenerator(connect, send, requests, concurrency)
+    memory = rss()
+    sampler = ThreadSampler()
+    sampler.start()
+    elapsed = load.run()
+    sampler.stop()
+
+    latencies = sorted(load.latencies)
+    final_memory = rss()
+    return {
+        'requests': len(latencies),
+        'errors': load.errors,
+        'concurrency': concurrency,
+        'seconds': elapsed,
+        'requests_per_second': len(latencies) / elapsed if elapsed else None,
+        'latency': {
+            'mean': sum(latencies) / len(latencies) if latencies else None,
+            'p50': percentile(latencies, 0.5),
+            'p99': percentile(latencies, 0.99),
+            'p999': percentile(latencies, 0.999),
+            'max': latencies[-1] if latencies else None,
+        },
+        'rss_growth': (final_memory - memory
+                       if None not in (memory, final_memory) else None),
+        'server_threads': sampler.peak - sampler.baseline,
+    }
+
+
+def run_scenario(name, requests=DEFAULT_REQUESTS,
+                 concurrency=DEFAULT_CONCURRENCY):
+    """Runs a single benchmark scenario
+
+    :param name: One of :data:`SCENARIOS`: ``'http'``,
+     ``'http-keep-alive'``, ``'https'``, ``'large-body'`` or
+     ``'smtp-burst'``.
+    :param requests: *(default: 2000)* Number of requests or messages sent.
+    :param concurrency: *(default: 8)* Number of client threads.
+    :returns: A `dict` with the results.
+    :raises ValueError: If the scenario is unknown.
+    """
+    if name not in SCENARIOS:
+        raise ValueError('Unknown benchmark scenario: {}'.format(name))
+    return SCENARIOS[name](requests, concurrency)
+
+
+def scenario_requests(name, requests):
+    """Number of requests :func:`run` sends in scenario *name* when asked
+    for *requests*, see :data:`REQUESTS_DIVISORS`"""
+    return max(requests // REQUESTS_DIVISORS.get(name, 1), 1)
+
+
+def version():
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+    except ImportError:  # python < 3.8
+        return None
+    try:
+        return version('httptestserver')
+    except PackageNotFoundError:
+        return None
+
+
+def run(scenarios=None, requests=DEFAULT_REQUESTS,
+        concurrency=DEFAULT_CONCURRENCY):
+    """Runs the benchmark *scenarios*, all of them by default
+
+    Scenarios in :data:`REQUESTS_DIVISORS` send fewer *requests*, the number
+    actually sent is in the ``requests`` of their result.
+
+    :returns: A `dict` with the results of each scenario along with the
+     versions of the package and Python, ready to be saved as JSON.
+    """
+    return {
+        'version': version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.time(),
+        'requests': requests,
+        'concurrency': concurrency,
+        'scenarios': {name: run_scenario(name,
+                                         scenario_requests(name, requests),
+                                         concurrency)
+                      for name in (scenarios or sorted(SCENARIOS))},
+    }
+
+
+def format_result(name, result):
+    latency = result['latency']
+    line = '{:<18} {:>9.1f} req/s'.format(
+        name, result['requests_per_second'] or 0)
+    for key in ('p50', 'p99', 'p999'):
+        if latency[key] is not None:
+            line += '  {} {:.2f}ms'.format(key, latency[key] * 1000)
+    if result['errors']:
+        line += '  {} errors'.format(result['errors'])
+    return line
+
+
+def compare(old, new):
+    """Lines comparing the throughput and p99 latency of two runs"""
+    lines = []
+    for name, result in sorted(new['scenarios'].items()):
+        previous = old['scenarios'].get(name)
+        if previous is None:
+            continue
+        lines.append('{:<18} {:>+7.1%} req/s  {:>+7.1%} p99'.format(
+            name,
+            ratio(previous['requests_per_second'],
+                  result['requests_per_second']),
+            ratio(previous['latency']['p99'], result['latency']['p99'])))
+    return lines
+
+
+def ratio(old, new):
+    if not old or new is None:
+        return 0.0
+    return (new - old) / old
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m httptestserver.benchmark',
+        description='Benchmarks httptestserver servers')
+    parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                        help='One of: {}'.format(', '.join(sorted(SCENARIOS))))
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS)
+    parser.add_argument('--concurrency', type=int,
+                        default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--output', help='Path of the JSON results file')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='Compares two JSON results files')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        results = []
+        for path in args.compare:
+            with open(path) as results_file:
+                results.append(json.load(results_file))
+        for line in compare(*results):
+            print(line)
+        return
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error('unknown scenarios: {}'.format(', '.join(unknown)))
+
+    results = run(args.scenarios, args.requests, args.concurrency)
+    for name, result in sorted(results['scenarios'].items()):
+        print(format_result(name, result))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
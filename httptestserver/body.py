@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+Body
+----
+
+Capture of request bodies which may not fit in memory.
+
+Bodies are read from the connection in chunks, kept in memory up to a
+threshold and spilled to a temporary file beyond it, while their size and
+hash are computed incrementally. Bodies sent with ``Transfer-Encoding:
+chunked`` are decoded incrementally as well.
+
+.. code::
+
+    >>> server = start_server(body_threshold=1024 * 1024)
+    >>> requests.post(server.url('/upload'), data=big_file)
+    >>> body = server.history[-1]['body']
+    >>> body.size, body.spilled, body.hexdigest
+    (4294967296, True, '9f86d081884c7d659a2feaa0c55ad015...')
+    >>> with body.open() as upload:
+    ...     upload.read(4)
+"""
+import io
+import os
+import mmap
+import hashlib
+import tempfile
+import weakref
+
+
+DEFAULT_CHUNK_SIZE = 64 * 1024  # bytes read from the connection at a time
+DEFAULT_HASH = 'sha256'
+MAX_LINE = 4096                 # max length of chunk size and trailer lines
+
+
+class BytesBody(object):
+    """Collects a body as plain `bytes`"""
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, chunk):
+        self._chunks.append(chunk)
+
+    def finish(self):
+        return b''.join(self._chunks)
+
+
+class CapturedBody(object):
+    """Request body kept in memory up to *threshold* bytes, in a temporary
+    file beyond it
+
+    Written incrementally through :meth:`write`, keeping its :attr:`size`
+    and hash up to date. Contents can be read lazily with :meth:`open`, which
+    returns a new independent file object on each call, or :meth:`view`.
+
+    When created with *store* `False` only the size and hash are kept,
+    contents are discarded.
+
+    The temporary file is removed when the body is closed or collected.
+    """
+    def __init__(self, threshold, algorithm=DEFAULT_HASH, store=True):
+        self.threshold = threshold
+        self.algorithm = algorithm
+        self.store = store
+        self.size = 0
+        self.path = None
+        self._buffer = bytearray()
+        self._file = None
+        self._hash = hashlib.new(algorithm)
+
+    @property
+    def spilled(self):
+        """`True` if contents were moved to a temporary file"""
+        return self.path is not None
+
+    @property
+    def hexdigest(self):
+        """Hex digest of the contents written so far"""
+        return self._hash.hexdigest()
+
+    @property
+    def digest(self):
+        """Digest of the contents written so far"""
+        return self._hash.digest()
+
+    def write(self, chunk):
+        """Appends *chunk* to the body"""
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+        if not self.store:
+            return
+        if self._file is None and self.size > self.threshold:
+            self._spill()
+
+        if self._file is None:
+            self._buffer.extend(chunk)
+        else:
+            self._file.write(chunk)
+
+    def _spill(self):
+        fd, self.path = tempfile.mkstemp(prefix='httptestserver-body-')
+        self._file = os.fdopen(fd, 'wb')
+        self._file.write(self._buffer)
+        self._buffer = bytearray()
+        weakref.finalize(self, _remove, self._file, self.path)
+
+    def finish(self):
+        """Flushes the contents, called once the body has been read
+
+        :returns: The body itself.
+        """
+        if self._file is not None:
+            self._file.flush()
+        return self
+
+    def open(self):
+        """New file object, positioned at the start of the contents
+
+        :raises ValueError: If the contents were not stored.
+        """
+        if not self.store:
+            raise ValueError('Body contents were not stored')
+        if self.spilled:
+            return open(self.path, 'rb')
+        return io.BytesIO(self._buffer)
+
+    def view(self):
+        """:class:`memoryview` of the contents, memory mapped when spilled"""
+        if not self.store:
+            raise ValueError('Body contents were not stored')
+        if self.spilled:
+            with open(self.path, 'rb') as body:
+                return memoryview(mmap.mmap(
+                    body.fileno(), 0, access=mmap.ACCESS_READ))
+        return memoryview(self._buffer)
+
+    def read(self):
+        """Full contents as `bytes`, beware of large bodies"""
+        with self.open() as body:
+            return body.read()
+
+    def close(self):
+        """Removes the temporary file (if any)"""
+        if self._file is not None:
+            _remove(self._file, self.path)
+
+    def __len__(self):
+        return self.size
+
+    def __eq__(self, other):
+        if isinstance(other, CapturedBody):
+            return (self.size, self.digest) == (other.size, other.digest)
+        if isinstance(other, bytes):
+            return (self.size == len(other) and
+                    self.digest == hashlib.new(self.algorithm, other).digest())
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '<CapturedBody {} bytes{}>'.format(
+            self.size, ' spilled' if self.spilled else '')
+
+
+def _remove(file, path):
+    file.close()
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def create_body(threshold=None, store=True):
+    """Creates the sink where a request body is read into
+
+    :param threshold: *(default: None)* Bytes kept in memory before
+     spilling to disk. By default bodies are read as `bytes`.
+    :param store: *(default: True)* `False` to keep only size and hash.
+    :returns: A :class:`BytesBody` or a :class:`CapturedBody`.
+    """
+    if threshold is None and store:
+        return BytesBody()
+    return CapturedBody(threshold or 0, store=store)
+
+
+def read_body(read, length, body, callback=None,
+              chunk_size=DEFAULT_CHUNK_SIZE):
+    """Reads *length* bytes in chunks through *read* into *body*
+
+    :param read: Function which reads up to *n* bytes from the connection.
+    :param body: Sink created by :func:`create_body`.
+    :param callback: Function called with every chunk read.
+    :returns: The finished body.
+    """
+    remaining = length
+    while remaining > 0:
+        chunk = read(min(chunk_size, remaining))
+        if not chunk:
+            break  # connection closed
+        body.write(chunk)
+        if callback is not None:
+            callback(chunk)
+        remaining -= len(chunk)
+    return body.finish()
+
+
+def parse_chunk_size(line):
+    """Size of a chunk from its ``Transfer-Encoding: chunked`` size line
+
+    :raises ValueError: If the line is not valid.
+    """
+    if len(line) > MAX_LINE or not line.endswith(b'\n'):
+        raise ValueError('Invalid chunk size line')
+    size = line.split(b';', 1)[0].strip()  # ignore chunk extensions
+    return int(size, 16)
+
+
+def iter_chunks(rfile, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Decodes a ``Transfer-Encoding: chunked`` body read from *rfile*
+
+    Yields the decoded data as it arrives, in pieces of at most *chunk_size*
+    bytes whatever the size of the chunks sent by the client. Trailers are
+    read and discarded.
+
+    :raises ValueError: If the body is not correctly encoded.
+    """
+    while True:
+        remaining = parse_chunk_size(rfile.readline(MAX_LINE + 1))
+        if remaining == 0:
+            break
+
+        while remaining > 0:
+            data = rfile.read(min(chunk_size, remaining))
+            if not data:
+                raise ValueError('Connection closed in the middle of a chunk')
+            remaining -= len(data)
+            yield data
+
+        if rfile.readline(MAX_LINE + 1).strip():
+            raise ValueError('Chunk data is longer than announced')
+
+    # trailers
+    while rfile.readline(MAX_LINE + 1).strip():
+        pass
+
+
+def read_chunked_body(rfile, body, callback=None,
+                      chunk_size=DEFAULT_CHUNK_SIZE):
+    """Reads a ``Transfer-Encoding: chunked`` body from *rfile* into *body*
+
+    See :func:`read_body` and :func:`iter_chunks`.
+    """
+    for chunk in iter_chunks(rfile, chunk_size):
+        body.write(chunk)
+        if callback is not None:
+            callback(chunk)
+    return body.finish()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Cache
+-----
+
+Static responses serialized once and written with a single call.
+
+Formatting the status line and headers of a response on every request
+takes most of the time of a stub server under load, even though the
+configured response rarely changes. Responses with `bytes` content taken
+as is from the server data or a route are serialized to a buffer the first
+time and kept in a :class:`ResponseCache`, keyed on the response
+configuration, so any change of
+:attr:`~httptestserver.http_server.ServerState.data` or of a route gets a
+new entry instead of a stale one. Responses built for each request, by a
+route ``response`` function, a :class:`~httptestserver.config.LazyValue`
+or a hook, are never cached.
+
+Only the ``Date`` header changes between requests, it is formatted once
+per second and inserted when the response is written.
+"""
+import time
+import email.utils
+from threading import Lock
+
+from ._compat import iteritems
+
+
+DEFAULT_CACHE_SIZE = 256  # entries kept before the cache is emptied
+
+_date = (None, b'')
+
+
+def date_header():
+    """``Date`` header line of the current second"""
+    global _date
+    second = int(time.time())
+    cached = _date
+    if cached[0] != second:
+        line = 'Date: {}\r\n'.format(
+            email.utils.formatdate(second, usegmt=True))
+        cached = _date = (second, line.encode('ascii'))
+    return cached[1]
+
+
+def response_key(response, *context):
+    """Key of *response* in a :class:`ResponseCache`
+
+    :param context: Extra values which change the serialized response, like
+     the protocol version.
+    :returns: A hashable key or `None` if the response cannot be cached,
+     because its content is streamed or its headers are not hashable.
+    """
+    content = response.content
+    if content is not None and not isinstance(content, bytes):
+        return None
+
+    try:
+        key = (response.status, tuple(iteritems(response.headers)),
+               id(content)) + context
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+class SerializedResponse(object):
+    """Response serialized around its ``Date`` header
+
+    Keeps a reference to the *content* so its `id`, part of the cache key,
+    cannot be reused by another object while the entry exists.
+    """
+    __slots__ = ('head', 'tail', 'content', 'connection')
+
+    def __init__(self, head, tail, content=None, connection=None):
+        """
+        :param head: Status line and headers before ``Date``.
+        :param tail: Headers after ``Date``, blank line and content.
+        :param content: The original response content.
+        :param connection: Value of the ``Connection`` header, if any.
+        """
+        self.head = head
+        self.tail = tail
+        self.content = content
+        self.connection = connection
+
+    def render(self):
+        """Full response as a single `bytes`"""
+        return b''.join((self.head, date_header(), self.tail))
+
+
+class ResponseCache(object):
+    """Bounded cache of :class:`SerializedResponse` by :func:`response_key`
+
+    Lookups take no lock. Once *size* entries are kept, the cache is
+    emptied, as a stub server uses only a few distinct responses at a time.
+    """
+    def __init__(self, size=DEFAULT_CACHE_SIZE):
+        self.size = size
+        self._entries = {}
+        self._lock = Lock()
+
+    def get(self, key, serialize):
+        """Cached response for *key*, created calling *serialize* if missing"""
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = serialize()
+            with self._lock:
+                if len(self._entries) >= self.size:
+                    self._entries.clear()
+                self._entries[key] = entry
+        return entry
+
+    def clear(self):
+        """Removes all the entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
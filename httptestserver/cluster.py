@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+Server Cluster
+--------------
+
+Several :class:`~httptestserver.http_server.Server` processes sharing the
+same port through ``SO_REUSEPORT``, so a stub is not limited to a single core
+when used as the upstream of throughput benchmarks.
+
+The kernel balances new connections between the worker processes. Response
+configuration is pushed from the parent process and the state of every
+worker is gathered back on demand.
+
+.. code::
+
+    >>> cluster = start_cluster(processes=4)
+    >>> cluster.configure(response_content=b'this is response body text')
+    >>> response = requests.get(cluster.url('/test'))
+    >>> response.content
+    'this is response body text'
+    >>> len(cluster.history)
+    1
+"""
+import socket
+import pickle
+import logging
+import contextlib
+import multiprocessing
+from threading import Lock
+
+from .http_server import DEFAULT_HOST, DEFAULT_PORT, DEFAULT_CERTFILE, Server
+
+
+log = logging.getLogger('httptestserver.cluster')
+
+
+def start_cluster(host=None, port=None, processes=None, **kwargs):
+    """Create a started :class:`ServerCluster` listening in *host*:*port*
+
+    :param host: *(default: 127.0.0.1)* Host for the servers to listen.
+    :param port: *(default: random)* Port of the servers to listen (should not be in use).
+    :param processes: *(default: cpu count)* Number of worker processes.
+    :param kwargs: Extra options for every worker :class:`Server`.
+    :returns: A created and started :class:`ServerCluster`
+    """
+    cluster = ServerCluster(host or DEFAULT_HOST, port or DEFAULT_PORT,
+                            processes, **kwargs)
+    cluster.start()
+    return cluster
+
+
+@contextlib.contextmanager
+def http_cluster(*args, **kwargs):
+    """Context of a started :class:`ServerCluster`
+
+    .. code::
+
+        with http_cluster(processes=4) as cluster:
+            # use cluster
+
+    See function :func:`start_cluster`.
+    """
+    cluster = start_cluster(*args, **kwargs)
+    yield cluster
+    cluster.stop()
+
+
+def portable(state):
+    """Copy of a server state `dict` without the values that cannot be sent
+    to another process (sockets, files, the server itself...)"""
+    result = {}
+    for key, value in state.items():
+        try:
+            pickle.dumps(value)
+        except Exception:
+            continue
+        result[key] = value
+    return result
+
+
+def serve_worker(host, port, scheme, options, connection):
+    """Worker process main loop
+
+    Starts a :class:`Server` bound with ``SO_REUSEPORT`` and attends the
+    parent commands received through *connection* until ``stop``.
+    """
+    if scheme == 'https':
+        server = Server.start_ssl_server(host, port, DEFAULT_CERTFILE, None,
+                                         reuse_port=True, **options)
+    else:
+        server = Server.start_server(host, port, reuse_port=True, **options)
+    connection.send((True, None))
+
+    for command, args in iter(connection.recv, None):
+        try:
+            result = WorkerCommands(server).run(command, *args)
+        except Exception as error:
+            connection.send((False, repr(error)))
+        else:
+            connection.send((True, result))
+
+        if command == 'stop':
+            break
+
+
+class WorkerCommands(object):
+    """Commands that the parent process can run on a worker :class:`Server`"""
+
+    def __init__(self, server):
+        self.server = server
+
+    def run(self, command, *args):
+        return getattr(self, command)(*args)
+
+    def configure(self, config):
+        self.server.data.replace_config(config)
+
+    def data(self):
+        return portable(self.server.data)
+
+    def history(self):
+        return [portable(entry) for entry in self.server.history]
+
+    def reset(self):
+        self.server.reset()
+
+    def stop(self):
+        self.server.stop()
+
+
+class ServerCluster(object):
+    """Cluster of http :class:`Server` processes sharing a single port
+
+    Forks *processes* workers which bind the same address with
+    ``SO_REUSEPORT`` (only available on Linux and BSDs). The parent process
+    keeps the port reserved and talks to the workers through pipes:
+
+    - :meth:`configure` pushes the response configuration (``response_*``
+      values of :attr:`Server.data`) to every worker.
+    - :attr:`data` and :attr:`history` gather the state of every worker.
+
+    Everything sent between processes must be picklable, so configured
+    values cannot be lambdas and gathered states lack the values which
+    cannot be pickled, like ``rfile`` or ``wfile``. Hooks are not supported.
+    """
+    def __init__(self, host, port, processes=None, scheme='http', **options):
+        """Creates a new :class:`ServerCluster`
+
+        :param host: Host for the servers to listen.
+        :param port: Port of the servers to listen (should be free).
+        :param processes: *(default: cpu count)* Number of worker processes.
+        :param scheme: *(default: http)* 'http' or 'https'.
+        :param options: Extra options for every worker :class:`Server`.
+        """
+        if not hasattr(socket, 'SO_REUSEPORT'):
+            raise RuntimeError('SO_REUSEPORT is not supported by the platform')
+
+        self.processes = processes or multiprocessing.cpu_count()
+        self.scheme = scheme
+        self.options = options
+        self._config = {}
+        self._workers = []
+        self._lock = Lock()
+
+        # Reserve the port without listening, so no connection lands here
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self._socket.bind((host, port))
+        self.server_address = self._socket.getsockname()
+
+    @property
+    def host(self):
+        return self.server_address[0]
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    @property
+    def pids(self):
+        """Process ids of the running workers"""
+        return [process.pid for process, _ in self._workers]
+
+    def start(self):
+        """Forks the worker processes and waits for them to be listening"""
+        log.info('Starting cluster of %d servers at %s:%d',
+                 self.processes, self.host, self.port)
+        context = (multiprocessing.get_context('fork')
+                   if hasattr(multiprocessing, 'get_context')
+                   else multiprocessing)
+
+        for _ in range(self.processes):
+            parent, child = context.Pipe()
+            process = context.Process(
+                target=serve_worker,
+                args=(self.host, self.port, self.scheme, self.options, child))
+            process.daemon = True  # finish along with parent process
+            process.start()
+            child.close()
+            self._workers.append((process, parent))
+
+        self._receive()
+        if self._config:
+            self.call('configure', self._config)
+
+    def call(self, command, *args):
+        """Runs *command* on every worker
+
+        :returns: A `list` with the result of every worker.
+        :raises RuntimeError: If any worker fails to run the command.
+        """
+        with self._lock:
+            for _, connection in self._workers:
+                connection.send((command, args))
+            return self._receive()
+
+    def _receive(self):
+        results = []
+        for process, connection in self._workers:
+            ok, result = connection.recv()
+            if not ok:
+                raise RuntimeError('Worker {} failed: {}'.format(
+                    process.pid, result))
+            results.append(result)
+        return results
+
+    def configure(self, *args, **values):
+        """Updates and pushes the response configuration to every worker
+
+        Accepts the same arguments than :meth:`dict.update`.
+        """
+        self._config.update(*args, **values)
+        if self._workers:
+            self.call('configure', self._config)
+
+    @property
+    def config(self):
+        """Response configuration currently pushed to the workers"""
+        return dict(self._config)
+
+    @property
+    def data(self):
+        """State of the most recent request among all the workers
+
+        Gathered on each access. Equals :attr:`config` when no request has
+        been served yet.
+        """
+        states = [state for state in self.call('data') if 'timestamp' in state]
+        if not states:
+            return self.config
+        return max(states, key=lambda state: state['timestamp'])
+
+    @property
+    def history(self):
+        """Requests served by all the workers in order of arrival
+
+        Gathered on each access. Each entry includes the ``worker`` pid of
+        the process which served the request.
+        """
+        entries = []
+        for (process, _), history in zip(self._workers, self.call('history')):
+            for entry in history:
+                entry['worker'] = process.pid
+                entries.append(entry)
+        return sorted(entries, key=lambda entry: entry['timestamp'])
+
+    def reset(self):
+        """Resets the state and configuration of every worker"""
+        self._config = {}
+        self.call('reset')
+
+    def url(self, path):
+        """Compose a full URL to the cluster from the url path"""
+        return "{}://{}:{}{}".format(self.scheme, self.host, self.port, path)
+
+    def stop(self):
+        """Stops all the worker processes"""
+        if self._workers:
+            self.call('stop')
+            for process, connection in self._workers:
+                process.join()
+                connection.close()
+            self._workers = []
+        self._socket.close()
+        log.info('Stopped cluster at: %s:%d', self.host, self.port)
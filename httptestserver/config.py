@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+Config
+------
+
+Response configuration published as immutable snapshots.
+
+The ``response_*`` values of
+:attr:`~httptestserver.http_server.ServerState.data` are kept in a
+:class:`ResponseConfig` which is never modified: every change publishes a
+new snapshot with a higher :attr:`~ResponseConfig.version`. Handlers take
+the current snapshot once per request, without locking, so a request is
+served with a consistent configuration even if the test changes it
+meanwhile, and concurrent requests keep their own state instead of
+overwriting each other's in a shared `dict`.
+
+.. code::
+
+    >>> server.configure(response_status=201, response_content=b'created')
+    <ResponseConfig v1>
+    >>> server.config['response_status']
+    201
+
+Callable values are evaluated lazily, only when a request reads them, and
+by default just once. A :class:`LazyValue` sets another evaluation policy:
+
+.. code::
+
+    >>> server.data['response_content'] = LazyValue(
+    ...     build_fixture, EVALUATE_CACHED, ttl=60)
+    >>> server.data['response_headers'] = LazyValue(
+    ...     lambda: {'X-Request-Id': str(uuid.uuid4())}, EVALUATE_PER_REQUEST)
+"""
+import time
+from threading import Lock, RLock
+
+from ._compat import Mapping
+
+
+CONFIG_PREFIX = 'response_'
+# Request attributes kept in the state of a request, along with the files
+# of its connection
+REQUEST_FIELDS = ('command', 'path', 'request_version', 'requestline',
+                  'headers', 'body', 'client_address', 'timestamp', 'timings',
+                  'rfile', 'wfile')
+
+EVALUATE_ONCE = 'once'            # first request reading it, kept forever
+EVALUATE_PER_REQUEST = 'request'  # every request reading it
+EVALUATE_CACHED = 'cached'        # kept for ttl seconds
+
+_missing = object()
+
+
+def is_config_key(key):
+    """Whether *key* is a response configuration value"""
+    return isinstance(key, str) and key.startswith(CONFIG_PREFIX)
+
+
+class LazyValue(object):
+    """Configuration value computed by *function* when a request reads it
+
+    Plain callables set as configuration values are evaluated as
+    ``LazyValue(function)``, that is, only once.
+    """
+    def __init__(self, function, policy=EVALUATE_ONCE, ttl=None):
+        """
+        :param function: Callable with no arguments returning the value.
+        :param policy: *(default: once)* When the value is computed again:
+         ``'once'``, ``'request'`` or ``'cached'``.
+        :param ttl: Seconds the value is kept with the ``'cached'`` policy.
+        """
+        if policy not in (EVALUATE_ONCE, EVALUATE_PER_REQUEST,
+                          EVALUATE_CACHED):
+            raise ValueError('Unknown evaluation policy: {}'.format(policy))
+        if policy == EVALUATE_CACHED and ttl is None:
+            raise ValueError('Cached evaluation policy needs a ttl')
+
+        self.function = function
+        self.policy = policy
+        self.ttl = ttl
+        self.evaluations = 0
+        self._value = _missing
+        self._expires = None
+        self._lock = Lock()
+
+    def __call__(self):
+        """Value for the request reading it"""
+        if self.policy == EVALUATE_PER_REQUEST:
+            return self.evaluate()
+
+        with self._lock:
+            if self._value is _missing or (
+                    self._expires is not None and time.time() >= self._expires):
+                self._value = self.evaluate()
+                if self.policy == EVALUATE_CACHED:
+                    self._expires = time.time() + self.ttl
+            return self._value
+
+    def evaluate(self):
+        self.evaluations += 1
+        return self.function()
+
+    def __repr__(self):
+        return '<LazyValue {} {!r}>'.format(self.policy, self.function)
+
+
+def lazy(value, previous=None):
+    """*value* wrapped in a :class:`LazyValue` if it is a plain callable
+
+    The *previous* wrapper is reused when it wraps the same callable, so it
+    is not evaluated again.
+    """
+    if not callable(value) or isinstance(value, LazyValue):
+        return value
+    if isinstance(previous, LazyValue) and previous.function is value:
+        return previous
+    return LazyValue(value)
+
+
+class ResponseConfig(Mapping):
+    """Immutable and versioned snapshot of the response configuration
+
+    It reads as a `dict` of the ``response_*`` values, where callables are
+    kept as :class:`LazyValue` instances.
+    """
+    __slots__ = ('version', '_values')
+
+    def __init__(self, values=(), version=0, previous=None):
+        """
+        :param values: A `dict` or a `(k, v) tuple` of configuration values.
+        :param version: *(default: 0)* Number of the snapshot, each one
+         published gets a higher number.
+        :param previous: *(default: None)* Snapshot whose lazy values are
+         kept when their callables have not changed.
+        """
+        previous = previous._values if previous is not None else {}
+        values = {k: lazy(v, previous.get(k)) for k, v in dict(values).items()}
+        object.__setattr__(self, '_values', values)
+        object.__setattr__(self, 'version', version)
+
+    def replace(self, values):
+        """Next version of the snapshot with the given *values*"""
+        return ResponseConfig(values, self.version + 1, self)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('ResponseConfig is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('ResponseConfig is immutable')
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return '<ResponseConfig v{}>'.format(self.version)
+
+
+class ServerData(dict):
+    """Server data `dict` which publishes a new :attr:`config` snapshot
+    whenever its ``response_*`` values change
+
+    The rest of the values are the state of the last request served, see
+    :meth:`mirror`.
+    """
+    def __init__(self, *args, **kwargs):
+        super(ServerData, self).__init__()
+        self.config = ResponseConfig()
+        self._lock = RLock()
+        self.update(*args, **kwargs)
+
+    def publish(self):
+        """Publishes the current ``response_*`` values as a new snapshot"""
+        with self._lock:
+            self.config = self.config.replace(
+                (k, v) for k, v in self.items() if is_config_key(k))
+        return self.config
+
+    def replace_config(self, values):
+        """Replaces all the ``response_*`` values with *values* at once"""
+        with self._lock:
+            for key in [k for k in self if is_config_key(k)]:
+                dict.__delitem__(self, key)
+            dict.update(self, values)
+            return self.publish()
+
+    def mirror(self, state):
+        """Copies the request *state*, leaving the configuration untouched"""
+        dict.update(self, ((k, v) for k, v in state.items()
+                           if not is_config_key(k)))
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            dict.__setitem__(self, key, value)
+            if is_config_key(key):
+                self.publish()
+
+    def __delitem__(self, key):
+        with self._lock:
+            dict.__delitem__(self, key)
+            if is_config_key(key):
+                self.publish()
+
+    def update(self, *args, **kwargs):
+        with self._lock:
+            values = dict(*args, **kwargs)
+            dict.update(self, values)
+            if any(is_config_key(k) for k in values):
+                self.publish()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def setdefault(self, key, default=None):
+        with self._lock:
+            if key not in self:
+                self[key] = default
+            return self[key]
+
+    def pop(self, key, *default):
+        with self._lock:
+            value = dict.pop(self, key, *default)
+            if is_config_key(key):
+                self.publish()
+            return value
+
+    def popitem(self):
+        with self._lock:
+            key, value = dict.popitem(self)
+            if is_config_key(key):
+                self.publish()
+            return key, value
+
+    def clear(self):
+        with self._lock:
+            dict.clear(self)
+            self.publish()
+
+
+def request_state(request):
+    """`dict` with the :data:`REQUEST_FIELDS` of the *request* being served
+
+    Only the request attributes are taken, never the handler internals nor
+    the state of the requests it served before on the same connection.
+    """
+    return {name: getattr(request, name, None) for name in REQUEST_FIELDS}
+
+
+class RequestData(dict):
+    """`dict` with the state of a single request and the response
+    configuration it is served with
+
+    Callable configuration values are evaluated when read, and their result
+    is kept for the rest of the request.
+    """
+    def __init__(self, config, state):
+        """
+        :param config: The :class:`ResponseConfig` snapshot of the request.
+        :param state: A `dict` with the request state.
+        """
+        super(RequestData, self).__init__(config)
+        self.update(state)
+        self.config = config
+
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if callable(value) and is_config_key(key):
+            value = value()
+            dict.__setitem__(self, key, value)
+        return value
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def evaluated_config(self):
+        """Configuration values of the request, callables are kept as such
+        unless the request read them"""
+        return {k: dict.__getitem__(self, k)
+                for k in self if is_config_key(k)}
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Content
+-------
+
+Response contents streamed to the client instead of built in memory.
+
+Besides `bytes`, ``response_content`` accepts:
+
+a path
+    A :class:`pathlib.Path` (or any path-like object), opened on every
+    response and sent as a file.
+
+a file object
+    Sent from its current position. Regular files are sent with
+    :meth:`socket.socket.sendfile`, so the contents are never copied to
+    user space.
+
+an iterable
+    Any iterator or generator of `bytes` chunks, sent with ``Transfer-Encoding:
+    chunked`` unless the response has a ``Content-Length`` header.
+
+Streams are throttled with the ``response_chunk_size`` and
+``response_chunk_delay`` values of the server data.
+
+.. code::
+
+    >>> def download(size):
+    ...     for _ in range(size // 1024):
+    ...         yield b'x' * 1024
+    >>> server.data['response_content'] = download(5 * 1024 ** 3)
+    >>> server.data['response_chunk_delay'] = 0.01
+"""
+import os
+import time
+import functools
+import contextlib
+
+from ._compat import iteritems
+from .body import DEFAULT_CHUNK_SIZE
+
+
+BUFFERS = (bytes, bytearray, memoryview)
+LAST_CHUNK = b'0\r\n\r\n'
+
+
+def is_stream(content):
+    """`True` if *content* must be streamed instead of sent at once"""
+    return content is not None and not isinstance(content, BUFFERS)
+
+
+def is_path(content):
+    return hasattr(content, '__fspath__')
+
+
+def is_file(content):
+    return hasattr(content, 'read')
+
+
+def file_length(file):
+    """Bytes left to read from a regular *file*, `None` for other files"""
+    try:
+        return max(os.fstat(file.fileno()).st_size - file.tell(), 0)
+    except (AttributeError, OSError, IOError, ValueError):
+        return None
+
+
+def content_length(content):
+    """Length of *content* when it is known beforehand, `None` otherwise"""
+    if isinstance(content, BUFFERS):
+        return len(content)
+    if is_path(content):
+        return os.path.getsize(content)
+    if is_file(content):
+        return file_length(content)
+    return None
+
+
+@contextlib.contextmanager
+def open_content(content):
+    """Context of *content* ready to be read, paths are opened as files"""
+    if is_path(content):
+        with open(content, 'rb') as file:
+            yield file
+    else:
+        yield content
+
+
+def stream_headers(headers, content, chunked=True):
+    """Framing headers to add to the response *headers* to stream *content*
+
+    A ``Content-Length`` when the length of *content* is known, otherwise
+    ``Transfer-Encoding: chunked`` if the client accepts it, *chunked*. No
+    header is added when *headers* already frame the content.
+
+    :returns: A `list` of `(k, v) tuples`.
+    """
+    if is_framed(headers):
+        return []
+
+    length = content_length(content)
+    if length is not None:
+        return [('Content-Length', str(length))]
+    if chunked:
+        return [('Transfer-Encoding', 'chunked')]
+    return []
+
+
+def is_framed(headers):
+    """`True` if the response *headers* tell where the content ends"""
+    return any(field.lower() in ('content-length', 'transfer-encoding')
+               for field, _ in iteritems(headers))
+
+
+def is_chunked(headers):
+    """`True` if the response *headers* announce a chunked content"""
+    return any(field.lower() == 'transfer-encoding' and
+               'chunked' in str(value).lower()
+               for field, value in iteritems(headers))
+
+
+def iter_content(content, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Iterates over the `bytes` chunks of an opened stream *content*
+
+    Files are read in pieces of *chunk_size* bytes, iterables are left as
+    they are but skipping empty chunks, which would end a chunked content.
+    """
+    if is_file(content):
+        return iter(functools.partial(content.read, chunk_size), b'')
+    return (chunk for chunk in content if chunk)
+
+
+def encode_chunks(chunks):
+    """Encodes *chunks* with ``Transfer-Encoding: chunked``, last chunk
+    included"""
+    for chunk in chunks:
+        yield '{:x}\r\n'.format(len(chunk)).encode('ascii') + chunk + b'\r\n'
+    yield LAST_CHUNK
+
+
+def throttle(chunks, delay=None):
+    """Yields *chunks* waiting *delay* seconds between each of them"""
+    for index, chunk in enumerate(chunks):
+        if index and delay:
+            time.sleep(delay)
+        yield chunk
@@ -0,0 +1,637 @@
+# -*- coding: utf-8 -*-
+"""
+History
+-------
+
+Storage backends for the requests kept in the server history.
+
+Handler threads append to the history on every request, so the backends
+avoid a single global lock being taken by all of them.
+"""
+import time
+import heapq
+import bisect
+import itertools
+import collections
+import math
+from threading import Lock, local
+
+from ._compat import Mapping
+from .config import LazyValue
+from .content import content_length
+
+
+DEFAULT_SHARDS = 16
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # seconds
+
+EVICT_OLDEST = 'oldest'  # ring buffer, keeps the last entries
+EVICT_NEWEST = 'newest'  # keeps the first entries, drops the new ones
+
+
+def hdr_bounds(lowest=0.00001, highest=100.0, digits=2):
+    """Bucket bounds from *lowest* to *highest* seconds with *digits*
+    significant digits, as in HDR histograms
+
+    Buckets are as narrow as the precision asked for at every magnitude, so
+    the quantiles of a :class:`Histogram` with these bounds are accurate to
+    the given digits whether latencies are of microseconds or seconds.
+    """
+    step = 10 ** (digits - 1)
+    bounds = []
+    exponent = math.floor(math.log10(lowest))
+    while not bounds or bounds[-1] < highest:
+        scale = 10.0 ** exponent / step
+        bounds.extend(round(mantissa * scale, digits - exponent)
+                      for mantissa in range(step + 1, step * 10 + 1))
+        exponent += 1
+    return [bound for bound in bounds if bound <= highest]
+
+
+LATENCY_BOUNDS = hdr_bounds()  # 10us to 100s, 2 significant digits
+
+
+def create_history(size=None, policy=EVICT_OLDEST):
+    """Creates a history storage
+
+    :param size: *(default: None)* Max number of entries to keep, unbounded
+     by default.
+    :param policy: *(default: oldest)* Which entries to evict once the
+     history is full, see :class:`RingHistory`.
+    :returns: A :class:`RingHistory` when *size* is given or a
+     :class:`ShardedHistory` otherwise.
+    """
+    if size is None:
+        return ShardedHistory()
+    return RingHistory(size, policy)
+
+
+class ShardedHistory(object):
+    """History split in shards which handler threads append to in parallel
+
+    Every thread is assigned a shard in round robin on its first append,
+    each shard with its own lock, so concurrent requests rarely contend.
+    Entries are tagged with a global sequence number when appended, and
+    :meth:`snapshot` merges all the shards back in arrival order.
+    """
+    def __init__(self, shards=DEFAULT_SHARDS):
+        self._sequence = itertools.count()  # next() is atomic in CPython
+        self._assign = itertools.count()
+        self._local = local()
+        self._shards = [([], Lock()) for _ in range(shards)]
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            index = next(self._assign) % len(self._shards)
+            self._local.shard = self._shards[index]
+            return self._local.shard
+
+    def append(self, entry):
+        """Adds *entry* at the end of the history"""
+        sequence = next(self._sequence)
+        entries, lock = self._shard()
+        with lock:
+            entries.append((sequence, entry))
+
+    def snapshot(self):
+        """`list` with all the entries in order of arrival
+
+        Each shard is copied holding only its own lock, the result contains
+        every entry appended before the call, once and in order.
+        """
+        copies = []
+        for entries, lock in self._shards:
+            with lock:
+                copies.append(list(entries))
+        return [entry for _, entry in heapq.merge(*copies)]
+
+    def clear(self):
+        """Removes all the entries"""
+        for entries, lock in self._shards:
+            with lock:
+                del entries[:]
+
+    def __len__(self):
+        return sum(len(entries) for entries, _ in self._shards)
+
+
+class RingHistory(object):
+    """History bounded to *capacity* entries
+
+    Once full, entries are evicted following *policy*:
+
+    oldest
+        Works as a ring buffer, the oldest entry is evicted to make room.
+
+    newest
+        Keeps the first entries, new entries are dropped.
+
+    The number of entries lost is kept in :attr:`evicted`. Appends only take
+    the history own lock, never the global one.
+    """
+    def __init__(self, capacity, policy=EVICT_OLDEST):
+        if policy not in (EVICT_OLDEST, EVICT_NEWEST):
+            raise ValueError('Unknown eviction policy: {}'.format(policy))
+
+        self.capacity = capacity
+        self.policy = policy
+        self.evicted = 0
+        self._entries = collections.deque(maxlen=capacity)
+        self._lock = Lock()
+
+    def append(self, entry):
+        """Adds *entry* at the end of the history, evicting if full"""
+        with self._lock:
+            if len(self._entries) == self.capacity:
+                self.evicted += 1
+                if self.policy == EVICT_NEWEST:
+                    return
+            self._entries.append(entry)
+
+    def snapshot(self):
+        """`list` with all the kept entries in order of arrival"""
+        with self._lock:
+            return list(self._entries)
+
+    def clear(self):
+        """Removes all the entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RequestCounters(object):
+    """Aggregated request counts by method, path and status
+
+    Counts are kept apart from the history entries, so they remain
+    accurate when entries are evicted from a bounded history.
+    """
+    def __init__(self):
+        self._counts = collections.Counter()
+        self._lock = Lock()
+
+    def count(self, method, path, status):
+        """Counts a request, query strings are left out of *path*"""
+        key = (method, path.split('?', 1)[0], status)
+        with self._lock:
+            self._counts[key] += 1
+
+    @property
+    def requests(self):
+        """:class:`collections.Counter` by ``(method, path, status)``"""
+        with self._lock:
+            return collections.Counter(self._counts)
+
+    def _by(self, index):
+        result = collections.Counter()
+        for key, count in self.requests.items():
+            result[key[index]] += count
+        return result
+
+    @property
+    def methods(self):
+        """:class:`collections.Counter` of requests by method"""
+        return self._by(0)
+
+    @property
+    def paths(self):
+        """:class:`collections.Counter` of requests by path"""
+        return self._by(1)
+
+    @property
+    def statuses(self):
+        """:class:`collections.Counter` of requests by response status"""
+        return self._by(2)
+
+    @property
+    def total(self):
+        """Total number of requests counted"""
+        return sum(self.requests.values())
+
+
+class ConnectionStats(object):
+    """Aggregated stats of the connections served, updated as they close
+
+    Tells how much clients reuse their connections: a *reuse_ratio* close
+    to 0 means every request opened a new connection.
+
+    It also keeps the number of *active* connections, and the bytes
+    *received* and *sent* through them, counted as requests are served.
+    """
+    def __init__(self, active=0):
+        """
+        :param active: *(default: 0)* Connections already open, ie: the
+         ones carried over from the stats being replaced.
+        """
+        self.connections = 0
+        self.active = active
+        self.requests = 0
+        self.unused = 0  # connections closed before any request
+        self.max_requests = 0
+        self.lifetime = 0.0
+        self.max_lifetime = 0.0
+        self.received = 0  # bytes
+        self.sent = 0      # bytes
+        self._lock = Lock()
+
+    def open(self):
+        """Counts a new connection as active until it is closed"""
+        with self._lock:
+            self.active += 1
+
+    def count_traffic(self, received, sent):
+        """Adds the bytes *received* and *sent* on a connection"""
+        with self._lock:
+            self.received += received
+            self.sent += sent
+
+    def count(self, requests, lifetime):
+        """Counts a closed connection which served *requests* in
+        *lifetime* seconds"""
+        with self._lock:
+            self.connections += 1
+            self.active = max(self.active - 1, 0)
+            self.requests += requests
+            self.unused += not requests
+            self.max_requests = max(self.max_requests, requests)
+            self.lifetime += lifetime
+            self.max_lifetime = max(self.max_lifetime, lifetime)
+
+    @property
+    def reuse_ratio(self):
+        """Fraction of the requests served on an already used connection"""
+        with self._lock:
+            if not self.requests:
+                return 0.0
+            reused = self.requests - (self.connections - self.unused)
+            return reused / float(self.requests)
+
+    @property
+    def requests_per_connection(self):
+        """Mean number of requests served by each connection"""
+        with self._lock:
+            return self.requests / float(self.connections or 1)
+
+    @property
+    def mean_lifetime(self):
+        """Mean seconds each connection was open"""
+        with self._lock:
+            return self.lifetime / (self.connections or 1)
+
+    def __repr__(self):
+        return '<ConnectionStats {} connections, {} requests>'.format(
+            self.connections, self.requests)
+
+
+class Histogram(object):
+    """Distribution of observed durations, counted in fixed buckets
+
+    Each bucket counts the observations lower or equal than its upper
+    bound, plus an overflow bucket for the ones above the last bound, so
+    observing is constant time and memory no matter how many values are
+    observed.
+    """
+    def __init__(self, bounds=DEFAULT_BUCKETS):
+        """
+        :param bounds: *(default: 0.5ms to 10s)* Sorted upper bounds of the
+         buckets, in seconds.
+        """
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = Lock()
+
+    def observe(self, value):
+        """Counts an observed *value*"""
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            self.max = max(self.max, value)
+
+    @property
+    def buckets(self):
+        """List of `(bound, count)` tuples with the cumulative count of
+        observations up to each bound, the last one being `inf`"""
+        with self._lock:
+            counts = list(itertools.accumulate(self.counts))
+        return list(zip(self.bounds + (float('inf'),), counts))
+
+    def cumulative(self, bounds):
+        """Like :attr:`buckets` but with other, coarser, *bounds*
+
+        Observations are counted up to a bound if the upper bound of their
+        own bucket is not greater than it, so the result is exact when
+        *bounds* are also bounds of the histogram.
+
+        :returns: `(buckets, count, sum)` read at once, *buckets* being a
+         list of `(bound, count)` tuples ending with `inf`.
+        """
+        with self._lock:
+            counts = list(itertools.accumulate(self.counts))
+            total = self.sum
+        buckets = []
+        for bound in bounds:
+            # tolerate bounds rounded differently, ie: 0.001 vs 0.0010...01
+            index = bisect.bisect_right(self.bounds, bound * (1 + 1e-9))
+            buckets.append((bound, counts[index - 1] if index else 0))
+        buckets.append((float('inf'), counts[-1]))
+        return buckets, counts[-1], total
+
+    @property
+    def mean(self):
+        with self._lock:
+            return self.sum / (self.count or 1)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the *q* quantile, `None` when
+        nothing was observed"""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            seen = 0
+            for bound, count in zip(self.bounds, self.counts):
+                seen += count
+                if seen >= rank:
+                    return bound
+            return self.max
+
+    def __repr__(self):
+        return '<Histogram {} observations>'.format(self.count)
+
+
+class TlsStats(object):
+    """Aggregated stats of the TLS handshakes of a https server
+
+    A *resumption_ratio* close to 0 means clients are paying a full
+    handshake on each connection instead of resuming their sessions.
+    """
+    def __init__(self):
+        self.handshakes = 0
+        self.resumed = 0
+        self.failed = 0
+        self.timed_out = 0  # failed for taking longer than the timeout
+        self.handshake_time = Histogram()
+        self._lock = Lock()
+
+    def count(self, seconds, resumed):
+        """Counts a completed handshake which took *seconds*"""
+        with self._lock:
+            self.handshakes += 1
+            self.resumed += bool(resumed)
+        self.handshake_time.observe(seconds)
+
+    def count_failure(self, timeout=False):
+        """Counts a failed handshake, *timeout* if the client took too
+        long to complete it"""
+        with self._lock:
+            self.failed += 1
+            self.timed_out += bool(timeout)
+
+    @property
+    def resumption_ratio(self):
+        """Fraction of the completed handshakes which resumed a session"""
+        with self._lock:
+            return self.resumed / float(self.handshakes or 1)
+
+    def __repr__(self):
+        return '<TlsStats {} handshakes, {} resumed>'.format(
+            self.handshakes, self.resumed)
+
+
+class LatencyStats(object):
+    """Latency :class:`Histogram` of the requests served, by route and
+    response status
+
+    Routes are named after the method and pattern of the
+    :class:`~httptestserver.routing.Route` matched, or the method of the
+    request and ``<unmatched>`` when it matched none, so the number of
+    histograms does not grow with the number of distinct paths requested.
+
+    .. code::
+
+        >> server.stats['GET /users/{id}', 200].quantile(0.99)
+        0.0021
+    """
+    def __init__(self, bounds=LATENCY_BOUNDS):
+        self.bounds = bounds
+        self._histograms = {}
+        self._lock = Lock()
+
+    def observe(self, route, status, seconds):
+        """Counts a request to *route* responded with *status*"""
+        histogram = self._histograms.get((route, status))
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(
+                    (route, status), Histogram(self.bounds))
+        histogram.observe(seconds)
+
+    def __getitem__(self, key):
+        """:class:`Histogram` of a `(route, status)` *key*"""
+        return self._histograms[key]
+
+    def __contains__(self, key):
+        return key in self._histograms
+
+    def __len__(self):
+        return len(self._histograms)
+
+    def keys(self):
+        """List of the `(route, status)` observed"""
+        with self._lock:
+            return sorted(self._histograms, key=str)
+
+    def items(self):
+        """List of `((route, status), histogram)` tuples, sorted as
+        :meth:`keys`"""
+        with self._lock:
+            return sorted(self._histograms.items(), key=lambda item:
+                          str(item[0]))
+
+    def summary(self):
+        """`dict` by `(route, status)` with the ``count``, ``mean``,
+        ``p50``, ``p99``, ``p999`` and ``max`` latencies"""
+        result = {}
+        for key in self.keys():
+            histogram = self._histograms[key]
+            result[key] = {
+                'count': histogram.count,
+                'mean': histogram.mean,
+                'p50': histogram.quantile(0.5),
+                'p99': histogram.quantile(0.99),
+                'p999': histogram.quantile(0.999),
+                'max': histogram.max,
+            }
+        return result
+
+    def reset(self):
+        """Forgets all the histograms"""
+        with self._lock:
+            self._histograms = {}
+
+    def __repr__(self):
+        return '<LatencyStats {} routes>'.format(len(self))
+
+
+class PhaseTimings(object):
+    """Time spent by a request in each phase of its processing
+
+    Phases are marked as they end, so each lasts from the end of the
+    previous one, or the *started* time for the first.
+
+    .. code::
+
+        >> server.history[0]['timings'].durations
+        {'parse': 3.1e-05, 'before_request': 2e-06, 'read_content': ...}
+    """
+    __slots__ = ('started', 'marks')
+
+    def __init__(self, started=None):
+        self.started = time.time() if started is None else started
+        self.marks = []  # (phase, ended at)
+
+    def mark(self, phase):
+        """Marks the end of *phase*"""
+        self.marks.append((phase, time.time()))
+
+    @property
+    def timestamps(self):
+        """`dict` with the time each phase ended"""
+        return dict(self.marks)
+
+    @property
+    def durations(self):
+        """`dict` with the seconds spent in each phase, in order"""
+        result = {}
+        previous = self.started
+        for phase, ended in list(self.marks):
+            result[phase] = ended - previous
+            previous = ended
+        return result
+
+    @property
+    def total(self):
+        """Seconds from the start to the last phase marked"""
+        marks = self.marks
+        return marks[-1][1] - self.started if marks else 0.0
+
+    def __repr__(self):
+        return '<PhaseTimings {}>'.format(', '.join(
+            '{} {:.6f}'.format(phase, seconds)
+            for phase, seconds in self.durations.items()))
+
+
+ResponseSummary = collections.namedtuple(
+    'ResponseSummary', ['status', 'headers', 'length'])
+"""Summary of a response: *status*, *headers* and content *length*, `None`
+for streamed contents of unknown length"""
+
+
+class RecordedRequest(Mapping):
+    """Compact and immutable record of a request kept in the history
+
+    Keeps only the request data instead of a copy of the full handler
+    state, with no references to sockets, files or the server itself.
+
+    For backwards compatibility it can be used as a read-only `dict` with
+    the keys of the handler state (``command``, ``path``,
+    ``request_version``, ``requestline``, ``headers``, ``body``,
+    ``client_address``, ``timestamp``, ``timings``) plus the
+    ``response_*`` configuration values used to respond.
+
+    The :attr:`response` summary is filled in once, when the response is
+    created.
+    """
+    __slots__ = ('method', 'path', 'version', 'headers', 'body',
+                 'client_address', 'timestamp', 'config', 'response',
+                 'timings')
+
+    _keys = {
+        'command': 'method',
+        'method': 'method',
+        'path': 'path',
+        'request_version': 'version',
+        'headers': 'headers',
+        'body': 'body',
+        'client_address': 'client_address',
+        'timestamp': 'timestamp',
+        'timings': 'timings',
+        'response': 'response',
+    }
+
+    def __init__(self, method, path, version, headers, body=None,
+                 client_address=None, timestamp=None, config=None,
+                 timings=None):
+        values = dict(method=method, path=path, version=version,
+                      headers=headers, body=body,
+                      client_address=client_address, timestamp=timestamp,
+                      config=config or {}, response=None, timings=timings)
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    @classmethod
+    def from_handler(cls, handler, config=None):
+        """Creates the record of the request being processed by *handler*"""
+        return cls(handler.command, handler.path, handler.request_version,
+                   handler.headers, getattr(handler, 'body', None),
+                   handler.client_address, getattr(handler, 'timestamp', None),
+                   config, getattr(handler, 'timings', None))
+
+    def complete(self, response, config=None):
+        """Fills in the summary of the :class:`HttpResponse` sent back
+
+        :param config: *(default: None)* The configuration values the
+         response was created with, replacing the ones recorded before.
+        """
+        if self.response is not None:
+            raise AttributeError('Response already recorded')
+
+        if config is not None:
+            object.__setattr__(self, 'config', config)
+
+        object.__setattr__(self, 'response', ResponseSummary(
+            response.status, response.headers,
+            content_length(response.content)))
+
+    @property
+    def requestline(self):
+        return '{} {} {}'.format(self.method, self.path, self.version)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('RecordedRequest is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('RecordedRequest is immutable')
+
+    def __getitem__(self, key):
+        if key in self._keys:
+            return getattr(self, self._keys[key])
+        if key == 'requestline':
+            return self.requestline
+        value = self.config[key]
+        if isinstance(value, LazyValue):
+            value = value()  # not read while serving the request
+        return value
+
+    def __iter__(self):
+        for key in self._keys:
+            yield key
+        yield 'requestline'
+        for key in self.config:
+            if key not in self._keys:
+                yield key
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def __repr__(self):
+        return '<RecordedRequest {} {}>'.format(self.method, self.path)
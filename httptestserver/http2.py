@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP/2
+------
+
+HTTP/2 connections served by a :class:`~httptestserver.http_server.Server`
+created with ``http2=True``. The protocol is negotiated through ALPN on
+https servers and by prior knowledge (h2c) on plain ones, any other
+connection is served with HTTP/1.x as usual.
+
+It needs the `h2 <https://pypi.org/project/h2/>`_ package::
+
+    $ pip install httptestserver[http2]
+
+Every stream is served as a request of its own: it gets the response
+configured in the server data or its route, runs the hooks and is recorded
+in the :attr:`~httptestserver.http_server.ServerState.history` with
+``HTTP/2.0`` as its ``request_version``.
+
+Response delays, ``response_timeout`` or the route *delay*, are scheduled
+per stream instead of blocking the connection, so a slow stream does not
+hold back the rest of them. That allows to benchmark head-of-line effects
+locally:
+
+.. code::
+
+    >>> server = start_server(http2=True, max_concurrent_streams=100)
+    >>> server.routes.add('GET', '/slow', content=b'slow', delay=1)
+    >>> server.routes.add('GET', '/fast', content=b'fast')
+
+Request bodies are captured as with HTTP/1.x. Network profiles and chunk
+delays are not applied to HTTP/2 streams.
+"""
+import time
+import socket
+import select
+import logging
+import contextlib
+import email.utils
+from http.client import HTTPMessage
+
+try:
+    import h2.config
+    import h2.events
+    import h2.settings
+    import h2.exceptions
+    import h2.connection
+except ImportError:  # optional dependency
+    h2 = None
+
+from ._compat import iteritems
+from .body import DEFAULT_CHUNK_SIZE
+from .content import (is_stream, content_length, open_content, iter_content)
+from .history import PhaseTimings
+from .http_server import RequestHandlerMixin
+
+
+PREFACE = b'PRI * HTTP/2.0\r\n\r\nSM\r\n\r\n'
+ALPN_PROTOCOLS = ['h2', 'http/1.1']
+
+# Connection specific headers, forbidden in HTTP/2 responses
+CONNECTION_HEADERS = frozenset([
+    'connection', 'keep-alive', 'proxy-connection', 'transfer-encoding',
+    'upgrade'])
+
+log = logging.getLogger('httptestserver.http2')
+
+
+def require_h2():
+    """:raises ImportError: If the h2 package is not installed."""
+    if h2 is None:
+        raise ImportError('HTTP/2 support needs the h2 package: '
+                          'pip install httptestserver[http2]')
+
+
+def negotiated(handler):
+    """`True` if the connection of *handler* speaks HTTP/2, either chosen
+    through ALPN or starting with the HTTP/2 connection preface"""
+    selected = getattr(handler.connection, 'selected_alpn_protocol', None)
+    if selected is not None and selected() == 'h2':
+        return True
+
+    try:
+        start = handler.rfile.peek(len(PREFACE))[:len(PREFACE)]
+    except (socket.timeout, OSError):
+        return False
+    return len(start) >= 3 and PREFACE.startswith(start)
+
+
+class Stream(RequestHandlerMixin, object):
+    """Request received on an HTTP/2 stream
+
+    Has the attributes of a :class:`~httptestserver.http_server.Handler`
+    request (``command``, ``path``, ``request_version``, ``headers``,
+    ``body``...) so it is recorded and passed to hooks the same way.
+    """
+    request_version = 'HTTP/2.0'
+
+    def __init__(self, connection, stream_id, headers):
+        self.connection = connection
+        self.server = connection.server
+        self.stream_id = stream_id
+        self.client_address = connection.client_address
+        self.timestamp = time.time()
+        self.timings = PhaseTimings(self.timestamp)
+
+        self.headers = HTTPMessage()
+        for name, value in headers:
+            if name == ':method':
+                self.command = value
+            elif name == ':path':
+                self.path = value
+            elif name == ':authority' and 'host' not in self.headers:
+                self.headers['Host'] = value
+            elif not name.startswith(':'):
+                self.headers[name] = value
+        self.requestline = '{} {} {}'.format(
+            self.command, self.path, self.request_version)
+        self.timings.mark('parse')
+
+        self.body = None
+        self.due = None        # time to send the response at
+        self.response = None
+        self.chunks = None     # pending content chunks
+        self.pending = b''
+        self.sink = None
+        self.resources = contextlib.ExitStack()
+
+    def begin(self):
+        """Starts processing the stream once its headers are received"""
+        self.verbose = not self.server.quiet and log.isEnabledFor(logging.INFO)
+        if self.verbose:
+            log.info('Processing %s request on stream %d', self.command,
+                     self.stream_id)
+        self.take_config()
+        self.server.process_hook('before_request')
+        self.timings.mark('before_request')
+
+    def receive(self, data):
+        """Captures a piece of the request body"""
+        if self.sink is None:
+            self.sink = self.server.create_body()
+        self.sink.write(data)
+        self.server.process_hook('request_chunk', self.request_data, data)
+
+    def end_request(self):
+        """Processes the request once fully received, scheduling its
+        response"""
+        timings = self.timings
+        if self.sink is not None:
+            self.body = self.sink.finish()
+            self.request_data['body'] = self.body
+        timings.mark('read_content')
+        self.update_state()
+        timings.mark('update_state')
+        self.entry = self.save_history()
+        timings.mark('save_history')
+
+        self.server.process_hook('before_response', self.request_data)
+        timings.mark('before_response')
+        delay = self.match_route()
+        self.due = time.time() + (delay or 0)
+
+    def respond(self):
+        """Creates the response, once due, and returns its headers"""
+        response = self.response = self.create_response()
+        self.timings.mark('process_request')
+        self.server.process_hook('after_response', self.request_data,
+                                 response)
+        self.save_response(self.entry, response)
+        self.timings.mark('after_response')
+
+        content = response.content
+        headers = [(':status', str(response.status)),
+                   ('server', self.connection.version_string()),
+                   ('date', email.utils.formatdate(usegmt=True))]
+        for field, value in iteritems(response.headers):
+            name = str(field).lower()
+            if name not in CONNECTION_HEADERS:
+                headers.append((name, str(value)))
+
+        length = content_length(content)
+        if length is not None and not any(name == 'content-length'
+                                          for name, _ in headers):
+            headers.append(('content-length', str(length)))
+
+        if self.command == 'HEAD' or content is None:
+            self.chunks = iter(())
+        elif is_stream(content):
+            chunk_size = self.request_data.get('response_chunk_size',
+                                               DEFAULT_CHUNK_SIZE)
+            opened = self.resources.enter_context(open_content(content))
+            self.chunks = iter_content(opened, chunk_size)
+        else:
+            self.chunks = iter([bytes(content)])
+        return headers
+
+    def next_piece(self, size):
+        """Next piece of content of at most *size* bytes, `None` once
+        there is no more content"""
+        while not self.pending:
+            self.pending = next(self.chunks, None)
+            if self.pending is None:
+                return None
+        piece, self.pending = self.pending[:size], self.pending[size:]
+        return piece
+
+    def finish(self):
+        """Runs once the whole response is sent"""
+        timings = self.timings
+        self.resources.close()
+        timings.mark('send_response')
+        self.server.process_hook('after_request', self.request_data,
+                                 self.response)
+        timings.mark('after_request')
+        self.finish_request()
+        timings.mark('finish_request')
+        self.observe(self.response)
+
+
+class Http2Connection(object):
+    """Serves the streams of an HTTP/2 connection accepted by *handler*
+
+    Streams are served from the connection thread, their responses are sent
+    in order of due time, interleaved as the flow control windows allow.
+    """
+    def __init__(self, handler):
+        require_h2()
+        self.handler = handler
+        self.server = handler.server
+        self.socket = handler.connection
+        self.client_address = handler.client_address
+        self.version_string = handler.version_string
+        self.streams = {}   # stream id: stream being received or delayed
+        self.sending = []   # streams whose content is being sent
+        self.served = 0
+
+        config = h2.config.H2Configuration(client_side=False,
+                                           header_encoding='utf-8')
+        self.h2 = h2.connection.H2Connection(config=config)
+
+    def serve(self):
+        """Serves the connection until the client closes it or it idles for
+        the server *idle_timeout*"""
+        log.info('Serving HTTP/2 connection from %s:%d', *self.client_address)
+        self.socket.settimeout(None)
+        self.h2.initiate_connection()
+        if self.server.max_concurrent_streams:
+            self.h2.update_settings({
+                h2.settings.SettingCodes.MAX_CONCURRENT_STREAMS:
+                    self.server.max_concurrent_streams})
+
+        # The preface, at least, is read through the handler buffer
+        buffered = self.handler.rfile.peek(len(PREFACE))
+        self.receive(self.handler.rfile.read(len(buffered)))
+
+        last_activity = time.time()
+        try:
+            while True:
+                self.flush()
+                timeout = self.next_timeout(last_activity)
+                if timeout == 0 and not self.sending and not self.streams:
+                    break  # idle
+                if self.wait_readable(timeout):
+                    data = self.socket.recv(65535)
+                    if not data:
+                        break
+                    self.handler.reader.count += len(data)
+                    last_activity = time.time()
+                    self.receive(data)
+                self.respond_due()
+        except h2.exceptions.ProtocolError:
+            log.exception('HTTP/2 protocol error from %s:%d',
+                          *self.client_address)
+            self.send()
+        finally:
+            for stream in self.sending:
+                stream.resources.close()
+        return self.served
+
+    def wait_readable(self, timeout):
+        pending = getattr(self.socket, 'pending', None)
+        if pending is not None and pending():
+            return True  # decrypted data waiting in the TLS layer
+        readable, _, _ = select.select([self.socket], [], [], timeout)
+        return bool(readable)
+
+    def next_timeout(self, last_activity):
+        """Seconds to wait for data before something else must be done"""
+        if self.sending and self.writable():
+            return 0
+        dues = [stream.due for stream in self.streams.values()
+                if stream.due is not None]
+        if dues:
+            return max(min(dues) - time.time(), 0)
+        if self.server.idle_timeout is None:
+            return None
+        return max(last_activity + self.server.idle_timeout - time.time(), 0)
+
+    def writable(self):
+        return any(self.window(stream) > 0 for stream in self.sending)
+
+    def window(self, stream):
+        try:
+            return self.h2.local_flow_control_window(stream.stream_id)
+        except h2.exceptions.StreamClosedError:
+            return 1  # so it gets dropped
+
+    def receive(self, data):
+        for event in self.h2.receive_data(data):
+            self.handle_event(event)
+        self.send()
+
+    def handle_event(self, event):
+        if isinstance(event, h2.events.RequestReceived):
+            stream = Stream(self, event.stream_id, event.headers)
+            self.streams[event.stream_id] = stream
+            stream.begin()
+            if event.stream_ended is not None:
+                stream.end_request()
+        elif isinstance(event, h2.events.DataReceived):
+            stream = self.streams.get(event.stream_id)
+            if stream is not None:
+                stream.receive(event.data)
+            self.h2.acknowledge_received_data(
+                event.flow_controlled_length, event.stream_id)
+        elif isinstance(event, h2.events.StreamEnded):
+            stream = self.streams.get(event.stream_id)
+            if stream is not None and stream.due is None:
+                stream.end_request()
+        elif isinstance(event, h2.events.StreamReset):
+            self.drop(event.stream_id)
+
+    def drop(self, stream_id):
+        self.streams.pop(stream_id, None)
+        for sending in list(self.sending):
+            if sending.stream_id == stream_id:
+                self.sending.remove(sending)
+                sending.resources.close()
+
+    def respond_due(self):
+        now = time.time()
+        due = sorted((stream for stream in self.streams.values()
+                      if stream.due is not None and stream.due <= now),
+                     key=lambda stream: stream.due)
+        for stream in due:
+            del self.streams[stream.stream_id]
+            headers = stream.respond()
+            self.h2.send_headers(stream.stream_id, headers)
+            self.sending.append(stream)
+        if due:
+            self.send()
+
+    def flush(self):
+        """Sends as much pending content as flow control allows"""
+        for stream in list(self.sending):
+            try:
+                self.send_content(stream)
+            except h2.exceptions.StreamClosedError:
+                self.sending.remove(stream)
+                stream.resources.close()
+        self.send()
+
+    def send_content(self, stream):
+        while True:
+            size = min(self.h2.local_flow_control_window(stream.stream_id),
+                       self.h2.max_outbound_frame_size)
+            if size <= 0:
+                return
+            piece = stream.next_piece(size)
+            if piece is None:
+                self.h2.end_stream(stream.stream_id)
+                self.sending.remove(stream)
+                self.served += 1
+                stream.finish()
+                return
+            self.h2.send_data(stream.stream_id, piece)
+
+    def send(self):
+        data = self.h2.data_to_send()
+        if data:
+            self.socket.sendall(data)
+            self.handler.writer.count += len(data)
@@ -14,15 +14,32 @@ class.
     >>> response.content
     'this is response body text'
 """
+import io
 import os
 import ssl
 import time
+import socket
 import logging
+import functools
 import contextlib
 from threading import Thread, RLock
 
-from ._compat import (iteritems, ThreadingMixIn, HTTPServer,
+from ._compat import (iteritems, Queue, Full, ThreadingMixIn, HTTPServer,
                       BaseHTTPRequestHandler)
+from .body import (create_body, read_body, read_chunked_body,
+                   DEFAULT_CHUNK_SIZE)
+from .content import (is_stream, stream_headers, is_chunked, is_framed,
+                      open_content, content_length, iter_content,
+                      encode_chunks, throttle)
+from .routing import RouteTable, route_name
+from .tls import server_context, DEFAULT_SESSION_TICKETS
+from .cache import ResponseCache, SerializedResponse, response_key
+from .config import ServerData, RequestData, request_state
+from .shaping import find_profile, ShapedReader, ShapedWriter
+from .metrics import CountingReader, CountingWriter, MetricsServer
+from .history import (create_history, RequestCounters, ConnectionStats,
+                      TlsStats, Histogram, LatencyStats, PhaseTimings,
+                      RecordedRequest, LATENCY_BOUNDS, EVICT_OLDEST)
 
 
 def here(path):
@@ -33,6 +50,10 @@ def here(path):
 DEFAULT_HOST = '127.0.0.1'               # loopback
 DEFAULT_PORT = 0                         # random port
 DEFAULT_CERTFILE = here('./server.pem')  # cert + private key
+DEFAULT_BACKLOG = 128                    # pending connections to serve
+DEFAULT_IDLE_TIMEOUT = 60                # seconds a keep-alive connection may idle
+DEFAULT_HANDSHAKE_TIMEOUT = 10           # seconds a client may take on TLS handshakes
+POLL_INTERVAL = 0.05                     # seconds a server takes to notice it is stopped
 
 lock = RLock()
 
@@ -40,17 +61,20 @@ lock = RLock()
 log = logging.getLogger('httptestserver.http')
 
 
-def start_server(host=None, port=None):
+def start_server(host=None, port=None, **kwargs):
     """Create a started HTTP server listening in *host*:*port*
 
     :param host: *(default: 127.0.0.1)* Host for the server to listen.
     :param port: *(default: random)* Port of the server to listen (should not be in use).
+    :param kwargs: Extra options for :class:`Server`, ie: ``workers=4``.
     :returns: A created and started :class:`Server`
     """
-    return Server.start_server(host or DEFAULT_HOST, port or DEFAULT_PORT)
+    return Server.start_server(host or DEFAULT_HOST, port or DEFAULT_PORT,
+                               **kwargs)
 
 
-def start_ssl_server(host=None, port=None, certfile=None, keyfile=None):
+def start_ssl_server(host=None, port=None, certfile=None, keyfile=None,
+                     **kwargs):
     """Create a started HTTPS server listening in *host*:*port*
 
     It configures server certificate using *certfile* and *keyfile*.
@@ -61,108 +85,499 @@ def start_ssl_server(host=None, port=None, certfile=None, keyfile=None):
      accepted by :class:`HTTPServer`.
     :param keyfile: *(default: None)* Path to private key file as accepted by
      :class:`HTTPServer`. Default comes bundled with *certfile*.
+    :param kwargs: Extra options for :class:`Server`, ie: ``workers=4``, or
+     the TLS options of :meth:`Server.start_ssl_server`.
     :returns: A created and started :class:`Server`
     """
     return Server.start_ssl_server(host or DEFAULT_HOST, port or DEFAULT_PORT,
-                                   certfile or DEFAULT_CERTFILE, keyfile)
+                                   certfile or DEFAULT_CERTFILE, keyfile,
+                                   **kwargs)
 
 
-class Handler(BaseHTTPRequestHandler):
+class RequestHandlerMixin(object):
+    """Request processing shared by the handlers of every server
+
+    Takes the configuration snapshot of a request, keeps its state, creates
+    its response and records it, whatever the connection it is read from:
+    :class:`Handler`, :class:`~httptestserver.async_server.AsyncHandler`
+    and the :class:`~httptestserver.http2.Stream` of HTTP/2 connections.
+
+    Handlers provide the ``server``, ``command``, ``path`` and ``timings``
+    attributes along with the rest of
+    :data:`~httptestserver.config.REQUEST_FIELDS`.
+    """
+    verbose = True
+    route = None
+    params = None
+    config = None
+    request_data = None
+
+    def take_config(self):
+        """Takes the :attr:`ServerState.config` snapshot to serve the
+        request with, and creates the :attr:`request_data` `dict` from it"""
+        config = self.server.current_config()
+        self.request_data = RequestData(config, self.state)
+        self.config = config
+
+    @property
+    def state(self):
+        """Dict with the current request state"""
+        return request_state(self)
+
+    def chunk_callback(self):
+        """Function which passes each body chunk read to the
+        ``request_chunk`` hook, if registered"""
+        if self.server.hooks.get('request_chunk'):
+            return functools.partial(
+                self.server.process_hook, 'request_chunk', self.request_data)
+
+    def create_shaper(self):
+        """:class:`~httptestserver.shaping.Shaper` of the request when a
+        ``response_profile`` applies to it, `None` otherwise"""
+        profile = find_profile(self.config.get('response_profile'),
+                               self.path)
+        if profile is not None:
+            return profile.shaper()
+
+    def update_state(self):
+        """Copies the request state to :attr:`ServerState.data`"""
+        self.server.data.mirror(self.request_data)
+
+    def save_history(self):
+        """Create a new entry in history
+
+        :returns: The entry saved, see :meth:`ServerState.save_history`.
+        """
+        return self.server.save_history(self)
+
+    def match_route(self):
+        """Matches the request with the server routes
+
+        :returns: Seconds to wait before responding, if any: the delay of
+         the route matched or the ``response_timeout``.
+        """
+        self.route, self.params = self.server.routes.match(self.command,
+                                                           self.path)
+        timeout = self.request_data.get('response_timeout')
+        if self.route is not None and self.route.delay is not None:
+            timeout = self.route.delay
+        return timeout
+
+    def create_response(self):
+        if self.route is not None:
+            return self.create_route_response()
+
+        return HttpResponse(
+            status=self.request_data.get('response_status', 200),
+            headers=self.request_data.get('response_headers', ()),
+            content=self.request_data.get('response_content', None),
+        )
+
+    def create_route_response(self):
+        route = self.route
+        if self.verbose:
+            log.info('Server responding with route %s %s', route.method,
+                     route.pattern)
+        if route.response is not None:
+            return route.response(self.request_data, self.params)
+        return HttpResponse(route.status, route.headers, route.content)
+
+    def is_static(self, response):
+        """Whether *response* is the one configured in the server data or
+        route, not one built for the request by a ``response`` function, a
+        :class:`~httptestserver.config.LazyValue` or a hook
+
+        Only static responses are kept in the
+        :class:`~httptestserver.cache.ResponseCache`, those built per request
+        would never be served again.
+        """
+        route = self.route
+        if route is not None:
+            if route.response is not None:
+                return False
+            headers, content = route.headers, route.content
+        elif self.config is None:
+            return False  # error sent before taking the config
+        else:
+            headers = self.config.get('response_headers', ())
+            content = self.config.get('response_content', None)
+        return response.headers is headers and response.content is content
+
+    def save_response(self, entry, response):
+        """Completes the history *entry* with a summary of *response*"""
+        if isinstance(entry, RecordedRequest):
+            entry.complete(response, self.request_data.evaluated_config())
+        self.server.count_request(self.command, self.path, response.status)
+
+    def finish_request(self):
+        # Avoid same behaviour on next request
+        if self.request_data.get('response_clear'):
+            self.server.reset_response_data()
+
+        if self.request_data.get('response_reset'):
+            self.server.reset()
+
+    def observe(self, response):
+        """Adds the request served with *response* to the latency stats
+        and to the access log of the server"""
+        route = route_name(self.route, self.command)
+        self.server.observe_latency(self.timings.total, route,
+                                    response.status)
+        self.server.log_access(self, route, response)
+
+
+class Handler(RequestHandlerMixin, BaseHTTPRequestHandler):
     """Handles all requests and collects server data
 
     Handles all the requests on the :meth:`handle_request` method which is
     also responsible for building a response.
 
-    The :attr:`Server.data` dictionary is updated on at the begining of each
-    request with the current server state. See :class:`BaseHTTPRequestHandler`
-    documentation for the full list of server attributes available.
+    Each request is served with the :attr:`Server.config` snapshot taken
+    when it starts, and its state is kept in its own :attr:`request_data`
+    `dict`. See :class:`BaseHTTPRequestHandler` documentation for the full
+    list of server attributes available.
+
+    The :attr:`Server.data` dictionary is updated with the state of each
+    request once its body is read.
 
     The default handler behaviour can be controlled through
     :attr:`Server.data`.
+
+    With a *keep_alive* :class:`Server` it responds with HTTP/1.1 and serves
+    every request of a connection, pipelined or not, until the client
+    closes it, it idles for *idle_timeout* seconds or *max_requests* are
+    served.
+
+    With an *http2* :class:`Server` connections negotiating HTTP/2 are
+    served by a :class:`~httptestserver.http2.Http2Connection`.
+
+    Bytes read and written are counted by the :attr:`reader` and
+    :attr:`writer` wrappers of the connection files, and added to the
+    :attr:`Server.connection_stats` after each request.
+
+    Requests are logged at info level, unless the server is *quiet*, which
+    skips every per-request log call along with the access lines
+    :meth:`log_message` writes to `stderr`.
     """
+    shaper = None
+    timings = None
+    requests_served = 0
+    output = None
+
+    def setup(self):
+        if self.server.keep_alive:
+            self.protocol_version = 'HTTP/1.1'
+            self.timeout = self.server.idle_timeout
+        self.connected = time.time()
+        BaseHTTPRequestHandler.setup(self)
+        self.rfile = self.reader = CountingReader(self.rfile)
+        self.wfile = self.writer = CountingWriter(self.wfile)
+        self.server.open_connection()
+
+    def handle(self):
+        if self.server.http2:
+            from .http2 import negotiated, Http2Connection
+            if negotiated(self):
+                self.requests_served = Http2Connection(self).serve()
+                return
+        BaseHTTPRequestHandler.handle(self)
+
+    def finish(self):
+        try:
+            BaseHTTPRequestHandler.finish(self)
+        finally:
+            self.count_traffic()
+            self.server.count_connection(self.requests_served,
+                                         time.time() - self.connected)
+
+    def parse_request(self):
+        self.timings = PhaseTimings()
+        self.body = None
+        return BaseHTTPRequestHandler.parse_request(self)
+
     def handle_request(self):
         """Handles server request/response"""
-        log.info('Processing %s request', self.command)
+        self.verbose = not self.server.quiet and log.isEnabledFor(logging.INFO)
+        if self.verbose:
+            log.info('Processing %s request', self.command)
+        self.timestamp = time.time()
+        timings = self.timings
+        timings.mark('parse')
+        self.requests_served += 1
+        max_requests = self.server.max_requests
+        if max_requests and self.requests_served >= max_requests:
+            self.close_connection = True
+        self.take_config()
+        self.shaper = self.create_shaper()
 
         # Read and process a http request
         # Create and send a http response
         self.server.process_hook('before_request')
-        self.update_state()        # Save server current state
-        self.read_content()        # Read request body
-        self.save_history()        # Save current state in history
-
-        self.server.process_hook('before_response', self.server.data)
+        timings.mark('before_request')
+        if not self.read_content():   # Read request body
+            return
+        timings.mark('read_content')
+        self.update_state()           # Save server current state
+        timings.mark('update_state')
+        entry = self.save_history()   # Save current state in history
+        timings.mark('save_history')
+
+        self.server.process_hook('before_response', self.request_data)
+        timings.mark('before_response')
         response = self.process_request()  # Process received request
-        self.server.process_hook('after_response', self.server.data, response)
+        timings.mark('process_request')
+        self.server.process_hook('after_response', self.request_data, response)
+        self.save_response(entry, response)
+        timings.mark('after_response')
 
         self.send_http_response(response)  # send status, headers and content
-        self.server.process_hook('after_request', self.server.data, response)
+        timings.mark('send_response')
+        self.server.process_hook('after_request', self.request_data, response)
+        timings.mark('after_request')
         self.finish_request()  # Optionally reset server state
+        timings.mark('finish_request')
+        # Observed before flushing, so a client reading the response finds
+        # the request in the stats, not in those of a later reset.
+        self.observe(response)
+        self.flush_output()
+        self.count_traffic()
+
+    def count_traffic(self):
+        """Adds the bytes read and written since the last call to the
+        :attr:`Server.connection_stats`"""
+        self.server.count_traffic(self.reader.take(), self.writer.take())
 
     def read_content(self):
-        # Read request body (if any)
-        if self.command in ('POST', 'PUT', 'PATCH'):
-            content_length = self.headers['Content-Length']
-            log.info('Content-Length: %s', content_length)
-            self.server.data['body'] = self.rfile.read(int(content_length))
+        """Reads the request body (if any), it must be consumed whatever the
+        method is so the connection is left ready for the next request
+
+        :returns: `False` if the body is malformed, in which case a 400
+         error is sent and the connection closed.
+        """
+        self.body = None
+        rfile = self.rfile
+        if self.shaper is not None:
+            rfile = ShapedReader(rfile, self.shaper)
+
+        content_length = self.headers['Content-Length']
+        try:
+            if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+                if self.verbose:
+                    log.info('Transfer-Encoding: chunked')
+                self.body = read_chunked_body(
+                    rfile, self.server.create_body(), self.chunk_callback())
+            elif content_length is not None:
+                if self.verbose:
+                    log.info('Content-Length: %s', content_length)
+                self.body = read_body(
+                    rfile.read, int(content_length),
+                    self.server.create_body(), self.chunk_callback())
+            else:
+                return True
+        except ValueError:
+            log.warning('Malformed request body from %s:%d',
+                        *self.client_address[:2])
+            self.send_error(400)
+            self.close_connection = True
+            return False
+        self.request_data['body'] = self.body
+        return True
 
     def process_request(self):
         # Simulate timeouts
-        timeout = self.server.data.get('response_timeout')
+        timeout = self.match_route()
         if timeout is not None:
-            log.info('Server sleeping for: %d s', timeout)
+            if self.verbose:
+                log.info('Server sleeping for: %d s', timeout)
             time.sleep(timeout)
 
         return self.create_response()
 
-    def create_response(self):
-        return HttpResponse(
-            status=self.server.data.get('response_status', 200),
-            headers=self.server.data.get('response_headers', ()),
-            content=self.server.data.get('response_content', None),
-        )
-
     def send_http_response(self, response):
+        with self.shaped_output():
+            if is_stream(response.content):
+                return self.send_stream(response)
+
+            static = self.is_static(response)
+            with self.deferred_output():
+                self.send_bytes(self.frame_response(response), static)
+
+    def send_bytes(self, response, static=False):
+        """Sends a response with `bytes` content, serialized once when the
+        server caches responses and the response is *static*, see
+        :meth:`is_static`"""
+        cache, key = self.server.response_cache, None
+        if cache is not None and static and self.shaper is None:
+            key = response_key(response, self.protocol_version,
+                               self.version_string(), self.command == 'HEAD')
+        if key is not None:
+            return self.send_serialized(response.status, cache.get(
+                key, functools.partial(self.serialize_response, response)))
+
         self.send_status(response.status)
         self.send_headers(response.headers)
-        self.send_content(response.content)
+        if self.command != 'HEAD':
+            self.send_content(response.content)
+
+    def frame_response(self, response):
+        """Adds to a response with `bytes` content the headers an HTTP/1.1
+        client needs to find where it ends and whether the connection is
+        closed after it"""
+        if self.protocol_version < 'HTTP/1.1':
+            return response
+
+        headers = list(iteritems(response.headers))
+        if not is_framed(headers):
+            headers.append(('Content-Length', len(response.content or b'')))
+        if (self.close_connection and
+                not any(field.lower() == 'connection' for field, _ in headers)):
+            headers.append(('Connection', 'close'))
+        return HttpResponse(response.status, tuple(headers), response.content)
+
+    def serialize_response(self, response):
+        """Serializes a response with `bytes` content as
+        :meth:`send_status`, :meth:`send_headers` and :meth:`send_content`
+        would send it, see :class:`~httptestserver.cache.SerializedResponse`
+        """
+        if self.verbose:
+            log.info('Server serializing response with status code %d',
+                     response.status)
+        reason = self.responses.get(response.status, ('',))[0]
+        head = '{} {} {}\r\nServer: {}\r\n'.format(
+            self.protocol_version, response.status, reason,
+            self.version_string())
+
+        lines, connection = [], None
+        for field, value in iteritems(response.headers):
+            if field.lower() == 'connection':
+                connection = str(value).lower()
+            lines.append('{}: {}\r\n'.format(field, value))
+        lines.append('\r\n')
+
+        tail = ''.join(lines).encode('latin-1', 'strict')
+        if self.command != 'HEAD':
+            tail += response.content or b''
+        return SerializedResponse(head.encode('latin-1', 'strict'), tail,
+                                  response.content, connection)
+
+    def send_serialized(self, status, serialized):
+        """Sends a serialized response with a single write"""
+        self.log_request(status)
+        if serialized.connection == 'close':
+            self.close_connection = True
+        elif serialized.connection == 'keep-alive':
+            self.close_connection = False
+        self.wfile.write(serialized.render())
+
+    @contextlib.contextmanager
+    def deferred_output(self):
+        """Context where writes are kept in :attr:`output` on persistent
+        connections, so the response is flushed once the server state is
+        final and a client reusing the connection always finds it ready"""
+        if not self.server.keep_alive or self.shaper is not None:
+            yield
+            return
+
+        wfile, self.wfile = self.wfile, io.BytesIO()
+        try:
+            yield
+        finally:
+            self.output, self.wfile = self.wfile.getvalue(), wfile
+
+    def flush_output(self):
+        """Sends the :attr:`output` kept by :meth:`deferred_output`"""
+        output, self.output = self.output, None
+        if output:
+            self.wfile.write(output)
+
+    @contextlib.contextmanager
+    def shaped_output(self):
+        """Context where writes are throttled by the request shaper"""
+        wfile = self.wfile
+        if self.shaper is not None:
+            self.wfile = ShapedWriter(wfile, self.shaper)
+        try:
+            yield
+        finally:
+            self.wfile = wfile
+
+    def send_stream(self, response):
+        """Sends a response whose content is a path, a file or an iterable,
+        see :mod:`httptestserver.content`"""
+        headers = list(iteritems(response.headers))
+        headers.extend(stream_headers(
+            headers, response.content, self.request_version >= 'HTTP/1.1'))
+        chunked = is_chunked(headers)
+        if self.protocol_version < 'HTTP/1.1':
+            if chunked:
+                # Chunked contents need an HTTP/1.1 response
+                self.protocol_version = 'HTTP/1.1'
+                headers.append(('Connection', 'close'))
+        elif self.close_connection or not is_framed(headers):
+            # Content ends with the connection
+            headers.append(('Connection', 'close'))
+
+        self.send_status(response.status)
+        self.send_headers(headers)
+        if self.command == 'HEAD':
+            return
+
+        chunk_size = self.request_data.get('response_chunk_size',
+                                           DEFAULT_CHUNK_SIZE)
+        delay = self.request_data.get('response_chunk_delay')
+        with open_content(response.content) as content:
+            length = content_length(content)
+            if (length is not None and not chunked and
+                    self.shaper is None and
+                    hasattr(self.connection, 'sendfile')):
+                return self.send_file(content, length, chunk_size, delay)
+
+            chunks = iter_content(content, chunk_size)
+            if chunked:
+                chunks = encode_chunks(chunks)
+            for chunk in throttle(chunks, delay):
+                self.wfile.write(chunk)
+
+    def send_file(self, file, length, chunk_size, delay):
+        """Sends *length* bytes of *file* with :meth:`socket.sendfile`"""
+        if self.verbose:
+            log.info('Server sending file: %d bytes', length)
+        offset, sent = file.tell(), 0
+        count = chunk_size if delay else length
+        while sent < length:
+            if sent and delay:
+                time.sleep(delay)
+            chunk = self.connection.sendfile(
+                file, offset + sent, min(count, length - sent))
+            if not chunk:
+                break  # file truncated
+            sent += chunk
+            self.writer.count += chunk
 
     def send_status(self, status):
-        log.info('Server returning status code %d', status)
+        if self.verbose:
+            log.info('Server returning status code %d', status)
         self.send_response(status)
 
     def send_headers(self, headers):
+        verbose = self.verbose
         for field, content in iteritems(headers):
-            log.info('Server setting response header %s: %s', field, content)
+            if verbose:
+                log.info('Server setting response header %s: %s', field,
+                         content)
             self.send_header(field, content)
 
         self.end_headers()
 
     def send_content(self, content):
         if content is not None:
-            log.info('Server sending content: %d bytes', len(content))
+            if self.verbose:
+                log.info('Server sending content: %d bytes', len(content))
             self.wfile.write(content)
 
-    def finish_request(self):
-        # Avoid same behaviour on next request
-        if self.server.data.get('response_clear'):
-            self.server.reset_response_data()
-
-        if self.server.data.get('response_reset'):
-            self.server.reset()
-
-    @property
-    def state(self):
-        """Dict with the current server state"""
-        return self.__dict__
-
-    def update_state(self):
-        """Copies current server state"""
-        self.server.data.update(self.state)
-
-    def save_history(self):
-        """Create a new entry in history"""
-        self.server.save_history()
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
 
     def __getattr__(self, name):
         # redirect all requests to handle_request
@@ -172,96 +587,98 @@ class Handler(BaseHTTPRequestHandler):
         return super(Handler, self).__getattribute__(name)
 
 
-class Server(ThreadingMixIn, HTTPServer, Thread):
-    """HTTP Server
-
-    Starts in a child thread.
-    Thread stops and closes when the parent process does.
-    Handles each request on a new thread, *forks* on each request.
-
-    Server state after each request can be checked as a `dict` through the
-    thread-save attribute :attr:`data`, which is updated at the begining of
-    each request. See :class:`Handler` and :class:`BaseHTTPRequestHandler` to
-    see the information available on that `dict`.
-
-    .. code::
-
-        >> server.data
-        {'requestline': 'GET /url HTTP/1.1', 'path': '/url', ...}
+class ServerState(object):
+    """Server state shared by all the http server implementations
 
-    if several requests are made, their state are kept in order in the history:
+    Holds the :attr:`data`, :attr:`history` and :attr:`hooks` of a server and
+    the methods to manage them, so :class:`Server` and
+    :class:`~httptestserver.async_server.AsyncServer` expose the very same
+    api to the tests.
 
-    .. code::
+    The response configuration is published as immutable
+    :class:`~httptestserver.config.ResponseConfig` snapshots, see
+    :attr:`config`.
 
-        >> server.history
-        [
-          {'path': '/first', ..},
-          {'path': '/second', ..}
-        ]
-
-    *About multithreading:* It is necessary that each request gets serverd by
-    a different thread, in case that more than one request is made at the same
-    time. If any two requests are attended at the same time by the *same
-    thread*, risk of deadlock exists.
+    Subclasses must provide the ``scheme``, ``host`` and ``port`` attributes.
     """
-    def __init__(self, host, port,  scheme='http', handler=Handler):
-        """Creates a new :class:`Server`
-
-        :param host: Host for the server to listen.
-        :param port: Port of the server to listen (should free).
-        :param scheme: *(default: http)* 'http' or 'https'.
-        :param handler: (default: :class:`Handler`) A
-         :class:`BaseHTTPRequestHandler` class.
+    def __init__(self, history_size=None, history_policy=EVICT_OLDEST,
+                 history_counters=False, full_history=False,
+                 body_threshold=None, store_body=True, cache_responses=True,
+                 quiet=False, access_log=None):
         """
-        Thread.__init__(self)
-        HTTPServer.__init__(self, (host, port), handler)
-        self._data = {}
-        self._history = []
+        :param history_size: *(default: None)* Max number of entries kept in
+         :attr:`history`, unbounded by default.
+        :param history_policy: *(default: oldest)* Entries evicted when the
+         history is full: ``'oldest'`` or ``'newest'``.
+        :param history_counters: *(default: False)* Keep aggregated request
+         counts in :attr:`counters`.
+        :param full_history: *(default: False)* Save a copy of the full
+         :attr:`data` state in :attr:`history` instead of a compact
+         :class:`~httptestserver.history.RecordedRequest`.
+        :param body_threshold: *(default: None)* Capture request bodies in
+         a :class:`~httptestserver.body.CapturedBody` which spills to disk
+         beyond this number of bytes. By default bodies are read as `bytes`.
+        :param store_body: *(default: True)* `False` to discard request
+         bodies once read, keeping only their size and hash in a
+         :class:`~httptestserver.body.CapturedBody`. Useful along with the
+         ``request_chunk`` hook to process streamed uploads.
+        :param cache_responses: *(default: True)* Serialize responses with
+         `bytes` content once and keep them in :attr:`response_cache`.
+        :param quiet: *(default: False)* Skip the info logs of each request
+         and the access lines written to `stderr`.
+        :param access_log: *(default: None)* An
+         :class:`~httptestserver.access_log.AccessLog` to record the
+         requests served in, started and stopped along with the server.
+        """
+        self.history_size = history_size
+        self.history_policy = history_policy
+        self.history_counters = history_counters
+        self.full_history = full_history
+        self.body_threshold = body_threshold
+        self.store_body = store_body
+        self.cache_responses = cache_responses
+        self.quiet = quiet
+        self.access_log = access_log
+        self._data = ServerData()
+        self._history = self.create_history()
         self._hooks = {}
-        self.daemon = True  # finish along with parent process
-        self.scheme = scheme
-
-    @classmethod
-    def start_server(cls, host, port):
-        """Creates and starts a http :class:`Server`
-
-        :param host: Host for the server to listen.
-        :param port: Port of the server to listen (should not be in use).
-        :returns: A created and started http :class:`Server`
+        self._routes = RouteTable()
+        self._counters = self.create_counters()
+        self._response_cache = self.create_response_cache()
+        self._connection_stats = ConnectionStats()
+        self._latency = Histogram(LATENCY_BOUNDS)
+        self._stats = LatencyStats()
+
+    def create_history(self):
+        """Creates the storage of :attr:`history`
+
+        Defaults to a :class:`~httptestserver.history.ShardedHistory` so
+        handler threads do not contend when saving requests, or to a
+        :class:`~httptestserver.history.RingHistory` when the server has a
+        *history_size*.
         """
-        log.info('Starting http server %s:%d', host, port)
-        server = cls(host, port, 'http')
-        server.start()
-        return server
+        return create_history(self.history_size, self.history_policy)
 
-    @classmethod
-    def start_ssl_server(cls, host, port, certfile, keyfile):
-        """Creates and starts a https :class:`Server`
+    def create_body(self):
+        """Creates the sink where a request body is read into
 
-        :param host: Host for the server to listen.
-        :param port: Port of the server to listen (should not be in use).
-        :param certfile: Path to certificate file as
-         accepted by :class:`HTTPServer`.
-        :param keyfile: Path to private key file as accepted by
-         :class:`HTTPServer`. Default it's bundled with *certfile*.
-        :returns: A created and started https :class:`Server`
+        See :func:`~httptestserver.body.create_body`.
         """
-        log.info('Starting https server %s:%d', host, port)
-        log.debug('Using certfile: "%s"', certfile)
-        log.debug('Using keyfile: "%s"', keyfile)
-        server = cls(host, port, 'https')
-        server.socket = ssl.wrap_socket(
-            server.socket, server_side=True, certfile=certfile, keyfile=keyfile)
-        server.start()
-        return server
+        return create_body(self.body_threshold, self.store_body)
 
-    @property
-    def host(self):
-        return self.server_address[0]
+    def create_response_cache(self):
+        if self.cache_responses:
+            return ResponseCache()
 
     @property
-    def port(self):
-        return self.server_address[1]
+    def response_cache(self):
+        """:class:`~httptestserver.cache.ResponseCache` of serialized
+        responses, `None` unless the server has *cache_responses* enabled"""
+        return self._response_cache
+
+    def create_counters(self):
+        if self.history_counters:
+            return RequestCounters()
 
     @property
     def data(self):
@@ -277,11 +694,26 @@ class Server(ThreadingMixIn, HTTPServer, Thread):
             the next response.
 
         response_content
-            A `bytes` with the body of the next response.
+            A `bytes` with the body of the next response. It can also be a
+            path, a file object or an iterable of `bytes` to be streamed,
+            see :mod:`httptestserver.content`.
+
+        response_chunk_size
+            An `int` with the size in bytes of the pieces in which files are
+            sent when streamed, 64KiB by default.
+
+        response_chunk_delay
+            A number with the time in seconds to wait between the chunks of
+            a streamed content.
 
         response_timeout
             A number with the time in seconds to wait before starting a response.
 
+        response_profile
+            A :class:`~httptestserver.shaping.NetworkProfile` which throttles
+            reading the request body and writing the response, or a `dict`
+            of path patterns to profiles. See :mod:`httptestserver.shaping`.
+
         response_clear
             `True` if server user state should be reset after responding.
             This is useful when responding with `3xx` redirections.
@@ -289,11 +721,39 @@ class Server(ThreadingMixIn, HTTPServer, Thread):
         response_reset
             `True` if server state should be totally reset after the response.
 
-        value might be a callable, in which case, it is inmediately called
-        with no arguments.
+        value might be a callable, in which case, it is called with no
+        arguments the first time a request reads it, see
+        :class:`~httptestserver.config.LazyValue` for other evaluation
+        policies.
+
+        Setting any ``response_*`` value publishes a new :attr:`config`
+        snapshot, the rest of the values are the state of the last request
+        served.
         """
-        with lock:
-            return self._data
+        return self._data
+
+    @property
+    def config(self):
+        """Current :class:`~httptestserver.config.ResponseConfig` snapshot
+        of the ``response_*`` values of :attr:`data` (read-only)
+
+        Each request is served with the snapshot taken when it starts.
+        """
+        return self._data.config
+
+    def configure(self, *args, **values):
+        """Updates the response configuration and publishes it at once
+
+        Accepts the same arguments than :meth:`dict.update`.
+
+        :returns: The new :attr:`config` snapshot.
+        """
+        self._data.update(*args, **values)
+        return self._data.config
+
+    def current_config(self):
+        """Snapshot of :attr:`config` to serve a request with"""
+        return self._data.config
 
     @property
     def hooks(self):
@@ -319,10 +779,33 @@ class Server(ThreadingMixIn, HTTPServer, Thread):
             Arguments: ``(request, response)`` Called after a response has
             been sent back to the client.
 
+        request_chunk
+            Arguments: ``(request, chunk)`` Called with each piece of the
+            request body as it is read from the connection, before the
+            ``before_response`` hook.
+
+        The ``request`` passed is a `dict` owned by the request being
+        served, with its state and the response configuration. Changing its
+        ``response_*`` values changes only the response to that request.
+
         Return value is be ignored.
         """
-        with lock:
-            return self._hooks
+        return self._hooks
+
+    @property
+    def routes(self):
+        """Gives access to the server
+        :class:`~httptestserver.routing.RouteTable`
+
+        Requests matching a route get its response, the rest of them get the
+        response configured in :attr:`data`.
+
+        .. code::
+
+            >> server.routes.add('GET', '/users/{id}', content=b'{}')
+            >> server.routes.add('POST', '/users', status=201)
+        """
+        return self._routes
 
     def register_hook(self, name, function):
         if not callable(function):
@@ -337,35 +820,168 @@ class Server(ThreadingMixIn, HTTPServer, Thread):
     def reset(self):
         """Resets all server data
 
-        This resets :attr:`data`, :attr:`history` and :attr:`hooks`.
+        This resets :attr:`data`, :attr:`history`, :attr:`hooks` and
+        :attr:`routes`.
         """
         with lock:
-            self._data = {}
-            self._history = []
+            self._data = ServerData()
+            self._history = self.create_history()
             self._hooks = {}
+            self._routes = RouteTable()
+            self._counters = self.create_counters()
+            self._connection_stats = ConnectionStats(
+                self._connection_stats.active)
+            self._latency = Histogram(LATENCY_BOUNDS)
+            self._stats.reset()
+            if self._response_cache is not None:
+                self._response_cache.clear()
 
     @property
     def history(self):
-        """Gives access to all the server states in a `list` (read-only)"""
-        with lock:
-            return self._history
+        """Gives access to all the server states in a `list` (read-only)
 
-    def save_history(self):
-        """Saves current data state in :attr:`history`"""
-        # expand callable values
-        with lock:
-            self._data = {k: (v if not callable(v) else v())
-                          for k, v in self.data.items()}
-        self._history.append(dict(self.data))
+        The `list` is a snapshot of the states in order of arrival, taken
+        on each access. Entries are
+        :class:`~httptestserver.history.RecordedRequest` which can be read
+        as a `dict`, or copies of :attr:`data` when the server has
+        *full_history* enabled.
+        """
+        return self._history.snapshot()
+
+    @property
+    def history_length(self):
+        """Number of entries in :attr:`history`, without copying them"""
+        return len(self._history)
+
+    @property
+    def history_evicted(self):
+        """Number of entries evicted from a bounded :attr:`history`"""
+        return getattr(self._history, 'evicted', 0)
+
+    @property
+    def counters(self):
+        """Aggregated request counts, accurate even if :attr:`history` is
+        bounded. `None` unless the server has *history_counters* enabled.
+
+        .. code::
+
+            >> server.counters.paths
+            Counter({'/first': 2, '/second': 1})
+            >> server.counters.statuses
+            Counter({200: 3})
+
+        See :class:`~httptestserver.history.RequestCounters`.
+        """
+        return self._counters
+
+    def count_request(self, method, path, status):
+        """Adds a served request to :attr:`counters` (when enabled)"""
+        counters = self._counters
+        if counters is not None:
+            counters.count(method, path, status)
+
+    @property
+    def connection_stats(self):
+        """Aggregated stats of the connections: requests served on each,
+        reuse ratio, lifetime, active connections and bytes transferred
+
+        .. code::
+
+            >> server.connection_stats.reuse_ratio
+            0.9
+
+        See :class:`~httptestserver.history.ConnectionStats`.
+        """
+        return self._connection_stats
+
+    def open_connection(self):
+        """Adds an active connection to :attr:`connection_stats`"""
+        self._connection_stats.open()
+
+    def count_traffic(self, received, sent):
+        """Adds the bytes *received* and *sent* to :attr:`connection_stats`"""
+        self._connection_stats.count_traffic(received, sent)
+
+    def count_connection(self, requests, lifetime):
+        """Adds a closed connection to :attr:`connection_stats`"""
+        self._connection_stats.count(requests, lifetime)
+
+    @property
+    def latency(self):
+        """Server side latency of the requests served: seconds from their
+        arrival until their response is ready to be written. Requests are
+        observed before the client can read their response, unless its
+        content is streamed.
+
+        .. code::
+
+            >> server.latency.quantile(0.99)
+            0.005
+
+        See :class:`~httptestserver.history.Histogram`.
+        """
+        return self._latency
+
+    @property
+    def stats(self):
+        """Server side latency of the requests served by route and
+        response status, reset along with the server or on its own
+
+        .. code::
+
+            >> server.stats['GET /users/{id}', 200].quantile(0.99)
+            0.0021
+            >> server.stats.reset()
+
+        See :class:`~httptestserver.history.LatencyStats`. The time spent
+        in each phase of a request is in its ``timings`` in :attr:`history`.
+        """
+        return self._stats
+
+    def observe_latency(self, seconds, route=None, status=None):
+        """Adds the latency of a request served to :attr:`latency` and to
+        the :attr:`stats` of its *route* and response *status*"""
+        self._latency.observe(seconds)
+        self._stats.observe(route, status, seconds)
+
+    def log_access(self, handler, route, response):
+        """Adds the request *handler* has just served to the *access_log*
+        (when enabled)"""
+        access_log = self.access_log
+        if access_log is not None:
+            access_log.record(handler.client_address, handler.command,
+                              handler.path, route, response.status,
+                              content_length(response.content),
+                              handler.timings.total)
+
+    def save_history(self, handler=None):
+        """Saves current request in :attr:`history`
+
+        Saves a :class:`~httptestserver.history.RecordedRequest` of the
+        request being processed by *handler*, or a copy of its request data,
+        with its configuration values evaluated, when the server has
+        *full_history* enabled. Without *handler* a copy
+        of the current :attr:`data` state is saved.
+
+        :returns: The saved entry.
+        """
+        if handler is None:
+            entry = dict(self.data)
+        elif self.full_history:
+            request_data = handler.request_data
+            entry = {key: request_data[key] for key in request_data}
+        else:
+            entry = RecordedRequest.from_handler(handler, handler.config)
+        self._history.append(entry)
+        return entry
 
     @property
     def response_data(self):
         """All user-defined response properties"""
-        return {k: v for k, v in self.data.items() if k.startswith('response_')}
+        return dict(self.config)
 
     def reset_response_data(self):
-        for k in self.response_data:
-            del self.data[k]
+        self._data.replace_config(())
 
     def url(self, path):
         """Compose a full URL to the server from the url path:
@@ -377,15 +993,321 @@ class Server(ThreadingMixIn, HTTPServer, Thread):
         """
         return "{}://{}:{}{}".format(self.scheme, self.host, self.port, path)
 
+
+class Server(ServerState, ThreadingMixIn, HTTPServer, Thread):
+    """HTTP Server
+
+    Starts in a child thread.
+    Thread stops and closes when the parent process does.
+    Handles each request on a new thread, *forks* on each request.
+
+    Server state after each request can be checked as a `dict` through the
+    thread-save attribute :attr:`data`, which is updated with the state of
+    each request. See :class:`Handler` and :class:`BaseHTTPRequestHandler` to
+    see the information available on that `dict`.
+
+    .. code::
+
+        >> server.data
+        {'requestline': 'GET /url HTTP/1.1', 'path': '/url', ...}
+
+    if several requests are made, their state are kept in order in the history:
+
+    .. code::
+
+        >> server.history
+        [
+          {'path': '/first', ..},
+          {'path': '/second', ..}
+        ]
+
+    *About multithreading:* It is necessary that each request gets serverd by
+    a different thread, in case that more than one request is made at the same
+    time. If any two requests are attended at the same time by the *same
+    thread*, risk of deadlock exists.
+
+    *About worker pools:* When created with *workers*, connections are
+    served by a fixed pool of threads instead. Accepted connections wait in a
+    queue of *backlog* size for a free worker and are closed when the queue
+    is full. See :attr:`queue_depth` and :attr:`rejected_connections` to size
+    the pool. Take into account that every worker serves a single connection
+    at a time, so blocking hooks or timeouts hold a worker.
+
+    *About persistent connections:* When created with *keep_alive*, it
+    responds with HTTP/1.1 and keeps connections open between requests. See
+    :attr:`connection_stats` to check how clients reuse them. Take into
+    account that an idle connection holds its thread or worker until it
+    is closed. Connections still open are closed when the server stops.
+
+    *About TLS:* https servers share their :class:`ssl.SSLContext` and
+    sessions, so clients can resume them without a full handshake. See
+    :attr:`tls_stats` for the handshakes counts, resumption ratio and
+    handshake times. Handshakes run on the thread or worker serving the
+    connection, so clients which stall them do not keep the server from
+    accepting other connections, and they are abandoned after
+    *handshake_timeout*.
+
+    *About HTTP/2:* When created with *http2*, connections are served with
+    HTTP/2 if negotiated through ALPN or with prior knowledge, see
+    :mod:`httptestserver.http2`.
+
+    *About metrics:* When created with *metrics_port*, its :attr:`metrics`
+    server exposes request counts, latencies, connections and bytes
+    transferred for Prometheus, see :mod:`httptestserver.metrics`.
+    """
+    daemon_threads = True  # connection threads finish along with the process
+
+    def __init__(self, host, port,  scheme='http', handler=Handler,
+                 workers=None, backlog=None, reuse_port=False,
+                 keep_alive=False, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 max_requests=None, http2=False, max_concurrent_streams=None,
+                 handshake_timeout=DEFAULT_HANDSHAKE_TIMEOUT,
+                 metrics_port=None, **kwargs):
+        """Creates a new :class:`Server`
+
+        :param host: Host for the server to listen.
+        :param port: Port of the server to listen (should free).
+        :param scheme: *(default: http)* 'http' or 'https'.
+        :param handler: (default: :class:`Handler`) A
+         :class:`BaseHTTPRequestHandler` class.
+        :param workers: *(default: None)* Number of threads of the worker
+         pool. By default a new thread is started for each connection.
+        :param backlog: *(default: 128)* Size of the listen queue and, with
+         *workers*, max number of accepted connections waiting for a worker.
+        :param reuse_port: *(default: False)* Bind with ``SO_REUSEPORT`` so
+         several processes can share the port. See
+         :class:`~httptestserver.cluster.ServerCluster`.
+        :param keep_alive: *(default: False)* Respond with HTTP/1.1 and keep
+         connections open between requests.
+        :param idle_timeout: *(default: 60)* Seconds to wait for a new
+         request on an open connection. `None` waits forever.
+        :param max_requests: *(default: None)* Number of requests after which
+         a connection is closed, unlimited by default.
+        :param http2: *(default: False)* Serve HTTP/2 connections too, it
+         needs the ``h2`` package.
+        :param max_concurrent_streams: *(default: None)* Max number of
+         streams an HTTP/2 client may open at once, unlimited by default.
+        :param handshake_timeout: *(default: 10)* Seconds to wait for a
+         client to complete the TLS handshake on https servers. `None` waits
+         forever.
+        :param metrics_port: *(default: None)* Port to serve the
+         :attr:`metrics` at, ``0`` for a random one. Not served by default.
+        :param kwargs: History options, see :class:`ServerState`.
+        :raises ImportError: If *http2* is given and ``h2`` is not installed.
+        """
+        if http2:
+            from .http2 import require_h2  # python 3 only
+            require_h2()
+        self.workers = workers
+        self.reuse_port = reuse_port
+        self.keep_alive = keep_alive
+        self.idle_timeout = idle_timeout
+        self.max_requests = max_requests
+        self.http2 = http2
+        self.max_concurrent_streams = max_concurrent_streams
+        self.handshake_timeout = handshake_timeout
+        self.request_queue_size = backlog or DEFAULT_BACKLOG
+
+        Thread.__init__(self)
+        HTTPServer.__init__(self, (host, port), handler)
+        ServerState.__init__(self, **kwargs)
+        self.daemon = True  # finish along with parent process
+        self.scheme = scheme
+
+        self.rejected_connections = 0
+        self.tls_stats = TlsStats()
+        self._queue = Queue(maxsize=backlog or DEFAULT_BACKLOG)
+        self._workers = []
+        self._connections = set()
+        self._connections_lock = RLock()
+        self.metrics = None
+        if metrics_port is not None:
+            self.metrics = MetricsServer(self, self.host, metrics_port)
+
+    @classmethod
+    def start_server(cls, host, port, **kwargs):
+        """Creates and starts a http :class:`Server`
+
+        :param host: Host for the server to listen.
+        :param port: Port of the server to listen (should not be in use).
+        :param kwargs: Extra options for :class:`Server`.
+        :returns: A created and started http :class:`Server`
+        """
+        log.info('Starting http server %s:%d', host, port)
+        server = cls(host, port, 'http', **kwargs)
+        server.start()
+        return server
+
+    @classmethod
+    def start_ssl_server(cls, host, port, certfile, keyfile, ciphers=None,
+                         min_version=None, max_version=None,
+                         session_tickets=DEFAULT_SESSION_TICKETS, **kwargs):
+        """Creates and starts a https :class:`Server`
+
+        Its :class:`ssl.SSLContext` is shared with the rest of servers using
+        the same certificate and TLS options, see :mod:`httptestserver.tls`.
+
+        :param host: Host for the server to listen.
+        :param port: Port of the server to listen (should not be in use).
+        :param certfile: Path to certificate file as
+         accepted by :class:`HTTPServer`.
+        :param keyfile: Path to private key file as accepted by
+         :class:`HTTPServer`. Default it's bundled with *certfile*.
+        :param ciphers: *(default: None)* OpenSSL cipher list, the OpenSSL
+         defaults when not given.
+        :param min_version: *(default: None)* Lowest :class:`ssl.TLSVersion`
+         accepted.
+        :param max_version: *(default: None)* Highest :class:`ssl.TLSVersion`
+         accepted.
+        :param session_tickets: *(default: 2)* Number of TLS 1.3 session
+         tickets sent to clients, ``0`` disables session tickets.
+        :param kwargs: Extra options for :class:`Server`.
+        :returns: A created and started https :class:`Server`
+        """
+        log.info('Starting https server %s:%d', host, port)
+        log.debug('Using certfile: "%s"', certfile)
+        log.debug('Using keyfile: "%s"', keyfile)
+        server = cls(host, port, 'https', **kwargs)
+        alpn_protocols = None
+        if server.http2:
+            from .http2 import ALPN_PROTOCOLS
+            alpn_protocols = ALPN_PROTOCOLS
+        context = server_context(
+            certfile, keyfile, ciphers, min_version, max_version,
+            alpn_protocols, session_tickets)
+        server.socket = context.wrap_socket(
+            server.socket, server_side=True, do_handshake_on_connect=False)
+        server.start()
+        return server
+
+    @property
+    def host(self):
+        return self.server_address[0]
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def server_bind(self):
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        HTTPServer.server_bind(self)
+
+    def finish_request(self, request, client_address):
+        if isinstance(request, ssl.SSLSocket):
+            if not self.handshake(request, client_address):
+                return
+        HTTPServer.finish_request(self, request, client_address)
+
+    def handshake(self, request, client_address):
+        """Completes the TLS handshake of an accepted connection, counting
+        it in :attr:`tls_stats`
+
+        It runs on the thread serving the connection, not on the one
+        accepting them, and it is abandoned after *handshake_timeout*.
+
+        :returns: Whether the handshake succeeded.
+        """
+        started = time.time()
+        request.settimeout(self.handshake_timeout)
+        try:
+            request.do_handshake()
+        except socket.timeout:
+            self.tls_stats.count_failure(timeout=True)
+            log.warning('TLS handshake timed out with %s:%d', *client_address)
+            return False
+        except (ssl.SSLError, OSError):
+            self.tls_stats.count_failure()
+            log.warning('TLS handshake failed with %s:%d', *client_address)
+            return False
+        request.settimeout(None)
+        self.tls_stats.count(time.time() - started, request.session_reused)
+        return True
+
+    @property
+    def queue_depth(self):
+        """Number of accepted connections waiting for a pool worker"""
+        return self._queue.qsize()
+
+    def process_request(self, request, client_address):
+        with self._connections_lock:
+            self._connections.add(request)
+        if not self.workers:
+            return ThreadingMixIn.process_request(self, request, client_address)
+
+        try:
+            self._queue.put_nowait((request, client_address))
+        except Full:
+            # Only the serving thread updates the counter, no lock needed
+            self.rejected_connections += 1
+            log.warning('Worker pool full, rejecting connection from %s:%d',
+                        *client_address)
+            self.shutdown_request(request)
+
+    def shutdown_request(self, request):
+        with self._connections_lock:
+            self._connections.discard(request)
+        HTTPServer.shutdown_request(self, request)
+
+    def close_connections(self):
+        """Closes the open connections, so the threads or workers serving
+        them see their clients gone and finish"""
+        with self._connections_lock:
+            connections = list(self._connections)
+        for request in connections:
+            try:
+                # plain socket shutdown, TLS ones would send a close notify
+                socket.socket.shutdown(request, socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def process_pool_requests(self):
+        """Serves queued connections until a `None` is received"""
+        for request, client_address in iter(self._queue.get, None):
+            self.process_request_thread(request, client_address)
+
+    def start_workers(self):
+        for _ in range(self.workers or 0):
+            worker = Thread(target=self.process_pool_requests)
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def stop_workers(self):
+        for worker in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+    def reset(self):
+        """Resets all server data, see :meth:`ServerState.reset`, and
+        the connection counters of the server"""
+        ServerState.reset(self)
+        self.rejected_connections = 0
+        self.tls_stats = TlsStats()
+
     def stop(self):
-        """Stops the server thread"""
+        """Stops the server thread, closing all the open connections"""
         self.shutdown()
+        self.close_connections()
 
     def run(self):
         try:
             log.info('Starting server')
-            self.serve_forever()
+            self.start_workers()
+            if self.metrics is not None:
+                self.metrics.start()
+            if self.access_log is not None:
+                self.access_log.start()
+            self.serve_forever(POLL_INTERVAL)
         finally:
+            if self.access_log is not None:
+                self.access_log.stop()
+            if self.metrics is not None:
+                self.metrics.stop()
+            self.close_connections()
+            self.stop_workers()
             log.info('Stopping server at: %s:%d', self.host, self.port)
 
 
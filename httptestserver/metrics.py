@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+Metrics
+-------
+
+Metrics of a running server in the Prometheus text exposition format,
+served on a side port, so long running servers can be watched without
+reading their :attr:`~httptestserver.http_server.Server.history`.
+
+Servers created with a *metrics_port* serve them at ``/metrics``:
+
+.. code::
+
+    >>> server = start_server(metrics_port=9100)
+    >>> print(requests.get(server.metrics.url).text)
+    # HELP httptestserver_requests_total Requests served by route and status.
+    # TYPE httptestserver_requests_total counter
+    httptestserver_requests_total{route="GET /users/{id}",status="200"} 42
+    ...
+
+Metrics are read from the stats the server keeps anyway: its
+:attr:`~httptestserver.http_server.ServerState.connection_stats`,
+:attr:`~httptestserver.http_server.ServerState.stats` and history. Serving
+requests only updates the own lock of each of them, never the global one,
+and bytes are counted by each connection and added to the stats once per
+request. Scrapes are served from their own thread.
+
+Latency histograms are exported with the buckets of
+:data:`~httptestserver.history.DEFAULT_BUCKETS`, from 0.5ms to 10s. Their
+``route`` label is the route matched, requests matching none share a
+``<unmatched>`` one, so the number of series does not grow with the number
+of distinct paths requested.
+"""
+import logging
+import threading
+from threading import Thread
+
+from ._compat import HTTPServer, BaseHTTPRequestHandler
+from .history import DEFAULT_BUCKETS
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+PREFIX = 'httptestserver_'
+METRICS_PATH = '/metrics'
+POLL_INTERVAL = 0.05  # seconds the metrics server takes to notice it is stopped
+
+log = logging.getLogger('httptestserver.metrics')
+
+
+class CountingReader(object):
+    """File object wrapper which counts the bytes read"""
+    def __init__(self, rfile):
+        self.rfile = rfile
+        self.count = 0
+
+    def read(self, *args):
+        data = self.rfile.read(*args)
+        self.count += len(data)
+        return data
+
+    def readline(self, *args):
+        data = self.rfile.readline(*args)
+        self.count += len(data)
+        return data
+
+    def take(self):
+        """Bytes read since the previous call"""
+        count, self.count = self.count, 0
+        return count
+
+    def __getattr__(self, name):
+        return getattr(self.rfile, name)
+
+
+class CountingWriter(object):
+    """File object wrapper which counts the bytes written"""
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.count = 0
+
+    def write(self, data):
+        result = self.wfile.write(data)
+        self.count += len(data)
+        return result
+
+    def take(self):
+        """Bytes written since the previous call"""
+        count, self.count = self.count, 0
+        return count
+
+    def __getattr__(self, name):
+        return getattr(self.wfile, name)
+
+
+def escape(value):
+    """Label *value* escaped for the text exposition format"""
+    return (str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float):
+        return repr(value)
+    return str(int(value))
+
+
+def format_sample(name, labels, value):
+    if not labels:
+        return '{} {}'.format(name, format_value(value))
+    return '{}{{{}}} {}'.format(name, ','.join(
+        '{}="{}"'.format(label, escape(text))
+        for label, text in labels.items()), format_value(value))
+
+
+def metric(lines, name, kind, description, samples):
+    """Adds the *samples* of a metric of *kind* to *lines*
+
+    :param samples: List of `(suffix, labels, value)` tuples, *suffix* being
+     appended to the metric name, ie: ``'_bucket'`` for histograms.
+    """
+    name = PREFIX + name
+    lines.append('# HELP {} {}'.format(name, description))
+    lines.append('# TYPE {} {}'.format(name, kind))
+    lines.extend(format_sample(name + suffix, labels, value)
+                 for suffix, labels, value in samples)
+
+
+def histogram_samples(histogram, labels, bounds=DEFAULT_BUCKETS):
+    """Samples of a :class:`~httptestserver.history.Histogram` exported
+    with *bounds* buckets"""
+    buckets, count, total = histogram.cumulative(bounds)
+    samples = [('_bucket', dict(labels, le=format_value(float(bound))),
+                value) for bound, value in buckets]
+    samples.append(('_sum', labels, total))
+    samples.append(('_count', labels, count))
+    return samples
+
+
+def collect(server):
+    """Lines with the metrics of *server* in the text exposition format
+
+    Any server is accepted, metrics are exported for the stats it has:
+    http servers export their requests and latency by route and status,
+    smtp servers the messages received.
+    """
+    lines = []
+    metric(lines, 'threads', 'gauge', 'Threads of the process.',
+           [('', {}, threading.active_count())])
+    metric(lines, 'history_size', 'gauge', 'Entries kept in the history.',
+           [('', {}, server.history_length)])
+    metric(lines, 'history_evicted_total', 'counter',
+           'Entries evicted from a bounded history.',
+           [('', {}, server.history_evicted)])
+
+    connections = server.connection_stats
+    metric(lines, 'connections_in_flight', 'gauge', 'Open connections.',
+           [('', {}, connections.active)])
+    metric(lines, 'connections_total', 'counter', 'Closed connections.',
+           [('', {}, connections.connections)])
+    metric(lines, 'received_bytes_total', 'counter',
+           'Bytes received from clients.', [('', {}, connections.received)])
+    metric(lines, 'sent_bytes_total', 'counter', 'Bytes sent to clients.',
+           [('', {}, connections.sent)])
+
+    if hasattr(server, 'rejected_connections'):
+        metric(lines, 'rejected_connections_total', 'counter',
+               'Connections rejected by a full worker pool.',
+               [('', {}, server.rejected_connections)])
+    if hasattr(server, 'received_messages'):
+        metric(lines, 'messages_total', 'counter', 'Messages received.',
+               [('', {}, server.received_messages)])
+
+    stats = getattr(server, 'stats', None)
+    if stats is not None:
+        histograms = [({'route': route, 'status': status}, histogram)
+                      for (route, status), histogram in stats.items()]
+        metric(lines, 'requests_total', 'counter',
+               'Requests served by route and status.',
+               [('', labels, histogram.count)
+                for labels, histogram in histograms])
+        metric(lines, 'request_duration_seconds', 'histogram',
+               'Server side latency of the requests by route and status.',
+               [sample for labels, histogram in histograms
+                for sample in histogram_samples(histogram, labels)])
+    return lines
+
+
+def render(server):
+    """Metrics of *server* in the text exposition format"""
+    return '\n'.join(collect(server)) + '\n'
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the metrics of :attr:`MetricsServer.target`"""
+    def do_GET(self):
+        if self.path.split('?')[0] not in (METRICS_PATH, '/'):
+            return self.send_error(404)
+
+        content = render(self.server.target).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        log.debug(format, *args)
+
+
+class MetricsServer(HTTPServer, Thread):
+    """Side server exposing the metrics of a *target* server
+
+    Scrapes are served one at a time from its own thread. It is started
+    and stopped along with the *target* server.
+    """
+    def __init__(self, target, host, port):
+        """
+        :param target: Server whose metrics are served.
+        :param host: Host for the server to listen.
+        :param port: Port of the server to listen, ``0`` for a random one.
+        """
+        Thread.__init__(self)
+        HTTPServer.__init__(self, (host, port), MetricsHandler)
+        self.daemon = True  # finish along with parent process
+        self.target = target
+
+    @property
+    def host(self):
+        return self.server_address[0]
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    @property
+    def url(self):
+        """Full URL of the metrics"""
+        return 'http://{}:{}{}'.format(self.host, self.port, METRICS_PATH)
+
+    def stop(self):
+        """Stops the server thread and closes its socket"""
+        if self.is_alive():
+            self.shutdown()
+        self.server_close()
+
+    def run(self):
+        log.info('Serving metrics at: %s', self.url)
+        self.serve_forever(POLL_INTERVAL)
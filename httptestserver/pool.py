@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Pool
+----
+
+Process wide pool of started servers, reused across test classes.
+
+Starting and stopping a server for every test class adds up in large test
+suites. A :class:`ServerPool` keeps the servers returned to it running,
+after a full reset, and leases them again to the next test asking for
+the same kind of server with the same options.
+
+.. code::
+
+    >>> server = pool.lease('https', workers=4)
+    >>> # use server
+    >>> pool.release(server)
+
+The test mixins of :mod:`httptestserver.testing` lease their servers from
+the process wide :data:`pool`, and so do the fixtures of
+:mod:`httptestserver.pytest_plugin`.
+"""
+import atexit
+import logging
+from threading import Lock
+
+from ._compat import PY2
+from .http_server import start_server, start_ssl_server
+
+
+log = logging.getLogger('httptestserver.pool')
+
+STARTERS = {
+    'http': start_server,
+    'https': start_ssl_server,
+}
+
+if not PY2:
+    from .async_server import start_async_server
+    from .smtp_server import start_smtp_server
+
+    STARTERS['async'] = start_async_server
+    STARTERS['smtp'] = start_smtp_server
+
+SETTINGS = ('keep_alive', 'idle_timeout', 'max_requests',
+            'max_concurrent_streams', 'handshake_timeout', 'limit',
+            'data_size_limit', 'quiet', 'access_log', 'full_history',
+            'store_body', 'body_threshold')
+"""Server attributes read while serving, which tests may change"""
+
+
+def pool_key(kind, options):
+    """Key of the servers of *kind* started with *options*
+
+    :raises ValueError: If *kind* is not a known kind of server.
+    :raises TypeError: If any of the *options* is not hashable.
+    """
+    if kind not in STARTERS:
+        raise ValueError('Unknown kind of server: {}'.format(kind))
+    key = (kind, tuple(sorted(options.items())))
+    hash(key)
+    return key
+
+
+def server_settings(server):
+    """Current values of the :data:`SETTINGS` *server* has"""
+    return {name: getattr(server, name) for name in SETTINGS
+            if hasattr(server, name)}
+
+
+class ServerPool(object):
+    """Started servers kept to be leased again, by kind and options
+
+    Kinds of servers are ``'http'``, ``'https'``, ``'async'`` and
+    ``'smtp'``. Options are the extra keyword arguments of their start
+    functions, ie: :func:`~httptestserver.http_server.start_server`, and
+    must be hashable.
+    """
+    def __init__(self):
+        self.started = 0  # servers started by the pool
+        self.leases = 0
+        self.closed = False
+        self._idle = {}      # key: list of idle servers
+        self._leased = {}    # id(server): key, server
+        self._settings = {}  # id(server): settings it was started with
+        self._lock = Lock()
+
+    def lease(self, kind='http', **options):
+        """Server of *kind* and *options* for the exclusive use of the
+        caller until it is released
+
+        An idle server is reused if there is any, a new one is started
+        otherwise.
+        """
+        key = pool_key(kind, options)
+        with self._lock:
+            self.leases += 1
+            idle = self._idle.get(key)
+            server = idle.pop() if idle else None
+
+        if server is None:
+            server = self.start(kind, options)
+        with self._lock:
+            self._leased[id(server)] = (key, server)
+        return server
+
+    def release(self, server):
+        """Returns a leased *server* to the pool after a full reset, see
+        :meth:`reset`
+
+        Servers not leased from the pool, or stopped meanwhile, are stopped
+        and forgotten, as well as every server once the pool is closed.
+        """
+        with self._lock:
+            key, _ = self._leased.pop(id(server), (None, None))
+
+        if key is None or self.closed or not server.is_alive():
+            with self._lock:
+                self._settings.pop(id(server), None)
+            server.stop()
+            return
+
+        self.reset(server)
+        with self._lock:
+            self._idle.setdefault(key, []).append(server)
+
+    def prewarm(self, kind='http', count=1, **options):
+        """Starts *count* idle servers of *kind* and *options* ahead of the
+        tests which will lease them"""
+        key = pool_key(kind, options)
+        servers = [self.start(kind, options) for _ in range(count)]
+        with self._lock:
+            self._idle.setdefault(key, []).extend(servers)
+
+    def start(self, kind, options):
+        log.debug('Starting pooled %s server', kind)
+        server = STARTERS[kind](**options)
+        with self._lock:
+            self.started += 1
+            self._settings[id(server)] = server_settings(server)
+        return server
+
+    def reset(self, server):
+        """Resets *server* and restores the :data:`SETTINGS` it was started
+        with, which the last test may have changed"""
+        with self._lock:
+            settings = self._settings.get(id(server), {})
+        for name, value in settings.items():
+            setattr(server, name, value)
+        server.reset()
+
+    @property
+    def idle(self):
+        """Number of servers waiting to be leased"""
+        with self._lock:
+            return sum(len(servers) for servers in self._idle.values())
+
+    def close(self):
+        """Stops the idle servers, leased ones are stopped when released"""
+        with self._lock:
+            self.closed = True
+            servers = [server for servers in self._idle.values()
+                       for server in servers]
+            self._idle = {}
+            for server in servers:
+                self._settings.pop(id(server), None)
+        for server in servers:
+            server.stop()
+
+    def __repr__(self):
+        return '<ServerPool {} started, {} idle>'.format(self.started,
+                                                         self.idle)
+
+
+pool = ServerPool()
+"""Process wide :class:`ServerPool`, closed at exit"""
+
+atexit.register(pool.close)
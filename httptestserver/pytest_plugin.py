@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Pytest plugin
+-------------
+
+Fixtures with servers leased from the process wide
+:data:`~httptestserver.pool.pool`. The plugin is registered when the
+package is installed, so they are available in any test:
+
+.. code::
+
+    def test_it_should_get(http_server):
+        requests.get(http_server.url('/path'))
+
+        assert http_server.data['path'] == '/path'
+
+``http_server``, ``https_server``, ``async_server`` and ``smtp_server``
+are reset before each test. The server itself is kept for the whole
+session by default, any other scope is set with the
+``--httptestserver-scope`` option or the ``httptestserver_scope`` ini
+value.
+
+Under `pytest-xdist <https://pypi.org/project/pytest-xdist/>`_ every
+worker process leases servers from its own pool, listening on random
+ports, so workers never share or wait for a server. The kinds of servers
+listed in the ``httptestserver_prewarm`` ini value are started by each
+worker as its session starts, and never by the controller process.
+
+With ``--httptestserver-report`` the number of requests each test made and
+their server side latency are shown at the end of the session.
+
+There are also fixtures of a fixed scope, ie: ``session_http_server`` or
+``module_https_server``, which are not reset between the tests sharing
+them.
+"""
+import pytest
+
+from .pool import pool
+
+
+DEFAULT_SCOPE = 'session'
+REPORT_PROPERTY = 'httptestserver'
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('httptestserver')
+    group.addoption('--httptestserver-scope', dest='httptestserver_scope',
+                    default=None, help='Scope of the servers of the '
+                    'httptestserver fixtures (default: session)')
+    group.addoption('--httptestserver-report', dest='httptestserver_report',
+                    action='store_true', default=False,
+                    help='Report requests and server latency per test')
+    parser.addini('httptestserver_scope', default=DEFAULT_SCOPE,
+                  help='Scope of the servers of the httptestserver fixtures')
+    parser.addini('httptestserver_prewarm', type='args', default=[],
+                  help='Kinds of servers started as each worker starts')
+
+
+def is_controller(config):
+    """Whether this is the process of an xdist run distributing tests to
+    worker processes, which runs no test itself"""
+    return (not hasattr(config, 'workerinput') and
+            bool(getattr(config.option, 'numprocesses', None)))
+
+
+def pytest_sessionstart(session):
+    config = session.config
+    if is_controller(config):
+        return
+    for kind in config.getini('httptestserver_prewarm'):
+        pool.prewarm(kind)
+
+
+def server_scope(fixture_name, config):
+    """Scope of the leased servers, from the command line or ini file"""
+    return (config.getoption('httptestserver_scope') or
+            config.getini('httptestserver_scope'))
+
+
+def leased_server(kind, scope=server_scope):
+    """Fixture leasing a server of *kind* for the given *scope*"""
+    @pytest.fixture(scope=scope)
+    def fixture(server_pool):
+        server = server_pool.lease(kind)
+        yield server
+        server_pool.release(server)
+    fixture.__doc__ = 'Pooled {} server'.format(kind)
+    return fixture
+
+
+def reset_server(leased):
+    """Fixture resetting the server of the *leased* fixture for each test"""
+    @pytest.fixture
+    def fixture(request, server_pool):
+        server = request.getfixturevalue(leased)
+        server_pool.reset(server)
+        yield server
+        if request.config.getoption('httptestserver_report'):
+            request.node.user_properties.append(
+                (REPORT_PROPERTY, server_report(server)))
+    fixture.__doc__ = 'Server of ``{}`` reset for the test'.format(leased)
+    return fixture
+
+
+def server_report(server):
+    """Requests and latency stats of the test *server* has just served"""
+    latency = getattr(server, 'latency', None)
+    if latency is None:
+        return {'requests': len(server.history)}
+    return {'requests': latency.count, 'mean': latency.mean,
+            'p99': latency.quantile(0.99), 'max': latency.max}
+
+
+@pytest.fixture(scope='session')
+def server_pool():
+    """The process wide :class:`~httptestserver.pool.ServerPool`"""
+    return pool
+
+
+leased_http_server = leased_server('http')
+leased_https_server = leased_server('https')
+leased_async_server = leased_server('async')
+leased_smtp_server = leased_server('smtp')
+
+http_server = reset_server('leased_http_server')
+https_server = reset_server('leased_https_server')
+async_server = reset_server('leased_async_server')
+smtp_server = reset_server('leased_smtp_server')
+
+session_http_server = leased_server('http', 'session')
+module_http_server = leased_server('http', 'module')
+session_https_server = leased_server('https', 'session')
+module_https_server = leased_server('https', 'module')
+session_async_server = leased_server('async', 'session')
+module_async_server = leased_server('async', 'module')
+session_smtp_server = leased_server('smtp', 'session')
+module_smtp_server = leased_server('smtp', 'module')
+
+
+class ServerReport(object):
+    """Collects the server stats of each test, also from xdist workers"""
+    def __init__(self):
+        self.tests = []
+
+    def pytest_runtest_logreport(self, report):
+        for name, stats in report.user_properties:
+            if name == REPORT_PROPERTY and report.when == 'teardown':
+                self.tests.append((report.nodeid, stats))
+
+    def pytest_terminal_summary(self, terminalreporter):
+        write = terminalreporter.write_line
+        terminalreporter.section('httptestserver')
+        if not self.tests:
+            write('no requests served')
+        for nodeid, stats in self.tests:
+            if 'mean' not in stats or not stats['requests']:
+                write('{}: {} requests'.format(nodeid, stats['requests']))
+                continue
+            write('{}: {} requests, latency mean {:.2f}ms p99 <= {:.2f}ms '
+                  'max {:.2f}ms'.format(nodeid, stats['requests'],
+                                        stats['mean'] * 1000,
+                                        stats['p99'] * 1000,
+                                        stats['max'] * 1000))
+
+
+def pytest_configure(config):
+    if config.getoption('httptestserver_report') and (
+            not hasattr(config, 'workerinput')):
+        config.pluginmanager.register(ServerReport(), 'httptestserver-report')
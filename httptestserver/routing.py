@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Routing
+-------
+
+Per-path responses, so a single server can stub a service with many
+endpoints without chaining hooks.
+
+Routes are compiled into a trie of path segments when added, so a request
+is dispatched walking its path once, whatever the number of routes.
+Requests which do not match any route get the response configured in
+:attr:`~httptestserver.http_server.ServerState.data`, as usual.
+
+.. code::
+
+    >>> server.routes.add('GET', '/users/{id}', content=b'{"name": "john"}',
+    ...                   headers={'Content-Type': 'application/json'})
+    >>> server.routes.add('DELETE', '/users/{id}', status=204)
+    >>> requests.get(server.url('/users/1')).status_code
+    200
+    >>> server.routes.match('GET', '/users/1')
+    (<Route GET /users/{id}>, {'id': '1'})
+"""
+from threading import Lock
+
+
+ANY_METHOD = '*'
+UNMATCHED = '<unmatched>'  # pattern named for the requests matching no route
+
+
+def route_name(route, method):
+    """Name of the *route* matched by a request, or of the request
+    *method* and :data:`UNMATCHED` when it matched none, so requests to
+    any number of distinct paths share a few names"""
+    if route is not None:
+        return '{} {}'.format(route.method, route.pattern)
+    return '{} {}'.format(method, UNMATCHED)
+
+
+class Route(object):
+    """Response to the requests matching a *method* and path *pattern*
+
+    The number of requests matched is kept in :attr:`calls`.
+    """
+    def __init__(self, method, pattern, status=200, headers=(), content=None,
+                 delay=None, response=None):
+        """
+        :param method: Http method, `None` or ``'*'`` to match any method.
+        :param pattern: Path pattern, segments like ``{name}`` match any
+         value, which is passed along as a parameter.
+        :param status: *(default: 200)* Status code of the response.
+        :param headers: *(default: ())* A `dict` or a `(k, v) tuple` with the
+         response headers.
+        :param content: *(default: None)* The response content, see
+         ``response_content`` in
+         :attr:`~httptestserver.http_server.ServerState.data`.
+        :param delay: *(default: None)* Seconds to wait before responding,
+         overrides ``response_timeout``.
+        :param response: *(default: None)* A callable receiving the
+         ``(request, params)`` and returning the
+         :class:`~httptestserver.http_server.HttpResponse` to send, instead
+         of *status*, *headers* and *content*.
+        """
+        self.method = (method or ANY_METHOD).upper()
+        self.pattern = pattern
+        self.status = status
+        self.headers = headers
+        self.content = content
+        self.delay = delay
+        self.response = response
+        self.calls = 0
+        self._lock = Lock()
+
+    def count(self):
+        with self._lock:
+            self.calls += 1
+
+    def __repr__(self):
+        return '<Route {} {}>'.format(self.method, self.pattern)
+
+
+class Node(object):
+    __slots__ = ('children', 'param', 'name', 'routes')
+
+    def __init__(self):
+        self.children = {}  # literal segment: node
+        self.param = None   # node matching any segment
+        self.name = None    # parameter name of this node
+        self.routes = {}    # method: route
+
+
+def split(path):
+    """Segments of *path*, query string left out"""
+    return path.split('?', 1)[0].split('/')
+
+
+def parse_param(segment):
+    if segment.startswith('{') and segment.endswith('}'):
+        return segment[1:-1]
+
+
+class RouteTable(object):
+    """Routes of a server, compiled in a trie of path segments
+
+    Literal segments take precedence over parameters, ``/users/me`` is
+    matched before ``/users/{id}`` whatever the order they were added in.
+    Adding a route with the same method and pattern replaces the previous
+    one.
+    """
+    def __init__(self):
+        self._root = Node()
+        self._routes = []
+        self._lock = Lock()
+
+    def add(self, method, pattern, **kwargs):
+        """Adds a new route
+
+        Accepts the same arguments than :class:`Route`.
+
+        :returns: The :class:`Route` added.
+        :raises ValueError: If a parameter is named differently than the
+         one of a route already added at the same position.
+        """
+        route = Route(method, pattern, **kwargs)
+        with self._lock:
+            node = self._root
+            for segment in split(pattern):
+                name = parse_param(segment)
+                if name is None:
+                    node = node.children.setdefault(segment, Node())
+                    continue
+
+                if node.param is None:
+                    param = Node()
+                    param.name = name
+                    node.param = param
+                elif node.param.name != name:
+                    raise ValueError('Parameter {{{}}} conflicts with {{{}}}'
+                                     .format(name, node.param.name))
+                node = node.param
+
+            previous = node.routes.get(route.method)
+            if previous is not None:
+                self._routes.remove(previous)
+            node.routes[route.method] = route
+            self._routes.append(route)
+        return route
+
+    def match(self, method, path):
+        """Finds the route for a request and counts the call
+
+        :returns: A `(route, params)` tuple, `(None, None)` if no route
+         matches.
+        """
+        params = {}
+        route = self._match(self._root, split(path), 0, method.upper(), params)
+        if route is None:
+            return None, None
+
+        route.count()
+        return route, params
+
+    def _match(self, node, segments, index, method, params):
+        if index == len(segments):
+            return node.routes.get(method) or node.routes.get(ANY_METHOD)
+
+        segment = segments[index]
+        child = node.children.get(segment)
+        if child is not None:
+            route = self._match(child, segments, index + 1, method, params)
+            if route is not None:
+                return route
+
+        param = node.param
+        if param is not None and segment:
+            route = self._match(param, segments, index + 1, method, params)
+            if route is not None:
+                params[param.name] = segment
+                return route
+
+    def clear(self):
+        """Removes all the routes"""
+        with self._lock:
+            self._root = Node()
+            self._routes = []
+
+    def __iter__(self):
+        return iter(list(self._routes))
+
+    def __len__(self):
+        return len(self._routes)
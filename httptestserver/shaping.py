@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Shaping
+-------
+
+Network conditions simulated on the server side of the connection.
+
+A :class:`NetworkProfile` describes the time to first byte, bandwidth and
+jitter of a connection. Set as the ``response_profile`` server data value,
+it throttles every write of the response (status line, headers and
+content) and every read of the request body:
+
+.. code::
+
+    >>> server.data['response_profile'] = NetworkProfile(
+    ...     ttfb=0.2, bandwidth=64 * 1024, jitter=0.05, seed=1)
+
+Profiles can be applied to some paths only with a `dict` of
+:mod:`fnmatch` patterns, the first matching pattern is used:
+
+.. code::
+
+    >>> server.data['response_profile'] = {
+    ...     '/downloads/*': NetworkProfile(bandwidth=1024 * 1024),
+    ...     '/api/*': NetworkProfile(ttfb=0.5),
+    ... }
+"""
+import time
+import random
+import fnmatch
+from threading import Lock
+
+from ._compat import iteritems
+
+
+DISTRIBUTIONS = ('uniform', 'normal', 'exponential')
+TICK = 0.01  # seconds of transfer between throttled writes
+
+
+class NetworkProfile(object):
+    """Conditions of a simulated network connection
+
+    Delays are computed by a :class:`Shaper` created for every request.
+    With a *seed*, shapers draw their own seed from the profile, so the
+    delays of a sequence of requests are the same on every run.
+    """
+    def __init__(self, ttfb=0, bandwidth=None, read_bandwidth=None,
+                 jitter=0, distribution='uniform', seed=None):
+        """
+        :param ttfb: *(default: 0)* Seconds to wait before the first byte of
+         the response.
+        :param bandwidth: *(default: None)* Bytes per second the response is
+         written at (slow write). Unlimited by default.
+        :param read_bandwidth: *(default: None)* Bytes per second the request
+         body is read at (slow read). Unlimited by default.
+        :param jitter: *(default: 0)* Scale in seconds of the random delay
+         added to every write.
+        :param distribution: *(default: uniform)* Distribution of the jitter:
+         ``'uniform'`` between 0 and *jitter*, ``'normal'`` with *jitter* as
+         deviation (only positive values) or ``'exponential'`` with
+         *jitter* as mean.
+        :param seed: *(default: None)* Seed of the random jitter.
+        """
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError('Unknown distribution: {}'.format(distribution))
+
+        self.ttfb = ttfb
+        self.bandwidth = bandwidth
+        self.read_bandwidth = read_bandwidth
+        self.jitter = jitter
+        self.distribution = distribution
+        self.seed = seed
+        self._random = random.Random(seed)
+        self._lock = Lock()
+
+    def shaper(self):
+        """Creates the :class:`Shaper` of a new request"""
+        with self._lock:
+            seed = self._random.getrandbits(64)
+        return Shaper(self, seed)
+
+    def __repr__(self):
+        return ('<NetworkProfile ttfb={} bandwidth={} read_bandwidth={} '
+                'jitter={} {}>'.format(self.ttfb, self.bandwidth,
+                                       self.read_bandwidth, self.jitter,
+                                       self.distribution))
+
+
+class Shaper(object):
+    """Delays of the transfers of a single request
+
+    Only computes the delays, it is up to the handler to wait them, so the
+    same shaper serves threaded and :mod:`asyncio` servers.
+    """
+    def __init__(self, profile, seed=None):
+        self.profile = profile
+        self.random = random.Random(seed)
+        self.started = False
+
+    def jitter(self):
+        """Random delay added to a write"""
+        scale = self.profile.jitter
+        if not scale:
+            return 0
+        if self.profile.distribution == 'normal':
+            return abs(self.random.gauss(0, scale))
+        if self.profile.distribution == 'exponential':
+            return self.random.expovariate(1.0 / scale)
+        return self.random.uniform(0, scale)
+
+    def write_schedule(self, data):
+        """Splits a write of *data* according to the profile bandwidth
+
+        :returns: A `list` of `(delay, piece)` tuples, with the seconds to
+         wait before writing each piece of *data*.
+        """
+        delay = self.jitter()
+        if not self.started:
+            self.started = True
+            delay += self.profile.ttfb
+
+        bandwidth = self.profile.bandwidth
+        if not bandwidth or not data:
+            return [(delay, data)]
+
+        size = max(1, int(bandwidth * TICK))
+        schedule = []
+        for index in range(0, len(data), size):
+            piece = data[index:index + size]
+            schedule.append((delay + len(piece) / float(bandwidth), piece))
+            delay = 0
+        return schedule
+
+    def read_delay(self, size):
+        """Seconds to wait after reading *size* bytes of the request"""
+        bandwidth = self.profile.read_bandwidth
+        return size / float(bandwidth) if bandwidth else 0
+
+
+def find_profile(setting, path):
+    """:class:`NetworkProfile` which applies to a request for *path*
+
+    :param setting: A ``response_profile`` value, a profile or a `dict` of
+     path patterns to profiles.
+    :returns: The profile or `None`.
+    """
+    if setting is None or isinstance(setting, NetworkProfile):
+        return setting
+
+    path = path.split('?', 1)[0]
+    for pattern, profile in iteritems(setting):
+        if fnmatch.fnmatchcase(path, pattern):
+            return profile
+
+
+class ShapedWriter(object):
+    """File object wrapper which throttles its writes with a :class:`Shaper`"""
+    def __init__(self, wfile, shaper):
+        self.wfile = wfile
+        self.shaper = shaper
+
+    def write(self, data):
+        for delay, piece in self.shaper.write_schedule(data):
+            if delay:
+                time.sleep(delay)
+            self.wfile.write(piece)
+
+    def __getattr__(self, name):
+        return getattr(self.wfile, name)
+
+
+class ShapedReader(object):
+    """File object wrapper which throttles its reads with a :class:`Shaper`"""
+    def __init__(self, rfile, shaper):
+        self.rfile = rfile
+        self.shaper = shaper
+
+    def read(self, *args):
+        return self._throttle(self.rfile.read(*args))
+
+    def readline(self, *args):
+        return self._throttle(self.rfile.readline(*args))
+
+    def _throttle(self, data):
+        delay = self.shaper.read_delay(len(data))
+        if delay:
+            time.sleep(delay)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.rfile, name)
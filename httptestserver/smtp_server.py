@@ -5,36 +5,50 @@ SMTP Server
 
 SMTP python server which can be controlled from a different thread.
 
+Sessions are served by an :mod:`asyncio` event loop running in a
+background thread, which only wakes up on I/O, so an idle server costs no
+CPU and hundreds of concurrent sessions are served without a thread for
+each one of them.
+
 .. code::
     >>> server = start_smtp_server()
-    >>> server.start()
     >>> sendemail('from@host.com', ['to@away.com'], 'Message...')
     >>> server.data['message']['subject']
     'Gotcha!'
-    >>> server.close()
+    >>> server.stop()
 """
-import smtpd
+import time
+import socket
+import asyncio
 import logging
-import asyncore
 import contextlib
 import email.parser
-from threading import Thread, RLock
+from threading import Thread, Event, RLock
+
+from .history import create_history, ConnectionStats, EVICT_OLDEST
+from .metrics import MetricsServer
 
 lock = RLock()
 log = logging.getLogger('httptestserver.smtp')
 
 DEFAULT_HOST = '127.0.0.1'               # loopback
 DEFAULT_PORT = 0                         # random port
+DEFAULT_BACKLOG = socket.SOMAXCONN       # pending connections in the listen queue
+DEFAULT_DATA_SIZE_LIMIT = 33554432       # max bytes of a message, 32MiB
+DEFAULT_IDLE_TIMEOUT = 300               # seconds a session may idle (RFC 5321)
+DEFAULT_LIMIT = 2 ** 16                  # max bytes of a line
 
 
-def start_smtp_server(host=None, port=None):
+def start_smtp_server(host=None, port=None, **kwargs):
     """Create a started Smtp server listening in *host*:*port*
 
     :param host: *(default: 127.0.0.1)* Host for the server to listen.
     :param port: *(default: random)* Port of the server to listen (should not be in use).
+    :param kwargs: Extra options for :class:`SmtpServer`.
     :returns: A created and started :class:`SmtpServer`
     """
-    return SmtpServer.start_server(host or DEFAULT_HOST, port or DEFAULT_PORT)
+    return SmtpServer.start_server(host or DEFAULT_HOST, port or DEFAULT_PORT,
+                                   **kwargs)
 
 
 @contextlib.contextmanager
@@ -53,7 +67,195 @@ def smtp_server(*args, **kwargs):
     server.stop()
 
 
-class SmtpServer(smtpd.SMTPServer, Thread):
+class SmtpSession(object):
+    """Serves the SMTP session of a single connection
+
+    Understands the commands of a minimal RFC 5321 server: ``HELO``,
+    ``EHLO``, ``MAIL``, ``RCPT``, ``DATA``, ``RSET``, ``NOOP``, ``VRFY``
+    and ``QUIT``. Every message received is handed to
+    :meth:`SmtpServer.process_message`, with its data decoded and the
+    dot-stuffing of its lines removed.
+
+    The connection, messages and bytes of the session are counted in
+    :attr:`SmtpServer.connection_stats`.
+    """
+    def __init__(self, server, reader, writer):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.peer = writer.get_extra_info('peername')[:2]
+        self.greeted = False
+        self.closing = False
+        self.messages = 0
+        self.received = self.sent = 0  # bytes not yet counted
+        self.mailfrom = None
+        self.recipients = []
+
+    async def serve(self):
+        """Serves commands until the client quits or closes the connection"""
+        await self.push('220 {} httptestserver ESMTP'.format(
+            self.server.hostname))
+        while not self.closing:
+            line = await asyncio.wait_for(self.readline(),
+                                          self.server.idle_timeout)
+            if line is None:
+                break
+            command, _, arg = line.partition(' ')
+            method = getattr(self, 'smtp_' + command.upper(), None)
+            if method is None:
+                await self.push('500 Error: command "{}" not '
+                                'recognized'.format(command))
+            else:
+                await method(arg.strip())
+
+    async def readline(self):
+        """Next line without its end of line, `None` once the client closes
+        the connection"""
+        line = await self.reader.readline()
+        if not line:
+            return None
+        self.received += len(line)
+        return line.rstrip(b'\r\n').decode('utf-8', 'replace')
+
+    async def push(self, *lines):
+        data = ''.join(line + '\r\n' for line in lines).encode('utf-8')
+        self.writer.write(data)
+        self.sent += len(data)
+        await self.writer.drain()
+
+    def count_traffic(self):
+        self.server.connection_stats.count_traffic(self.received, self.sent)
+        self.received = self.sent = 0
+
+    def reset_transaction(self):
+        self.mailfrom = None
+        self.recipients = []
+
+    async def smtp_HELO(self, arg):
+        if not arg:
+            return await self.push('501 Syntax: HELO hostname')
+        if self.greeted:
+            return await self.push('503 Duplicate HELO/EHLO')
+        self.greeted = True
+        await self.push('250 {}'.format(self.server.hostname))
+
+    async def smtp_EHLO(self, arg):
+        if not arg:
+            return await self.push('501 Syntax: EHLO hostname')
+        if self.greeted:
+            return await self.push('503 Duplicate HELO/EHLO')
+        self.greeted = True
+        limit = self.server.data_size_limit
+        await self.push('250-{}'.format(self.server.hostname),
+                        '250-SIZE {}'.format(limit) if limit else '250-SIZE',
+                        '250 8BITMIME')
+
+    async def smtp_NOOP(self, arg):
+        await self.push('501 Syntax: NOOP' if arg else '250 OK')
+
+    async def smtp_QUIT(self, arg):
+        self.closing = True
+        await self.push('221 Bye')
+
+    async def smtp_RSET(self, arg):
+        if arg:
+            return await self.push('501 Syntax: RSET')
+        self.reset_transaction()
+        await self.push('250 OK')
+
+    async def smtp_VRFY(self, arg):
+        if not arg:
+            return await self.push('501 Syntax: VRFY <address>')
+        await self.push('252 Cannot VRFY user, but will accept message and '
+                        'attempt delivery')
+
+    async def smtp_MAIL(self, arg):
+        if not self.greeted:
+            return await self.push('503 Error: send HELO first')
+        if self.mailfrom is not None:
+            return await self.push('503 Error: nested MAIL command')
+        address, params = parse_path(arg, 'FROM:')
+        if address is None:
+            return await self.push('501 Syntax: MAIL FROM: <address>')
+        size, limit = params.get('SIZE'), self.server.data_size_limit
+        if size is not None and (not size.isdigit() or
+                                 limit and int(size) > limit):
+            return await self.push('552 Error: message size exceeds fixed '
+                                   'maximum message size')
+        self.mailfrom = address
+        await self.push('250 OK')
+
+    async def smtp_RCPT(self, arg):
+        if self.mailfrom is None:
+            return await self.push('503 Error: need MAIL command')
+        address, _ = parse_path(arg, 'TO:')
+        if not address:
+            return await self.push('501 Syntax: RCPT TO: <address>')
+        self.recipients.append(address)
+        await self.push('250 OK')
+
+    async def smtp_DATA(self, arg):
+        if not self.recipients:
+            return await self.push('503 Error: need RCPT command')
+        if arg:
+            return await self.push('501 Syntax: DATA')
+        await self.push('354 End data with <CR><LF>.<CR><LF>')
+
+        data = await self.read_data()
+        if data is None:
+            await self.push('552 Error: Too much mail data')
+        else:
+            self.messages += 1
+            status = self.server.process_message(
+                self.peer, self.mailfrom, self.recipients, data)
+            await self.push(status or '250 OK')
+        self.reset_transaction()
+        self.count_traffic()
+
+    async def read_data(self):
+        """Message data up to the line with a single dot, `None` if it is
+        larger than the *data_size_limit* of the server"""
+        lines, size, limit = [], 0, self.server.data_size_limit
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                raise asyncio.IncompleteReadError(b'', None)
+            self.received += len(line)
+            line = line.rstrip(b'\r\n')
+            if line == b'.':
+                break
+            if line.startswith(b'.'):
+                line = line[1:]  # dot-stuffing
+            size += len(line) + 2
+            if lines is not None:
+                lines.append(line)
+                if limit and size > limit:
+                    lines = None  # too large, read until the end anyway
+        if lines is None:
+            return None
+        return b'\n'.join(lines).decode('utf-8', 'replace')
+
+
+def parse_path(arg, keyword):
+    """Address and `dict` of parameters of a ``MAIL`` or ``RCPT`` command
+    argument starting with *keyword*, `None` as address if it has no
+    valid syntax"""
+    if not arg[:len(keyword)].upper() == keyword:
+        return None, {}
+    words = arg[len(keyword):].strip().split()
+    if not words:
+        return None, {}
+    address = words[0]
+    if address.startswith('<') and address.endswith('>'):
+        address = address[1:-1]
+    params = {}
+    for param in words[1:]:
+        name, _, value = param.partition('=')
+        params[name.upper()] = value
+    return address, params
+
+
+class SmtpServer(Thread):
     """SMTP Server
 
     Starts in a child thread as :class:`Server` does.
@@ -64,33 +266,84 @@ class SmtpServer(smtpd.SMTPServer, Thread):
     When several messages are sent at a time, the server state is still
     reachable through the :attr:`Server.history` attribute.
 
-    *About multithreading:* The :mod:`asyncore` stdlib module that powers the
-    python SMTP server does not quite like to be spawned in a different
-    thread, feel free to open an issue in the project if you experience concurrency errors.
+    *About multithreading:* Sessions are served by an :mod:`asyncio` event
+    loop in the server thread, one :class:`SmtpSession` each, and messages
+    are processed in that same thread. The server stops as soon as
+    :meth:`stop` is called, closing the open sessions.
+
+    *About metrics:* When created with *metrics_port*, its :attr:`metrics`
+    server exposes the messages received, connections and bytes
+    transferred for Prometheus, see :mod:`httptestserver.metrics`.
     """
-    def __init__(self, host, port):
+    session_class = SmtpSession
+
+    def __init__(self, host, port, history_size=None,
+                 history_policy=EVICT_OLDEST, metrics_port=None,
+                 backlog=DEFAULT_BACKLOG,
+                 data_size_limit=DEFAULT_DATA_SIZE_LIMIT,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        """Creates a new :class:`SmtpServer`
+
+        :param host: Host for the server to listen.
+        :param port: Port of the server to listen (should free).
+        :param history_size: *(default: None)* Max number of entries kept in
+         :attr:`history`, unbounded by default.
+        :param history_policy: *(default: oldest)* Entries evicted when the
+         history is full: ``'oldest'`` or ``'newest'``.
+        :param metrics_port: *(default: None)* Port to serve the
+         :attr:`metrics` at, ``0`` for a random one. Not served by default.
+        :param backlog: *(default: SOMAXCONN)* Size of the listen queue.
+        :param data_size_limit: *(default: 32MiB)* Max size of a message,
+         larger ones are rejected. `None` accepts any size.
+        :param idle_timeout: *(default: 300)* Seconds to wait for a command
+         before closing a session. `None` waits forever.
+        """
         Thread.__init__(self)
-        smtpd.SMTPServer.__init__(self, (host, port), None)
+        self.history_size = history_size
+        self.history_policy = history_policy
+        self.backlog = backlog
+        self.data_size_limit = data_size_limit
+        self.idle_timeout = idle_timeout
+        self.hostname = socket.gethostname()
         self._data = {}
-        self._history = []
-        self._continue = True
+        self._history = self.create_history()
         self.daemon = True  # finish along with parent process
 
+        # Bind on creation so the port is known before the loop starts
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((host, port))
+        self.socket.listen(backlog)
+        self.server_address = self.socket.getsockname()
+
+        self.loop = asyncio.new_event_loop()
+        self._serving = Event()
+        self._sessions = set()
+
+        self.received_messages = 0
+        self.connection_stats = ConnectionStats()
+        self.metrics = None
+        if metrics_port is not None:
+            self.metrics = MetricsServer(self, self.host, metrics_port)
+
     @classmethod
-    def start_server(cls, host, port):
+    def start_server(cls, host, port, **kwargs):
         """Creates and starts a :class:`SmtpServer`
 
         :param host: Host for the server to listen.
         :param port: Port of the server to listen (should not be in use).
+        :param kwargs: Extra options for :class:`SmtpServer`.
         :returns: A created and started http :class:`SmtpServer`
         """
-        log.info('Starting http server %s:%d', host, port)
-        server = cls(host, port)
+        log.info('Starting smtp server %s:%d', host, port)
+        server = cls(host, port, **kwargs)
         server.start()
         return server
 
     def process_message(self, peer, mailfrom, rcpttos, data):
         """Process a received smtp message"""
+        # Only the serving thread updates the counter, no lock needed
+        self.received_messages += 1
         self.update_state(peer, mailfrom, rcpttos, data)
         self.save_history()
 
@@ -104,6 +357,13 @@ class SmtpServer(smtpd.SMTPServer, Thread):
             message=self.parse_message(data)
         ))
 
+    def create_history(self):
+        """Creates the storage of :attr:`history`
+
+        See :func:`~httptestserver.history.create_history`.
+        """
+        return create_history(self.history_size, self.history_policy)
+
     def save_history(self):
         """Create a new entry in history"""
         self._history.append(dict(self.data))
@@ -111,7 +371,7 @@ class SmtpServer(smtpd.SMTPServer, Thread):
     def parse_message(self, data):
         """Parse RFC 2822 message data
 
-        :param bytes data: Full message data
+        :param str data: Full message data
         :returns: (headers, body)
         """
         return email.parser.Parser().parsestr(data)
@@ -126,7 +386,7 @@ class SmtpServer(smtpd.SMTPServer, Thread):
             The parsed message in a :class:`email.message.Message` object.
 
         message_data
-            Raw message bytestring as sent to the server
+            Raw message string as sent to the server
 
         peer
             Client ip address (host, port)
@@ -143,42 +403,118 @@ class SmtpServer(smtpd.SMTPServer, Thread):
     def reset(self):
         with lock:
             self._data = {}
-            self._history = []
+            self._history = self.create_history()
+            self.received_messages = 0
+            self.connection_stats = ConnectionStats(
+                self.connection_stats.active)
 
     @property
     def history(self):
         """Gives access to all the server states in a `list` (read-only)"""
-        with lock:
-            return self._history
+        return self._history.snapshot()
+
+    @property
+    def history_length(self):
+        """Number of entries in :attr:`history`, without copying them"""
+        return len(self._history)
+
+    @property
+    def history_evicted(self):
+        """Number of entries evicted from a bounded :attr:`history`"""
+        return getattr(self._history, 'evicted', 0)
 
     @property
     def inbox(self):
         """List of parsed :class:`.message.Message` in order of arrival"""
-        with lock:
-            return [entry['message'] for entry in self._history]
+        return [entry['message'] for entry in self.history]
 
     @property
     def host(self):
         """Current binded host"""
-        return self.socket.getsockname()[0]
+        return self.server_address[0]
 
     @property
     def port(self):
-        """Current binded host"""
-        return self.socket.getsockname()[1]
+        """Current binded port"""
+        return self.server_address[1]
+
+    @property
+    def accepting(self):
+        """Whether the server is listening for connections"""
+        return self.socket.fileno() != -1
+
+    @property
+    def sessions(self):
+        """Number of currently open sessions"""
+        return len(self._sessions)
+
+    async def handle_connection(self, reader, writer):
+        session = self.session_class(self, reader, writer)
+        self._sessions.add(writer)
+        self.connection_stats.open()
+        opened = time.time()
+        try:
+            await session.serve()
+        except (ConnectionError, asyncio.IncompleteReadError,
+                asyncio.TimeoutError):
+            pass
+        except ValueError:  # line over the limit
+            with contextlib.suppress(ConnectionError):
+                await session.push('500 Error: line too long')
+        except Exception:
+            log.exception('Error serving smtp session from %s:%d',
+                          *session.peer)
+        finally:
+            self._sessions.discard(writer)
+            session.count_traffic()
+            self.connection_stats.count(session.messages,
+                                        time.time() - opened)
+            writer.close()
 
     def stop(self):
-        """Stops the server thread"""
-        self._continue = False
-        self.close()
+        """Stops the server thread, closing all the open sessions"""
+        if self.is_alive():
+            self._serving.wait()
+            if not self.loop.is_closed():  # closed if failed to start
+                self.loop.call_soon_threadsafe(self.loop.stop)
+            self.join()
+        else:
+            self.close()
+
+    def close(self):
+        """Closes the socket of a server which is not running"""
+        self.socket.close()
+        self.loop.close()
 
     def run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            server = self.loop.run_until_complete(asyncio.start_server(
+                self.handle_connection, sock=self.socket, limit=DEFAULT_LIMIT,
+                backlog=self.backlog))
+        except BaseException:
+            self.close()
+            raise
+        finally:
+            self._serving.set()  # stop() waits until started or failed
         try:
             log.info('Starting server')
-            while(self._continue):
-                asyncore.loop(timeout=0.01, count=1)
+            if self.metrics is not None:
+                self.metrics.start()
+            self.loop.run_forever()
         finally:
+            if self.metrics is not None:
+                self.metrics.stop()
+            server.close()
+            for writer in list(self._sessions):
+                writer.close()
+            self.cancel_tasks()
+            self.loop.close()
             log.info('Stopped server')
 
-    def __getattribute__(self, attr):
-        return object.__getattribute__(self, attr)
+    def cancel_tasks(self):
+        tasks = asyncio.all_tasks(self.loop)
+        for task in tasks:
+            task.cancel()
+        self.loop.run_until_complete(
+            asyncio.gather(*tasks, return_exceptions=True))
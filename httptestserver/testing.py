@@ -1,15 +1,27 @@
 # -*- coding: utf-8 -*-
 
-from .smtp_server import start_smtp_server
-from .http_server import start_server, start_ssl_server
+from ._compat import PY2
+from .pool import pool
 
 
 class ServerBase(object):
-    """Base class for http server mixins"""
+    """Base class for server mixins
+
+    Servers are leased from the process wide
+    :data:`~httptestserver.pool.pool` when the test class is set up and
+    returned to it when torn down, so they are reused by other test
+    classes with the same *kind* and :attr:`server_options`.
+    """
 
     server = None
     """Class level server instance"""
 
+    kind = None
+    """Kind of server leased, see :class:`~httptestserver.pool.ServerPool`"""
+
+    server_options = {}
+    """Options to start the server with"""
+
     default_path = '/testing/this'
     """Path for default url"""
 
@@ -25,32 +37,33 @@ class ServerBase(object):
     def setup(self):
         self.server.reset()
 
+    @classmethod
+    def setupClass(cls):
+        cls.server = pool.lease(cls.kind, **cls.server_options)
+
     @classmethod
     def teardownClass(cls):
-        cls.server.stop()
+        pool.release(cls.server)
 
 
 class HttpTestServer(ServerBase):
     """Mixin class for testing using a http server"""
+    kind = 'http'
     options = {}
 
-    @classmethod
-    def setupClass(cls):
-        cls.server = start_server()
-
 
 class HttpsTestServer(ServerBase):
     """Mixin class for testing using a https server"""
+    kind = 'https'
     options = {'verify': False}
 
-    @classmethod
-    def setupClass(cls):
-        cls.server = start_ssl_server()
 
+if not PY2:
+    class AsyncHttpTestServer(ServerBase):
+        """Mixin class for testing using an asyncio http server"""
+        kind = 'async'
+        options = {}
 
-class SmtpTestServer(ServerBase):
-    """Mixin class for testing using a smtp server"""
-
-    @classmethod
-    def setupClass(cls):
-        cls.server = start_smtp_server()
+    class SmtpTestServer(ServerBase):
+        """Mixin class for testing using a smtp server"""
+        kind = 'smtp'
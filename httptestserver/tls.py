@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+TLS
+---
+
+:class:`ssl.SSLContext` for https servers, created once per certificate
+and options and shared by every server using them.
+
+Loading the certificate chain is by far the slowest part of starting a
+https server, and a context of its own per server also keeps clients from
+resuming the sessions of a previous server of the test suite. Cached
+contexts have session tickets (TLS 1.3 and 1.2) and the server session
+cache (session IDs on TLS 1.2) enabled, so clients reusing their sessions
+skip the full handshake.
+
+.. code::
+
+    >>> context = server_context(DEFAULT_CERTFILE, ciphers='ECDHE+AESGCM',
+    ...                          min_version=ssl.TLSVersion.TLSv1_2)
+    >>> context is server_context(DEFAULT_CERTFILE, ciphers='ECDHE+AESGCM',
+    ...                           min_version=ssl.TLSVersion.TLSv1_2)
+    True
+
+Contexts are shared, they must not be changed once created.
+"""
+import os
+import ssl
+from threading import Lock
+
+
+DEFAULT_SESSION_TICKETS = 2  # tickets sent on each TLS 1.3 handshake
+
+_contexts = {}
+_lock = Lock()
+
+
+def server_context(certfile, keyfile=None, ciphers=None, min_version=None,
+                   max_version=None, alpn_protocols=None,
+                   session_tickets=DEFAULT_SESSION_TICKETS):
+    """Server side :class:`ssl.SSLContext` for the given certificate and
+    options, created the first time and cached afterwards
+
+    :param certfile: Path to the certificate file, it may include the key.
+    :param keyfile: *(default: None)* Path to the private key file.
+    :param ciphers: *(default: None)* OpenSSL cipher list for TLS 1.2 and
+     below, the OpenSSL defaults when not given.
+    :param min_version: *(default: None)* Lowest :class:`ssl.TLSVersion`
+     accepted.
+    :param max_version: *(default: None)* Highest :class:`ssl.TLSVersion`
+     accepted.
+    :param alpn_protocols: *(default: None)* Protocols offered through ALPN.
+    :param session_tickets: *(default: 2)* Number of TLS 1.3 session
+     tickets sent to clients, ``0`` disables session tickets.
+    :raises ssl.SSLError: If the certificate or the options are not valid.
+    """
+    key = (os.path.realpath(certfile),
+           keyfile and os.path.realpath(keyfile),
+           ciphers, min_version, max_version,
+           tuple(alpn_protocols or ()), session_tickets)
+
+    with _lock:
+        context = _contexts.get(key)
+        if context is None:
+            context = _contexts[key] = create_context(
+                certfile, keyfile, ciphers, min_version, max_version,
+                alpn_protocols, session_tickets)
+        return context
+
+
+def create_context(certfile, keyfile=None, ciphers=None, min_version=None,
+                   max_version=None, alpn_protocols=None,
+                   session_tickets=DEFAULT_SESSION_TICKETS):
+    """New server side :class:`ssl.SSLContext`, see :func:`server_context`"""
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certfile, keyfile)
+    if ciphers is not None:
+        context.set_ciphers(ciphers)
+    if min_version is not None:
+        context.minimum_version = min_version
+    if max_version is not None:
+        context.maximum_version = max_version
+    if alpn_protocols:
+        context.set_alpn_protocols(alpn_protocols)
+
+    if session_tickets:
+        context.options &= ~ssl.OP_NO_TICKET
+    else:
+        context.options |= ssl.OP_NO_TICKET
+    context.num_tickets = session_tickets
+    return context
+
+
+def clear_contexts():
+    """Forgets the cached contexts, ie: after changing a certificate file"""
+    with _lock:
+        _contexts.clear()
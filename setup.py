@@ -17,7 +17,14 @@ setup(
     include_package_data=True,
     packages=find_packages(),
     install_requires=[],
+    extras_require={
+        'http2': ['h2'],
+    },
+    entry_points={
+        'pytest11': ['httptestserver = httptestserver.pytest_plugin'],
+    },
     classifiers=[
-        "Topic :: Software Development :: Testing"
+        "Topic :: Software Development :: Testing",
+        "Framework :: Pytest",
     ],
 )
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from httptestserver import http_server, async_http_server
+
+
+SERVER_CONTEXTS = [('Test', http_server), ('TestAsync', async_http_server)]
+
+
+def server_test_classes(mixin):
+    """Test classes running the tests of *mixin* on every http server
+
+    The tests start their own servers with ``self.server_context(**options)``,
+    classes are named after *mixin*: ``TestServerBody`` and
+    ``TestAsyncServerBody`` for ``ServerBodyMixin``.
+    """
+    name = mixin.__name__.replace('Mixin', '')
+    return tuple(type(str(prefix + name), (mixin,), {
+        'server_context': staticmethod(context),
+        '__module__': mixin.__module__}) for prefix, context in SERVER_CONTEXTS)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+
+import requests
+from hamcrest import *
+
+from httptestserver import http_server, start_server
+from httptestserver.access_log import AccessLog
+
+
+class Lines(logging.Handler):
+    """Keeps the formatted records"""
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+class TestAccessLog(object):
+    def setup(self):
+        self.output = Lines()
+
+    def test_it_should_write_compact_json_records(self):
+        access_log = AccessLog(self.output)
+        with http_server(quiet=True, access_log=access_log) as server:
+            server.routes.add('GET', '/users/{id}', content=b'user')
+            requests.get(server.url('/users/1'))
+
+        [line] = self.output.lines
+        assert_that(line, is_not(contains_string('", "')))
+        assert_that(json.loads(line), has_entries({
+            't': instance_of(float), 'client': '127.0.0.1',
+            'method': 'GET', 'path': '/users/1', 'route': 'GET /users/{id}',
+            'status': 200, 'length': 4, 'ms': greater_than(0)}))
+
+    def test_it_should_sample_records(self):
+        counts = []
+        for _ in range(2):
+            output = Lines()
+            with http_server(quiet=True, access_log=AccessLog(
+                    output, sample=0.5, seed=1)) as server:
+                for _ in range(20):
+                    requests.get(server.url('/path'))
+            counts.append(len(output.lines))
+
+        assert_that(counts[0], all_of(greater_than(0), less_than(20)))
+        assert_that(counts[1], is_(counts[0]))
+
+    def test_it_should_keep_the_formatter_of_handlers(self):
+        self.output.setFormatter(logging.Formatter('%(message)s'))
+        with http_server(access_log=AccessLog(self.output)) as server:
+            requests.get(server.url('/path'))
+
+        assert_that(self.output.lines, contains(
+            matches_regexp(r'^127.0.0.1 GET /path 200 None [\d.]+ms$')))
+
+    def test_it_should_drop_records_when_full(self):
+        access_log = AccessLog(self.output, queue_size=1)
+
+        for _ in range(3):
+            access_log.record(('127.0.0.1', 0), 'GET', '/', 'GET /', 200,
+                              None, 0.001)
+
+        assert_that(access_log.dropped, is_(2))
+
+    def test_it_should_be_shared_by_servers(self):
+        access_log = AccessLog(self.output)
+        first = start_server(access_log=access_log)
+        with http_server(access_log=access_log) as second:
+            requests.get(second.url('/second'))
+        requests.get(first.url('/first'))
+        first.stop()
+        first.join()
+
+        assert_that(self.output.lines, has_length(2))
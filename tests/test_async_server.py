@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+import time
+import socket
+import threading
+from hamcrest import *
+
+from httptestserver import AsyncHttpTestServer, AsyncServer, async_http_server
+
+from httptestserver.config import RequestData
+
+from test_http_server import (ServerTestMixin, DataMixin, MethodsMixin,
+                              ConnectionMixin, HttpErrorsMixin, HooksTestMixin,
+                              live_instances)
+
+
+class KeepAliveMixin(object):
+    def test_it_should_serve_many_requests_on_one_connection(self):
+        sock = self.connect()
+
+        for _ in range(3):
+            sock.sendall(b'GET /keep HTTP/1.1\r\nHost: localhost\r\n\r\n')
+            assert_that(self.read_response(sock), contains_string('200 OK'))
+
+        sock.close()
+        assert_that(self.server.history, has_length(3))
+
+    def test_it_should_release_previous_requests(self):
+        sock = self.connect()
+
+        for _ in range(30):
+            sock.sendall(b'POST /upload HTTP/1.1\r\nHost: localhost\r\n'
+                         b'Content-Length: 100000\r\n\r\n' + b'x' * 100000)
+            self.read_response(sock)
+
+        assert_that(live_instances(RequestData), less_than(5))
+        assert_that(self.server.data, is_not(has_key('request_data')))
+        sock.close()
+
+    def test_it_should_keep_many_concurrent_connections(self):
+        sockets = [self.connect() for _ in range(200)]
+
+        for sock in sockets:
+            sock.sendall(b'GET /many HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        responses = [self.read_response(sock) for sock in sockets]
+
+        assert_that(responses, only_contains(contains_string('200 OK')))
+        assert_that(self.server.connections, is_(200))
+        for sock in sockets:
+            sock.close()
+
+    def test_it_should_close_after_max_requests(self):
+        self.server.max_requests = 2
+        sock = self.connect()
+
+        try:
+            for _ in range(2):
+                sock.sendall(b'GET /max HTTP/1.1\r\nHost: localhost\r\n\r\n')
+                response = self.read_response(sock)
+        finally:
+            self.server.max_requests = None
+
+        assert_that(response, contains_string('Connection: close'))
+        assert_that(sock.recv(4096), is_(b''))
+        assert_that(self.server.connection_stats, has_properties({
+            'max_requests': 2}))
+
+    def test_it_should_answer_bad_requests(self):
+        sock = self.connect()
+
+        sock.sendall(b'NOT HTTP\r\n\r\n')
+
+        assert_that(self.read_response(sock), contains_string('400'))
+
+    def connect(self):
+        return socket.create_connection((self.server.host, self.server.port))
+
+    def read_response(self, sock):
+        response = b''
+        while b'\r\n\r\n' not in response:
+            response += sock.recv(4096)
+        return response.decode('iso-8859-1')
+
+
+class TestAsyncHttp(AsyncHttpTestServer, ServerTestMixin, DataMixin,
+                    MethodsMixin, ConnectionMixin, HttpErrorsMixin,
+                    HooksTestMixin, KeepAliveMixin):
+    """Test asyncio http server"""
+
+
+class TestAsyncContexts(object):
+    def test_it_starts_async_server(self):
+        with async_http_server() as server:
+            assert_that(server, all_of(
+                is_(instance_of(AsyncServer)),
+                has_property('scheme', is_('http'))
+            ))
+
+    def test_it_stops_async_server(self):
+        with async_http_server() as server:
+            assert_that(server.is_alive(), is_(True))
+
+        time.sleep(0.01)
+        assert_that(server.is_alive(), is_(False))
+
+    def test_it_releases_servers_never_started(self):
+        server = AsyncServer('127.0.0.1', 0)
+
+        server.stop()
+
+        assert_that(server.socket.fileno(), is_(-1))
+        assert_that(server.loop.is_closed(), is_(True))
+
+    def test_it_stops_servers_failed_to_start(self):
+        server = AsyncServer('127.0.0.1', 0)
+        server.socket.close()  # start_server fails on a closed socket
+        server.start()
+
+        stopping = threading.Thread(target=server.stop)
+        stopping.daemon = True
+        stopping.start()
+        stopping.join(5)
+
+        assert_that(stopping.is_alive(), is_(False))
+        assert_that(server.loop.is_closed(), is_(True))
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import shutil
+import tempfile
+
+from hamcrest import *
+
+from httptestserver import benchmark
+
+
+def is_result(requests):
+    return has_entries({
+        'requests': requests,
+        'errors': 0,
+        'requests_per_second': greater_than(0),
+        'latency': has_entries({'p50': greater_than(0),
+                                'p99': greater_than(0),
+                                'p999': greater_than(0)}),
+        'server_threads': greater_than_or_equal_to(0),
+    })
+
+
+class TestBenchmark(object):
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def test_it_should_benchmark_http(self):
+        result = benchmark.run_scenario('http', requests=20, concurrency=2)
+
+        assert_that(result, is_result(20))
+
+    def test_it_should_benchmark_keep_alive_connections(self):
+        result = benchmark.run_scenario('http-keep-alive', requests=20,
+                                        concurrency=2)
+
+        assert_that(result, is_result(20))
+        assert_that(result['server_threads'], less_than_or_equal_to(2))
+
+    def test_it_should_benchmark_large_bodies(self):
+        result = benchmark.run_scenario('large-body', requests=4,
+                                        concurrency=2)
+
+        assert_that(result, is_result(4))
+
+    def test_it_should_send_fewer_large_bodies_in_full_runs(self):
+        results = benchmark.run(['large-body', 'http'], requests=200,
+                                concurrency=2)
+
+        assert_that(results['scenarios'], has_entries({
+            'large-body': is_result(2), 'http': is_result(200)}))
+
+    def test_it_should_benchmark_smtp_bursts(self):
+        result = benchmark.run_scenario('smtp-burst', requests=20,
+                                        concurrency=2)
+
+        assert_that(result, is_result(20))
+
+    def test_it_should_reject_unknown_scenarios(self):
+        assert_that(calling(benchmark.run_scenario).with_args('ftp'),
+                    raises(ValueError))
+
+    def test_it_should_write_json_results(self):
+        path = os.path.join(self.directory, 'results.json')
+
+        benchmark.main(['http', '--requests', '10', '--output', path])
+
+        with open(path) as results:
+            assert_that(json.load(results), has_entries({
+                'python': instance_of(str),
+                'requests': 10,
+                'scenarios': has_entries(http=is_result(10))}))
+
+    def test_it_should_compare_results(self):
+        old = {'scenarios': {'http': {'requests_per_second': 100.0,
+                                      'latency': {'p99': 0.01}}}}
+        new = {'scenarios': {'http': {'requests_per_second': 150.0,
+                                      'latency': {'p99': 0.005}}}}
+
+        assert_that(benchmark.compare(old, new), contains(
+            all_of(starts_with('http'), contains_string('+50.0% req/s'),
+                   contains_string('-50.0% p99'))))
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import socket
+import hashlib
+
+import requests
+from hamcrest import *
+
+from httptestserver.body import CapturedBody, read_body, iter_chunks
+
+from server_classes import server_test_classes
+
+
+CONTENT = b'0123456789' * 100
+
+
+class TestCapturedBody(object):
+    def test_it_should_keep_small_bodies_in_memory(self):
+        body = self.capture(CONTENT, threshold=len(CONTENT))
+
+        assert_that(body, has_properties({
+            'size': len(CONTENT), 'spilled': False, 'path': None}))
+        assert_that(body.read(), is_(CONTENT))
+
+    def test_it_should_spill_large_bodies_to_disk(self):
+        body = self.capture(CONTENT, threshold=10)
+
+        assert_that(body.spilled, is_(True))
+        assert_that(os.path.getsize(body.path), is_(len(CONTENT)))
+        assert_that(body.read(), is_(CONTENT))
+
+    def test_it_should_hash_contents_incrementally(self):
+        body = self.capture(CONTENT, threshold=10)
+
+        assert_that(body.hexdigest,
+                    is_(hashlib.sha256(CONTENT).hexdigest()))
+
+    def test_it_should_open_independent_readers(self):
+        body = self.capture(CONTENT, threshold=10)
+
+        with body.open() as first, body.open() as second:
+            first.read(10)
+            assert_that(second.read(10), is_(CONTENT[:10]))
+
+    def test_it_should_give_a_view_of_spilled_contents(self):
+        body = self.capture(CONTENT, threshold=10)
+
+        assert_that(body.view()[:10].tobytes(), is_(CONTENT[:10]))
+
+    def test_it_should_compare_with_bytes(self):
+        body = self.capture(CONTENT, threshold=10)
+
+        assert_that(body, is_(equal_to(CONTENT)))
+
+    def test_it_should_remove_file_on_close(self):
+        body = self.capture(CONTENT, threshold=10)
+
+        body.close()
+
+        assert_that(os.path.exists(body.path), is_(False))
+
+    def capture(self, content, threshold):
+        chunks = [content[i:i + 64] for i in range(0, len(content), 64)]
+        return read_body(lambda size: chunks.pop(0), len(content),
+                         CapturedBody(threshold), chunk_size=64)
+
+
+class TestChunks(object):
+    def test_it_should_decode_chunks(self):
+        rfile = io.BytesIO(b'4\r\nWiki\r\n5;ext=1\r\npedia\r\n0\r\n'
+                           b'Trailer: value\r\n\r\nnext request')
+
+        assert_that(list(iter_chunks(rfile)), is_([b'Wiki', b'pedia']))
+        assert_that(rfile.read(), is_(b'next request'))
+
+    def test_it_should_split_large_chunks(self):
+        rfile = io.BytesIO(b'a\r\n0123456789\r\n0\r\n\r\n')
+
+        assert_that(list(iter_chunks(rfile, chunk_size=4)),
+                    is_([b'0123', b'4567', b'89']))
+
+    def test_it_should_reject_invalid_chunks(self):
+        rfile = io.BytesIO(b'2\r\n0123\r\n0\r\n\r\n')
+
+        assert_that(calling(list).with_args(iter_chunks(rfile)),
+                    raises(ValueError))
+
+    def test_it_should_store_only_size_and_hash(self):
+        body = CapturedBody(0, store=False)
+
+        body.write(CONTENT)
+
+        assert_that(body, has_properties({'size': len(CONTENT),
+                                          'spilled': False}))
+        assert_that(body, is_(equal_to(CONTENT)))
+        assert_that(calling(body.read), raises(ValueError))
+
+
+class ServerBodyMixin(object):
+    def test_it_should_capture_large_bodies(self):
+        with self.server_context(body_threshold=10) as server:
+            requests.post(server.url('/upload'), data=CONTENT)
+
+            body = server.history[0]['body']
+
+        assert_that(body, is_(instance_of(CapturedBody)))
+        assert_that(body, has_properties({
+            'size': len(CONTENT), 'spilled': True,
+            'hexdigest': hashlib.sha256(CONTENT).hexdigest()}))
+
+    def test_it_should_read_chunked_bodies(self):
+        with self.server_context() as server:
+            requests.post(server.url('/upload'), data=iter([b'one', b'two']))
+
+            assert_that(server.history[0]['body'], is_(b'onetwo'))
+
+    def test_it_should_stream_chunks_to_hook(self):
+        chunks = []
+        with self.server_context(store_body=False) as server:
+            server.register_hook('request_chunk',
+                                 lambda request, chunk: chunks.append(chunk))
+
+            requests.post(server.url('/upload'), data=iter([b'one', b'two']))
+
+            body = server.history[0]['body']
+
+        assert_that(b''.join(chunks), is_(b'onetwo'))
+        assert_that(body, has_properties({'size': 6, 'store': False}))
+
+    def test_it_should_keep_connection_in_sync_after_chunked_body(self):
+        with self.server_context() as server:
+            sock = socket.create_connection((server.host, server.port))
+            sock.sendall(b'POST /first HTTP/1.1\r\nHost: localhost\r\n'
+                         b'Transfer-Encoding: chunked\r\n\r\n'
+                         b'3\r\none\r\n0\r\n\r\n')
+            response = b''
+            while b'\r\n\r\n' not in response:
+                response += sock.recv(1024)
+            sock.close()
+
+            assert_that(response.decode('iso-8859-1'), contains_string('200'))
+            assert_that(server.history[0]['body'], is_(b'one'))
+
+    def test_it_should_answer_malformed_chunked_bodies(self):
+        with self.server_context() as server:
+            sock = socket.create_connection((server.host, server.port))
+            sock.sendall(b'POST /bad HTTP/1.1\r\nHost: localhost\r\n'
+                         b'Transfer-Encoding: chunked\r\n\r\n'
+                         b'zz\r\none\r\n0\r\n\r\n')
+            response = b''
+            while True:
+                data = sock.recv(1024)
+                if not data:
+                    break  # connection closed after the response
+                response += data
+            sock.close()
+
+            status_line = response.decode('iso-8859-1').split('\r\n')[0]
+
+            assert_that(status_line, ends_with(' 400 Bad Request'))
+            assert_that(server.history, is_(empty()))
+
+
+TestServerBody, TestAsyncServerBody = server_test_classes(ServerBodyMixin)
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+import pathlib
+
+import requests
+from hamcrest import *
+
+from httptestserver import HttpResponse
+from httptestserver.config import LazyValue, EVALUATE_PER_REQUEST
+from httptestserver.cache import (ResponseCache, SerializedResponse,
+                                  response_key, date_header)
+
+from server_classes import server_test_classes
+
+
+class TestResponseCache(object):
+    def setup(self):
+        self.cache = ResponseCache(size=2)
+        self.serialized = []
+
+    def serialize(self):
+        self.serialized.append(None)
+        return SerializedResponse(b'HTTP/1.1 200 OK\r\n', b'\r\ncontent')
+
+    def test_it_should_serialize_once(self):
+        response = HttpResponse(200, {'X-Header': 'value'}, b'content')
+
+        for _ in range(3):
+            entry = self.cache.get(response_key(response), self.serialize)
+
+        assert_that(self.serialized, has_length(1))
+        assert_that(entry.render().decode('ascii'), all_of(
+            starts_with('HTTP/1.1 200 OK\r\nDate: '),
+            ends_with('\r\ncontent')))
+
+    def test_it_should_key_on_configuration(self):
+        content = b'content'
+        key = response_key(HttpResponse(200, {'X': '1'}, content))
+
+        assert_that(response_key(HttpResponse(200, {'X': '1'}, content)),
+                    is_(key))
+        assert_that(response_key(HttpResponse(201, {'X': '1'}, content)),
+                    is_not(key))
+        assert_that(response_key(HttpResponse(200, {'X': '2'}, content)),
+                    is_not(key))
+        assert_that(response_key(HttpResponse(200, {'X': '1'}, b'other')),
+                    is_not(key))
+
+    def test_it_should_not_key_streams(self):
+        response = HttpResponse(200, (), pathlib.Path(__file__))
+
+        assert_that(response_key(response), is_(none()))
+        assert_that(response_key(HttpResponse(200, {'X': []}, None)),
+                    is_(none()))
+
+    def test_it_should_empty_when_full(self):
+        for status in (200, 201, 202):
+            self.cache.get(response_key(HttpResponse(status, (), None)),
+                           self.serialize)
+
+        assert_that(self.cache, has_length(1))
+
+    def test_it_should_format_date_header(self):
+        assert_that(date_header().decode('ascii'), matches_regexp(
+            r'^Date: \w{3}, \d{2} \w{3} \d{4} \d{2}:\d{2}:\d{2} GMT\r\n$'))
+
+
+class ServerCacheMixin(object):
+    def test_it_should_cache_static_responses(self):
+        with self.server_context() as server:
+            server.data.update(response_content=b'cached',
+                               response_headers={'X-Header': 'value'})
+
+            responses = [requests.get(server.url('/cached'))
+                         for _ in range(3)]
+
+            assert_that(server.response_cache, has_length(1))
+        for response in responses:
+            assert_that(response.content, is_(b'cached'))
+            assert_that(response.headers, has_entries({
+                'X-Header': 'value', 'Date': is_not(None)}))
+
+    def test_it_should_not_serve_stale_responses(self):
+        with self.server_context() as server:
+            server.data['response_headers'] = {'X-Header': 'first'}
+            first = requests.get(server.url('/cached'))
+
+            server.data['response_headers']['X-Header'] = 'second'
+            second = requests.get(server.url('/cached'))
+
+            server.routes.add('GET', '/cached', content=b'route')
+            third = requests.get(server.url('/cached'))
+
+        assert_that(first.headers['X-Header'], is_('first'))
+        assert_that(second.headers['X-Header'], is_('second'))
+        assert_that(third.content, is_(b'route'))
+
+    def test_it_should_not_cache_per_request_responses(self):
+        counter = iter(range(100))
+        with self.server_context() as server:
+            server.data['response_content'] = LazyValue(
+                lambda: str(next(counter)).encode('ascii'),
+                EVALUATE_PER_REQUEST)
+            server.routes.add('GET', '/route', response=lambda data, params:
+                              HttpResponse(200, (), b'built'))
+
+            responses = [requests.get(server.url(path))
+                         for path in ('/lazy', '/lazy', '/route', '/route')]
+
+            assert_that(server.response_cache, has_length(0))
+        assert_that([response.content for response in responses],
+                    contains_exactly(b'0', b'1', b'built', b'built'))
+
+    def test_it_should_not_cache_when_disabled(self):
+        with self.server_context(cache_responses=False) as server:
+            server.data['response_content'] = b'content'
+
+            response = requests.get(server.url('/cached'))
+
+            assert_that(server.response_cache, is_(none()))
+        assert_that(response.content, is_(b'content'))
+
+
+TestServerCache, TestAsyncServerCache = server_test_classes(ServerCacheMixin)
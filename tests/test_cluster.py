@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import os
+import requests
+from hamcrest import *
+
+from httptestserver import ServerCluster, start_cluster, http_cluster
+
+
+class TestCluster(object):
+    def test_it_should_serve_pushed_configuration(self):
+        self.cluster.configure(response_status=201, response_content=b'body')
+
+        responses = [requests.get(self.cluster.url('/')) for _ in range(10)]
+
+        assert_that(responses, only_contains(all_of(
+            has_property('status_code', 201),
+            has_property('content', b'body'))))
+
+    def test_it_should_gather_history_in_order(self):
+        for index in range(10):
+            requests.get(self.cluster.url('/{}'.format(index)))
+
+        history = self.cluster.history
+
+        assert_that([entry['path'] for entry in history],
+                    is_(['/{}'.format(index) for index in range(10)]))
+        assert_that(history, only_contains(
+            has_entries({'worker': is_in(self.cluster.pids),
+                         'command': 'GET'})))
+
+    def test_it_should_gather_last_request_data(self):
+        requests.post(self.cluster.url('/first'), data=b'one')
+        requests.post(self.cluster.url('/last'), data=b'two')
+
+        assert_that(self.cluster.data, has_entries({
+            'path': '/last', 'body': b'two'}))
+
+    def test_it_should_not_gather_unpicklable_values(self):
+        requests.get(self.cluster.url('/'))
+
+        assert_that(self.cluster.data, is_not(has_key('rfile')))
+
+    def test_it_should_reset_workers(self):
+        self.cluster.configure(response_status=404)
+        requests.get(self.cluster.url('/'))
+
+        self.cluster.reset()
+
+        assert_that(self.cluster.history, is_([]))
+        assert_that(requests.get(self.cluster.url('/')).status_code, is_(200))
+
+    @classmethod
+    def setupClass(cls):
+        cls.cluster = start_cluster(processes=2)
+
+    @classmethod
+    def teardownClass(cls):
+        cls.cluster.stop()
+
+    def setup(self):
+        self.cluster.reset()
+
+
+class TestClusterContext(object):
+    def test_it_should_start_and_stop_workers(self):
+        with http_cluster(processes=2) as cluster:
+            pids = cluster.pids
+            assert_that(cluster, is_(instance_of(ServerCluster)))
+            assert_that(pids, has_length(2))
+
+        assert_that(cluster.pids, is_([]))
+        for pid in pids:
+            assert_that(calling(os.kill).with_args(pid, 0), raises(OSError))
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+import time
+import threading
+
+import requests
+from hamcrest import *
+
+from httptestserver.config import (ResponseConfig, ServerData, RequestData,
+                                   LazyValue, EVALUATE_PER_REQUEST,
+                                   EVALUATE_CACHED)
+
+from server_classes import server_test_classes
+
+
+class TestResponseConfig(object):
+    def test_it_should_be_immutable(self):
+        config = ResponseConfig({'response_status': 201})
+
+        assert_that(calling(setattr).with_args(config, 'version', 2),
+                    raises(AttributeError))
+        assert_that(dict(config), is_({'response_status': 201}))
+
+    def test_it_should_replace_with_next_version(self):
+        config = ResponseConfig({'response_status': 201})
+
+        replaced = config.replace({'response_status': 202})
+
+        assert_that(replaced.version, is_(1))
+        assert_that(replaced['response_status'], is_(202))
+        assert_that(config['response_status'], is_(201))
+
+    def test_it_should_wrap_callables(self):
+        function = lambda: 201
+        config = ResponseConfig({'response_status': function})
+
+        assert_that(config['response_status'], all_of(
+            instance_of(LazyValue), has_property('function', function)))
+
+    def test_it_should_keep_wrappers_of_unchanged_callables(self):
+        config = ResponseConfig({'response_status': lambda: 201})
+
+        replaced = config.replace(dict(config, response_content=b''))
+
+        assert_that(replaced['response_status'],
+                    is_(config['response_status']))
+
+
+class TestLazyValue(object):
+    def setup(self):
+        self.calls = []
+
+    def function(self):
+        self.calls.append(None)
+        return len(self.calls)
+
+    def test_it_should_evaluate_once(self):
+        value = LazyValue(self.function)
+
+        assert_that([value(), value()], is_([1, 1]))
+
+    def test_it_should_evaluate_per_request(self):
+        value = LazyValue(self.function, EVALUATE_PER_REQUEST)
+
+        assert_that([value(), value()], is_([1, 2]))
+
+    def test_it_should_evaluate_when_expired(self):
+        value = LazyValue(self.function, EVALUATE_CACHED, ttl=0.05)
+
+        first, cached = value(), value()
+        time.sleep(0.1)
+
+        assert_that([first, cached, value()], is_([1, 1, 2]))
+        assert_that(value.evaluations, is_(2))
+
+    def test_it_should_reject_unknown_policies(self):
+        assert_that(calling(LazyValue).with_args(self.function, 'never'),
+                    raises(ValueError))
+        assert_that(
+            calling(LazyValue).with_args(self.function, EVALUATE_CACHED),
+            raises(ValueError))
+
+
+class TestRequestData(object):
+    def test_it_should_evaluate_values_on_read(self):
+        calls = []
+        config = ResponseConfig({
+            'response_status': LazyValue(lambda: calls.append(None) or 201,
+                                         EVALUATE_PER_REQUEST),
+            'response_content': lambda: calls.append(None) or b''})
+
+        data = RequestData(config, {'path': '/'})
+        statuses = [data['response_status'], data.get('response_status')]
+
+        assert_that(statuses, is_([201, 201]))
+        assert_that(calls, has_length(1))
+        assert_that(data.evaluated_config(), has_entries(
+            response_status=201, response_content=instance_of(LazyValue)))
+
+
+class TestServerData(object):
+    def setup(self):
+        self.data = ServerData()
+
+    def test_it_should_publish_config_changes(self):
+        self.data['response_status'] = 201
+        self.data.update(response_content=b'content', path='/')
+
+        assert_that(self.data.config.version, is_(2))
+        assert_that(dict(self.data.config), is_({
+            'response_status': 201, 'response_content': b'content'}))
+
+    def test_it_should_not_publish_state_changes(self):
+        self.data['path'] = '/'
+        self.data.mirror({'command': 'GET', 'response_status': 500})
+
+        assert_that(self.data.config.version, is_(0))
+        assert_that(self.data, is_({'path': '/', 'command': 'GET'}))
+
+    def test_it_should_keep_taken_snapshots(self):
+        self.data['response_status'] = 201
+        config = self.data.config
+
+        del self.data['response_status']
+
+        assert_that(config['response_status'], is_(201))
+        assert_that(self.data.config, is_(empty()))
+
+    def test_it_should_replace_config(self):
+        self.data.update(response_status=201, path='/')
+
+        self.data.replace_config({'response_content': b'content'})
+
+        assert_that(self.data, is_({'response_content': b'content',
+                                    'path': '/'}))
+        assert_that(dict(self.data.config), is_({
+            'response_content': b'content'}))
+
+    def test_it_should_not_call_callables(self):
+        calls = []
+        self.data['response_status'] = lambda: calls.append(None) or 201
+
+        self.data['response_content'] = b''
+
+        assert_that(calls, is_(empty()))
+        assert_that(self.data.config['response_status'],
+                    instance_of(LazyValue))
+
+
+class ServerConfigMixin(object):
+    def test_it_should_serve_with_published_config(self):
+        with self.server_context() as server:
+            config = server.configure(response_status=201,
+                                      response_content=b'created')
+
+            response = requests.get(server.url('/config'))
+
+        assert_that(config, has_entries(response_status=201))
+        assert_that(response.status_code, is_(201))
+        assert_that(response.content, is_(b'created'))
+
+    def test_it_should_keep_snapshot_during_request(self):
+        entered, released = threading.Event(), threading.Event()
+
+        def hook(request, response):
+            entered.set()
+            released.wait()
+
+        with self.server_context() as server:
+            server.configure(response_content=b'first')
+            server.register_hook('after_response', hook)
+            thread = threading.Thread(
+                target=lambda: responses.append(
+                    requests.get(server.url('/first'))))
+            responses = []
+            thread.start()
+
+            entered.wait(5)
+            server.configure(response_content=b'second')
+            released.set()
+            thread.join()
+
+        assert_that(responses[0].content, is_(b'first'))
+
+    def test_it_should_pass_request_data_to_hooks(self):
+        requests_data = []
+
+        with self.server_context() as server:
+            server.configure(response_status=201)
+            server.register_hook('before_response', requests_data.append)
+
+            requests.get(server.url('/first'))
+            requests.get(server.url('/second'))
+
+            assert_that(server.data, has_entries(path='/second'))
+        assert_that(requests_data, contains(
+            has_entries(path='/first', response_status=201),
+            has_entries(path='/second', response_status=201)))
+
+    def test_it_should_override_response_from_hooks(self):
+        def hook(request):
+            request['response_status'] = 202
+
+        with self.server_context() as server:
+            server.register_hook('before_response', hook)
+
+            response = requests.get(server.url('/hook'))
+
+            assert_that(server.config, is_(empty()))
+        assert_that(response.status_code, is_(202))
+
+    def test_it_should_evaluate_used_values_only(self):
+        calls = []
+
+        def evaluate(name, value):
+            return lambda: calls.append(name) or value
+
+        with self.server_context() as server:
+            server.configure(
+                response_content=evaluate('content', b'lazy'),
+                response_chunk_size=evaluate('chunk_size', 1))
+
+            responses = [requests.get(server.url('/lazy')) for _ in range(2)]
+
+            assert_that(server.history[0], has_entries(
+                response_content=b'lazy'))
+        assert_that([r.content for r in responses], is_([b'lazy', b'lazy']))
+        assert_that(calls, is_(['content']))
+
+    def test_it_should_evaluate_per_request(self):
+        counter = iter(range(1, 10))
+
+        with self.server_context() as server:
+            server.configure(response_content=LazyValue(
+                lambda: str(next(counter)).encode(), EVALUATE_PER_REQUEST))
+
+            responses = [requests.get(server.url('/lazy')) for _ in range(2)]
+
+            history = server.history
+        assert_that([r.content for r in responses], is_([b'1', b'2']))
+        assert_that([entry['response_content'] for entry in history],
+                    is_([b'1', b'2']))
+
+
+TestServerConfig, TestAsyncServerConfig = server_test_classes(
+    ServerConfigMixin)
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+import io
+import time
+import socket
+import pathlib
+import tempfile
+
+import requests
+from hamcrest import *
+
+from httptestserver.content import (stream_headers, encode_chunks,
+                                    iter_content)
+
+from server_classes import server_test_classes
+
+
+CONTENT = b'0123456789' * 1000
+
+
+def generate(content, size=1000):
+    for index in range(0, len(content), size):
+        yield content[index:index + size]
+
+
+class TestContent(object):
+    def test_it_should_frame_files_with_their_length(self):
+        with tempfile.TemporaryFile() as file:
+            file.write(CONTENT)
+            file.seek(10)
+
+            assert_that(stream_headers((), file),
+                        is_([('Content-Length', str(len(CONTENT) - 10))]))
+
+    def test_it_should_frame_iterables_as_chunked(self):
+        assert_that(stream_headers({}, generate(CONTENT)),
+                    is_([('Transfer-Encoding', 'chunked')]))
+
+    def test_it_should_keep_framing_headers(self):
+        headers = {'Content-Length': '10'}
+
+        assert_that(stream_headers(headers, generate(CONTENT)), is_([]))
+
+    def test_it_should_encode_chunks(self):
+        chunks = encode_chunks(iter_content([b'Wiki', b'', b'pedia']))
+
+        assert_that(b''.join(chunks),
+                    is_(b'4\r\nWiki\r\n5\r\npedia\r\n0\r\n\r\n'))
+
+    def test_it_should_read_files_in_chunks(self):
+        chunks = list(iter_content(io.BytesIO(CONTENT), 4096))
+
+        assert_that(chunks, has_length(3))
+        assert_that(b''.join(chunks), is_(CONTENT))
+
+
+class ServerContentMixin(object):
+    def setup(self):
+        self.file = tempfile.NamedTemporaryFile()
+        self.file.write(CONTENT)
+        self.file.flush()
+
+    def teardown(self):
+        self.file.close()
+
+    def test_it_should_stream_generators_chunked(self):
+        with self.server_context() as server:
+            server.data['response_content'] = generate(CONTENT)
+
+            response = requests.get(server.url('/download'))
+
+        assert_that(response.headers['Transfer-Encoding'], is_('chunked'))
+        assert_that(response.content, is_(CONTENT))
+
+    def test_it_should_stream_generators_with_known_length(self):
+        with self.server_context() as server:
+            server.data.update(
+                response_content=generate(CONTENT),
+                response_headers={'Content-Length': str(len(CONTENT))})
+
+            response = requests.get(server.url('/download'))
+
+        assert_that(response.headers, is_not(has_key('Transfer-Encoding')))
+        assert_that(response.content, is_(CONTENT))
+
+    def test_it_should_send_paths(self):
+        with self.server_context() as server:
+            server.data['response_content'] = pathlib.Path(self.file.name)
+
+            first = requests.get(server.url('/download'))
+            second = requests.get(server.url('/download'))
+
+        assert_that(first.headers['Content-Length'], is_(str(len(CONTENT))))
+        assert_that(first.content, is_(CONTENT))
+        assert_that(second.content, is_(CONTENT))
+
+    def test_it_should_send_files_from_their_position(self):
+        with self.server_context() as server:
+            self.file.seek(5000)
+            server.data['response_content'] = self.file
+
+            response = requests.get(server.url('/download'))
+
+        assert_that(response.content, is_(CONTENT[5000:]))
+
+    def test_it_should_not_send_stream_on_head(self):
+        with self.server_context() as server:
+            server.data['response_content'] = pathlib.Path(self.file.name)
+
+            response = requests.head(server.url('/download'))
+
+        assert_that(response.headers['Content-Length'], is_(str(len(CONTENT))))
+        assert_that(response.content, is_(b''))
+
+    def test_it_should_delay_chunks(self):
+        with self.server_context() as server:
+            server.data.update(response_content=pathlib.Path(self.file.name),
+                               response_chunk_size=2500,
+                               response_chunk_delay=0.05)
+
+            start = time.time()
+            response = requests.get(server.url('/download'))
+
+        assert_that(time.time() - start, is_(greater_than_or_equal_to(0.15)))
+        assert_that(response.content, is_(CONTENT))
+
+    def test_it_should_close_unframed_streams_for_http10(self):
+        with self.server_context() as server:
+            server.data['response_content'] = generate(CONTENT)
+
+            sock = socket.create_connection((server.host, server.port))
+            sock.sendall(b'GET /download HTTP/1.0\r\n\r\n')
+            response = b''.join(iter(lambda: sock.recv(4096), b''))
+            sock.close()
+
+        head, _, content = response.partition(b'\r\n\r\n')
+        head = head.decode('iso-8859-1')
+        assert_that(head.lower(), is_not(contains_string('chunked')))
+        assert_that(content, is_(CONTENT))
+
+
+TestServerContent, TestAsyncServerContent = server_test_classes(
+    ServerContentMixin)
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+from threading import Thread
+from hamcrest import *
+
+from httptestserver import HttpResponse
+from httptestserver.history import (ShardedHistory, RingHistory,
+                                    RequestCounters, ConnectionStats,
+                                    Histogram, TlsStats, LatencyStats,
+                                    PhaseTimings, RecordedRequest,
+                                    EVICT_NEWEST, hdr_bounds)
+
+
+class TestShardedHistory(object):
+    def test_it_should_be_initially_empty(self):
+        assert_that(self.history.snapshot(), is_([]))
+        assert_that(self.history, has_length(0))
+
+    def test_it_should_keep_entries_in_order(self):
+        for entry in range(10):
+            self.history.append(entry)
+
+        assert_that(self.history.snapshot(), is_(list(range(10))))
+
+    def test_it_should_merge_entries_from_threads_in_order(self):
+        def append(thread):
+            for index in range(500):
+                self.history.append((thread, index))
+
+        threads = [Thread(target=append, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        snapshot = self.history.snapshot()
+        assert_that(snapshot, has_length(4000))
+        for thread in range(8):
+            indexes = [index for owner, index in snapshot if owner == thread]
+            assert_that(indexes, is_(list(range(500))))
+
+    def test_it_should_clear_entries(self):
+        self.history.append('entry')
+
+        self.history.clear()
+
+        assert_that(self.history.snapshot(), is_([]))
+
+    def setup(self):
+        self.history = ShardedHistory(shards=4)
+
+
+class TestRingHistory(object):
+    def test_it_should_evict_oldest_entries(self):
+        history = RingHistory(3)
+
+        for entry in range(5):
+            history.append(entry)
+
+        assert_that(history.snapshot(), is_([2, 3, 4]))
+        assert_that(history.evicted, is_(2))
+
+    def test_it_should_drop_newest_entries(self):
+        history = RingHistory(3, EVICT_NEWEST)
+
+        for entry in range(5):
+            history.append(entry)
+
+        assert_that(history.snapshot(), is_([0, 1, 2]))
+        assert_that(history.evicted, is_(2))
+
+    def test_it_should_reject_unknown_policies(self):
+        assert_that(calling(RingHistory).with_args(3, 'random'),
+                    raises(ValueError))
+
+
+class TestRequestCounters(object):
+    def test_it_should_count_by_method_path_and_status(self):
+        counters = RequestCounters()
+
+        counters.count('GET', '/first?query=1', 200)
+        counters.count('GET', '/first', 404)
+        counters.count('POST', '/second', 200)
+
+        assert_that(counters.total, is_(3))
+        assert_that(counters.methods, has_entries({'GET': 2, 'POST': 1}))
+        assert_that(counters.paths, has_entries({'/first': 2, '/second': 1}))
+        assert_that(counters.statuses, has_entries({200: 2, 404: 1}))
+        assert_that(counters.requests, has_entry(('GET', '/first', 200), 1))
+
+
+class TestConnectionStats(object):
+    def test_it_should_aggregate_connections(self):
+        stats = ConnectionStats()
+
+        stats.count(3, 1.5)
+        stats.count(1, 0.5)
+        stats.count(0, 60.0)
+
+        assert_that(stats, has_properties({
+            'connections': 3,
+            'requests': 4,
+            'max_requests': 3,
+            'max_lifetime': 60.0,
+            'mean_lifetime': 62.0 / 3,
+            'reuse_ratio': 0.5}))
+
+    def test_it_should_count_active_connections_and_traffic(self):
+        stats = ConnectionStats(active=1)
+
+        stats.open()
+        stats.count_traffic(100, 2000)
+        stats.count_traffic(50, 0)
+        stats.count(2, 1.0)
+
+        assert_that(stats, has_properties({
+            'active': 1, 'received': 150, 'sent': 2000}))
+
+
+class TestHistogram(object):
+    def setup(self):
+        self.histogram = Histogram([0.1, 1.0])
+
+    def test_it_should_count_cumulative_buckets(self):
+        for value in [0.05, 0.1, 0.5, 5.0]:
+            self.histogram.observe(value)
+
+        assert_that(self.histogram.buckets, is_([
+            (0.1, 2), (1.0, 3), (float('inf'), 4)]))
+        assert_that(self.histogram, has_properties({
+            'count': 4, 'sum': 5.65, 'max': 5.0}))
+
+    def test_it_should_count_coarser_buckets(self):
+        histogram = Histogram(hdr_bounds(0.001, 1.0))
+        for value in [0.0012, 0.009, 0.05, 0.5, 5.0]:
+            histogram.observe(value)
+
+        buckets, count, total = histogram.cumulative([0.001, 0.01, 0.1])
+
+        assert_that(buckets, is_([(0.001, 0), (0.01, 2), (0.1, 3),
+                                  (float('inf'), 5)]))
+        assert_that(count, is_(5))
+        assert_that(total, close_to(5.5602, 0.0001))
+
+    def test_it_should_approximate_quantiles(self):
+        for value in [0.05] * 9 + [0.5]:
+            self.histogram.observe(value)
+
+        assert_that(self.histogram.quantile(0.5), is_(0.1))
+        assert_that(self.histogram.quantile(1), is_(1.0))
+
+    def test_it_should_have_no_quantiles_when_empty(self):
+        assert_that(self.histogram.quantile(0.5), is_(None))
+
+
+class TestHdrBounds(object):
+    def test_it_should_keep_significant_digits(self):
+        bounds = hdr_bounds(0.001, 1.0, digits=2)
+
+        assert_that(bounds, has_items(0.0011, 0.0099, 0.01, 0.011, 0.99, 1.0))
+        assert_that(bounds, has_length(270))
+        assert_that(bounds, is_(sorted(bounds)))
+
+    def test_it_should_quantile_with_precision(self):
+        histogram = Histogram(hdr_bounds())
+
+        for value in [0.00123] * 99 + [1.234]:
+            histogram.observe(value)
+
+        assert_that(histogram.quantile(0.5), close_to(0.00123, 0.0001))
+        assert_that(histogram.quantile(1), close_to(1.234, 0.1))
+
+
+class TestLatencyStats(object):
+    def setup(self):
+        self.stats = LatencyStats()
+
+    def test_it_should_keep_histograms_by_route_and_status(self):
+        self.stats.observe('GET /users/{id}', 200, 0.001)
+        self.stats.observe('GET /users/{id}', 200, 0.003)
+        self.stats.observe('GET /users/{id}', 404, 0.002)
+
+        assert_that(self.stats.keys(), is_([('GET /users/{id}', 200),
+                                            ('GET /users/{id}', 404)]))
+        assert_that(self.stats['GET /users/{id}', 200], has_properties({
+            'count': 2, 'max': 0.003}))
+
+    def test_it_should_summarize_histograms(self):
+        self.stats.observe('GET /', 200, 0.001)
+
+        assert_that(self.stats.summary(), has_entry(('GET /', 200), has_entries(
+            count=1, p50=close_to(0.001, 0.0001), p99=close_to(0.001, 0.0001),
+            p999=close_to(0.001, 0.0001), max=0.001)))
+
+    def test_it_should_be_reset(self):
+        self.stats.observe('GET /', 200, 0.001)
+
+        self.stats.reset()
+
+        assert_that(self.stats, has_length(0))
+
+
+class TestPhaseTimings(object):
+    def test_it_should_time_phases_in_order(self):
+        timings = PhaseTimings(started=10.0)
+        timings.marks.extend([('parse', 10.5), ('process_request', 12.0)])
+
+        assert_that(list(timings.durations.items()), is_([
+            ('parse', 0.5), ('process_request', 1.5)]))
+        assert_that(timings.timestamps, is_({'parse': 10.5,
+                                             'process_request': 12.0}))
+        assert_that(timings.total, is_(2.0))
+
+    def test_it_should_mark_phase_ends(self):
+        timings = PhaseTimings()
+
+        timings.mark('parse')
+
+        assert_that(timings.durations, has_entry('parse', greater_than(0)))
+
+
+class TestTlsStats(object):
+    def test_it_should_aggregate_handshakes(self):
+        stats = TlsStats()
+
+        stats.count(0.002, resumed=False)
+        stats.count(0.001, resumed=True)
+        stats.count_failure()
+        stats.count_failure(timeout=True)
+
+        assert_that(stats, has_properties({
+            'handshakes': 2,
+            'resumed': 1,
+            'failed': 2,
+            'timed_out': 1,
+            'resumption_ratio': 0.5,
+            'handshake_time': has_property('count', 2)}))
+
+
+class TestRecordedRequest(object):
+    def test_it_should_be_read_as_a_dict(self):
+        assert_that(self.record, has_entries({
+            'command': 'POST',
+            'path': '/path',
+            'request_version': 'HTTP/1.1',
+            'requestline': 'POST /path HTTP/1.1',
+            'headers': {'key': 'value'},
+            'body': b'body',
+            'client_address': ('127.0.0.1', 8888),
+            'timestamp': 1.5,
+            'response_status': 201,
+        }))
+
+    def test_it_should_be_immutable(self):
+        def set_path():
+            self.record.path = '/other'
+
+        assert_that(calling(set_path), raises(AttributeError))
+
+    def test_it_should_have_no_instance_dict(self):
+        assert_that(self.record, is_not(has_property('__dict__')))
+
+    def test_it_should_record_response_once(self):
+        self.record.complete(HttpResponse(201, {'key': 'value'}, b'content'))
+
+        assert_that(self.record.response, has_properties({
+            'status': 201, 'headers': {'key': 'value'}, 'length': 7}))
+        assert_that(calling(self.record.complete).with_args(
+            HttpResponse(200, (), None)), raises(AttributeError))
+
+    def setup(self):
+        self.record = RecordedRequest(
+            'POST', '/path', 'HTTP/1.1', {'key': 'value'}, b'body',
+            ('127.0.0.1', 8888), 1.5, {'response_status': 201})
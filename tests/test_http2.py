@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+import sys
+import time
+import socket
+import subprocess
+
+import h2.config
+import h2.events
+import h2.connection
+import requests
+from hamcrest import *
+
+from httptestserver import http_server, start_server, Server
+
+
+class Http2Client(object):
+    """Minimal prior knowledge HTTP/2 client"""
+    def __init__(self, server):
+        self.socket = socket.create_connection((server.host, server.port), 5)
+        self.h2 = h2.connection.H2Connection(
+            config=h2.config.H2Configuration(client_side=True,
+                                             header_encoding='utf-8'))
+        self.h2.initiate_connection()
+        self.socket.sendall(self.h2.data_to_send())
+        self.authority = '{}:{}'.format(server.host, server.port)
+
+    def request(self, method, path, body=None):
+        stream_id = self.h2.get_next_available_stream_id()
+        self.h2.send_headers(stream_id, [
+            (':method', method), (':path', path), (':scheme', 'http'),
+            (':authority', self.authority)], end_stream=body is None)
+        if body is not None:
+            self.h2.send_data(stream_id, body, end_stream=True)
+        self.socket.sendall(self.h2.data_to_send())
+        return stream_id
+
+    def responses(self, count):
+        """Responses of *count* streams, in the order they end"""
+        received = {}
+        ended = []
+        while len(ended) < count:
+            data = self.socket.recv(65535)
+            if not data:
+                break
+            for event in self.h2.receive_data(data):
+                if isinstance(event, h2.events.ResponseReceived):
+                    received[event.stream_id] = {
+                        'headers': dict(event.headers), 'content': b''}
+                elif isinstance(event, h2.events.DataReceived):
+                    received[event.stream_id]['content'] += event.data
+                    self.h2.acknowledge_received_data(
+                        event.flow_controlled_length, event.stream_id)
+                elif isinstance(event, h2.events.StreamEnded):
+                    ended.append(event.stream_id)
+            self.socket.sendall(self.h2.data_to_send())
+        return [(stream_id, received[stream_id]) for stream_id in ended]
+
+    def close(self):
+        self.h2.close_connection()
+        self.socket.sendall(self.h2.data_to_send())
+        self.socket.close()
+
+
+class TestHttp2(object):
+    def setup(self):
+        self.server = start_server(http2=True)
+        self.client = Http2Client(self.server)
+
+    def teardown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_it_should_serve_prior_knowledge_requests(self):
+        self.server.configure(response_status=201, response_content=b'h2',
+                              response_headers={'Connection': 'close'})
+
+        self.client.request('GET', '/h2')
+        [(_, response)] = self.client.responses(1)
+
+        assert_that(response['headers'], has_entries({
+            ':status': '201', 'content-length': '2'}))
+        assert_that(response['headers'], is_not(has_key('connection')))
+        assert_that(response['content'], is_(b'h2'))
+
+    def test_it_should_record_every_stream(self):
+        self.client.request('GET', '/first')
+        self.client.request('POST', '/second', body=b'body')
+        self.client.responses(2)
+
+        assert_that(self.server.history, contains_inanyorder(
+            has_entries(command='GET', path='/first',
+                        request_version='HTTP/2.0'),
+            has_entries(command='POST', path='/second', body=b'body',
+                        request_version='HTTP/2.0')))
+
+    def test_it_should_time_streams(self):
+        self.server.routes.add('GET', '/slow', delay=0.1)
+
+        self.client.request('GET', '/slow')
+        self.client.responses(1)
+
+        timings = self.server.history[0]['timings']
+        assert_that(timings.durations, has_entry(
+            'process_request', greater_than(0.09)))
+        assert_that(self.server.stats.keys(), contains(('GET /slow', 200)))
+
+    def test_it_should_not_block_streams_on_slow_ones(self):
+        self.server.routes.add('GET', '/slow', content=b'slow', delay=0.5)
+        self.server.routes.add('GET', '/fast', content=b'fast')
+
+        started = time.time()
+        slow = self.client.request('GET', '/slow')
+        fast = self.client.request('GET', '/fast')
+        responses = self.client.responses(2)
+
+        assert_that([stream_id for stream_id, _ in responses],
+                    is_([fast, slow]))
+        assert_that(time.time() - started, less_than(1))
+
+    def test_it_should_run_hooks_per_stream(self):
+        paths = []
+        self.server.register_hook('after_request',
+                                  lambda request, response:
+                                  paths.append(request['path']))
+
+        self.client.request('GET', '/first')
+        self.client.request('GET', '/second')
+        self.client.responses(2)
+
+        assert_that(paths, contains_inanyorder('/first', '/second'))
+
+
+class TestHttp2Fallback(object):
+    def test_it_should_serve_http1_clients(self):
+        with http_server(http2=True) as server:
+            response = requests.get(server.url('/http1'))
+
+            assert_that(server.history, contains(
+                has_entries(request_version='HTTP/1.1')))
+        assert_that(response.status_code, is_(200))
+
+    def test_it_should_not_be_imported_unless_enabled(self):
+        code = ('import sys, httptestserver; '
+                'print("httptestserver.http2" in sys.modules)')
+
+        output = subprocess.check_output([sys.executable, '-c', code])
+
+        assert_that(output.strip(), is_(b'False'))
+
+    def test_it_should_need_h2_package(self):
+        from httptestserver import http2
+
+        h2, http2.h2 = http2.h2, None
+        try:
+            assert_that(calling(Server).with_args('127.0.0.1', 0, http2=True),
+                        raises(ImportError))
+        finally:
+            http2.h2 = h2
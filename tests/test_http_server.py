@@ -1,13 +1,29 @@
 # -*- coding: utf-8 -*-
+import gc
+import io
+import sys
 import time
+import socket
+import logging
+import threading
 from hamcrest import *
 from nose.tools import assert_raises
 
 from httptestserver import (HttpTestServer, HttpsTestServer, Server,
-                            http_server, https_server, HttpResponse)
+                            http_server, https_server, HttpResponse,
+                            start_server)
+from httptestserver.config import RequestData, LazyValue
+from httptestserver.history import RecordedRequest
+from httptestserver.http_server import DEFAULT_BACKLOG
 import requests
 
 
+def live_instances(cls):
+    """Number of *cls* instances still referenced"""
+    gc.collect()
+    return sum(1 for obj in gc.get_objects() if isinstance(obj, cls))
+
+
 class ServerTestMixin(object):
     def request(self, *args, **kwargs):
         kwargs['verify'] = kwargs.get('verify', False)
@@ -42,6 +58,37 @@ class DataMixin(object):
             'client_address': contains('127.0.0.1', greater_than(0))
         }))
 
+    def test_it_should_observe_latency(self):
+        self.request('GET', self.server.url('/first'))
+        self.request('GET', self.server.url('/second'))
+
+        assert_that(self.server.latency, has_properties({
+            'count': 2, 'max': greater_than(0)}))
+
+    def test_it_should_time_request_phases(self):
+        self.request('POST', self.server.url('/timed'), data=b'body')
+
+        timings = self.server.history[0]['timings']
+        assert_that(list(timings.durations), has_items(
+            'parse', 'before_request', 'read_content', 'update_state',
+            'save_history', 'before_response', 'process_request',
+            'after_response', 'send_response'))
+        assert_that(timings.durations, has_entry(
+            'process_request', greater_than_or_equal_to(0)))
+
+    def test_it_should_keep_latency_stats_by_route(self):
+        self.server.routes.add('GET', '/users/{id}', status=201)
+
+        self.request('GET', self.server.url('/users/1'))
+        self.request('GET', self.server.url('/users/2'))
+        self.request('GET', self.server.url('/other?query'))
+        self.request('GET', self.server.url('/another'))
+
+        assert_that(self.server.stats.keys(), contains_inanyorder(
+            ('GET /users/{id}', 201), ('GET <unmatched>', 200)))
+        assert_that(self.server.stats['GET /users/{id}', 201].count, is_(2))
+        assert_that(self.server.stats['GET <unmatched>', 200].count, is_(2))
+
     def test_it_should_have_all_requests_stored(self):
         self.request('GET', self.server.url('/first'))
         self.request('POST', self.server.url('/second'), data=b'data')
@@ -307,6 +354,291 @@ class TestHttps(HttpsTestServer, ServerTestMixin, DataMixin,
     """Test https server"""
 
 
+class TestHttpPool(HttpTestServer, ServerTestMixin, DataMixin, MethodsMixin,
+                   ConnectionMixin, HttpErrorsMixin, HooksTestMixin):
+    """Test http server with a worker pool"""
+    server_options = {'workers': 4}
+
+
+class TestHttpKeepAlive(HttpTestServer, ServerTestMixin, DataMixin,
+                        MethodsMixin, ConnectionMixin, HttpErrorsMixin,
+                        HooksTestMixin):
+    """Test http server with persistent connections"""
+    server_options = {'keep_alive': True}
+
+
+class TestKeepAlive(object):
+    def test_it_should_reuse_connections(self):
+        with requests.Session() as session:
+            versions = [session.get(self.server.url(path)).raw.version
+                        for path in ('/first', '/second', '/third')]
+
+        self.wait_for(lambda: self.server.connection_stats.connections == 1)
+        assert_that(versions, only_contains(11))
+        assert_that(self.server.connection_stats, has_properties({
+            'requests': 3,
+            'max_requests': 3,
+            'requests_per_connection': 3.0,
+            'reuse_ratio': close_to(2 / 3.0, 0.01),
+            'mean_lifetime': greater_than(0)}))
+
+    def test_it_should_serve_pipelined_requests(self):
+        self.server.data['response_content'] = b'content'
+        sock = self.connect()
+
+        sock.sendall(b'GET /first HTTP/1.1\r\nHost: test\r\n\r\n'
+                     b'HEAD /second HTTP/1.1\r\nHost: test\r\n\r\n'
+                     b'POST /third HTTP/1.1\r\nHost: test\r\n'
+                     b'Content-Length: 4\r\n\r\nbody')
+        received = self.read_until(sock, 3)
+
+        assert_that(received.count('HTTP/1.1 200'), is_(3))
+        assert_that(received.count('\r\n\r\ncontent'), is_(2))
+        assert_that([entry['path'] for entry in self.server.history],
+                    is_(['/first', '/second', '/third']))
+
+    def test_it_should_close_after_max_requests(self):
+        self.server.max_requests = 2
+        sock = self.connect()
+
+        sock.sendall(b'GET /first HTTP/1.1\r\nHost: test\r\n\r\n' * 3)
+        received = self.read_until(sock, 3)
+
+        assert_that(received.count('HTTP/1.1 200'), is_(2))
+        assert_that(received, contains_string('Connection: close'))
+
+    def test_it_should_release_previous_requests(self):
+        with requests.Session() as session:
+            for _ in range(30):
+                session.post(self.server.url('/upload'), data=b'x' * 100000)
+
+            assert_that(live_instances(RequestData), less_than(5))
+        assert_that(self.server.data, is_not(has_key('request_data')))
+
+    def test_it_should_stop_with_open_connections(self):
+        sock = self.connect()
+        sock.sendall(b'GET / HTTP/1.1\r\nHost: test\r\n\r\n')
+        self.read_until(sock, 1)
+
+        started = time.time()
+        self.server.stop()
+        self.server.join(2)
+
+        assert_that(time.time() - started, less_than(1))
+        assert_that(self.server.is_alive(), is_(False))
+        assert_that(sock.recv(4096), is_(b''))
+        self.wait_for(lambda: self.server.connection_stats.active == 0)
+
+    def test_it_should_stop_pool_with_open_connections(self):
+        self.server.stop()
+        self.server = start_server(keep_alive=True, workers=2)
+        sock = self.connect()
+        sock.sendall(b'GET / HTTP/1.1\r\nHost: test\r\n\r\n')
+        self.read_until(sock, 1)
+
+        started = time.time()
+        self.server.stop()
+        self.server.join(2)
+
+        assert_that(time.time() - started, less_than(1))
+        assert_that(self.server.is_alive(), is_(False))
+
+    def test_it_should_close_idle_connections(self):
+        self.server.idle_timeout = 0.1
+        sock = self.connect()
+
+        sock.sendall(b'GET / HTTP/1.1\r\nHost: test\r\n\r\n')
+
+        self.wait_for(lambda: self.server.connection_stats.connections == 1)
+        assert_that(self.read_until(sock, 1), starts_with('HTTP/1.1 200'))
+
+    def connect(self):
+        sock = socket.create_connection((self.server.host, self.server.port))
+        sock.settimeout(2)
+        return sock
+
+    def read_until(self, sock, responses):
+        received = b''
+        while received.count(b'HTTP/1.1') < responses:
+            try:
+                data = sock.recv(4096)
+            except socket.timeout:
+                break
+            if not data:
+                break
+            received += data
+        return received.decode('ascii')
+
+    def wait_for(self, condition, timeout=2):
+        start = time.time()
+        while not condition() and time.time() - start < timeout:
+            time.sleep(0.01)
+        assert_that(condition(), is_(True))
+
+    def setup(self):
+        self.server = start_server(keep_alive=True)
+
+    def teardown(self):
+        self.server.stop()
+
+
+class TestHttpPoolCounters(object):
+    def test_it_should_reject_connections_when_queue_is_full(self):
+        entered, released = threading.Event(), threading.Event()
+
+        def hook():
+            entered.set()
+            released.wait()
+        self.server.register_hook('before_request', hook)
+
+        busy = self.send_request()          # held by the single worker
+        self.wait_for(entered.is_set)
+        queued = self.send_request()        # waits in the queue
+        self.wait_for(lambda: self.server.queue_depth == 1)
+        rejected = self.send_request()      # no room left
+        self.wait_for(lambda: self.server.rejected_connections == 1)
+
+        released.set()
+        assert_that(self.read(rejected), is_(''))
+        for sock in (busy, queued):
+            assert_that(self.read(sock), starts_with('HTTP/1.0 200'))
+
+    def test_it_should_size_listen_queue_without_workers(self):
+        with http_server(backlog=5) as server:
+            assert_that(server.request_queue_size, is_(5))
+        with http_server() as server:
+            assert_that(server.request_queue_size, is_(DEFAULT_BACKLOG))
+
+    def read(self, sock):
+        try:
+            return sock.recv(1024).decode('ascii')
+        except socket.error:  # connection reset
+            return ''
+
+    def send_request(self):
+        sock = socket.create_connection((self.server.host, self.server.port))
+        sock.sendall(b'GET / HTTP/1.0\r\n\r\n')
+        return sock
+
+    def wait_for(self, condition, timeout=2):
+        start = time.time()
+        while not condition() and time.time() - start < timeout:
+            time.sleep(0.01)
+        assert_that(condition(), is_(True))
+
+    def setup(self):
+        self.server = start_server(workers=1, backlog=1)
+
+    def teardown(self):
+        self.server.stop()
+
+
+class TestBoundedHistory(object):
+    def test_it_should_keep_last_requests(self):
+        for path in ('/first', '/second', '/third'):
+            requests.get(self.server.url(path))
+
+        assert_that(self.server.history, contains(
+            has_entries({'path': '/second'}),
+            has_entries({'path': '/third'})))
+        assert_that(self.server.history_evicted, is_(1))
+
+    def test_it_should_count_evicted_requests(self):
+        for path in ('/first', '/second', '/second'):
+            requests.get(self.server.url(path))
+
+        assert_that(self.server.counters.paths,
+                    has_entries({'/first': 1, '/second': 2}))
+        assert_that(self.server.counters.statuses, has_entries({200: 3}))
+
+    def test_it_should_reset_counters(self):
+        requests.get(self.server.url('/first'))
+
+        self.server.reset()
+
+        assert_that(self.server.counters.total, is_(0))
+
+    def setup(self):
+        self.server = start_server(history_size=2, history_counters=True)
+
+    def teardown(self):
+        self.server.stop()
+
+
+class TestHistoryEntries(object):
+    def test_it_should_record_compact_requests(self):
+        with http_server() as server:
+            server.data['response_status'] = 201
+            requests.post(server.url('/path'), data=b'body')
+
+            entry = server.history[0]
+
+        assert_that(entry, is_(instance_of(RecordedRequest)))
+        assert_that(entry, is_not(has_key('rfile')))
+        assert_that(entry.response, has_properties({
+            'status': 201, 'length': None}))
+
+    def test_it_should_keep_full_state_on_demand(self):
+        with http_server(full_history=True) as server:
+            server.data['response_status'] = LazyValue(lambda: 201)
+            requests.get(server.url('/path'))
+
+            entry = server.history[0]
+
+        assert_that(entry, has_entries({
+            'path': '/path', 'rfile': has_property('read'),
+            'response_status': 201}))
+
+
+class LogRecords(logging.Handler):
+    """Keeps the records of a logger at info level while in context"""
+    def __init__(self, name):
+        logging.Handler.__init__(self)
+        self.logger = logging.getLogger(name)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def __enter__(self):
+        self.level = self.logger.level
+        self.logger.setLevel(logging.INFO)
+        self.logger.addHandler(self)
+        return self.records
+
+    def __exit__(self, *exc_info):
+        self.logger.removeHandler(self)
+        self.logger.setLevel(self.level)
+
+
+class TestQuiet(object):
+    def test_it_should_log_requests_by_default(self):
+        with http_server() as server, LogRecords('httptestserver.http') as logs:
+            requests.get(server.url('/path'))
+
+        assert_that(logs, has_item(has_property(
+            'msg', 'Processing %s request')))
+
+    def test_it_should_skip_request_logs(self):
+        with http_server(quiet=True) as server, \
+                LogRecords('httptestserver.http') as logs:
+            requests.get(server.url('/path'), headers={'X-Test': '1'})
+            requests.post(server.url('/path'), data=b'body')
+
+        assert_that(logs, is_(empty()))
+
+    def test_it_should_not_write_access_lines(self):
+        stderr, sys.stderr = sys.stderr, io.StringIO()
+        try:
+            with http_server(quiet=True) as server:
+                requests.get(server.url('/quiet'))
+            output = sys.stderr.getvalue()
+        finally:
+            sys.stderr = stderr
+
+        assert_that(output, is_not(contains_string('/quiet')))
+
+
 class TestContexts(object):
     def test_it_starts_http_server(self):
         with http_server() as server:
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+import time
+import socket
+import smtplib
+
+import requests
+from hamcrest import *
+
+from httptestserver import start_server, start_smtp_server
+from httptestserver.history import Histogram
+from httptestserver.metrics import (render, histogram_samples, escape,
+                                    CONTENT_TYPE)
+
+
+def wait_for(condition, timeout=5):
+    """Waits for *condition* to be true on the server threads"""
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def samples(server):
+    """`dict` with the value of each sample line of the server metrics"""
+    lines = requests.get(server.metrics.url).text.splitlines()
+    return dict(line.rsplit(' ', 1) for line in lines
+                if not line.startswith('#'))
+
+
+class TestHttpMetrics(object):
+    def setup(self):
+        self.server = start_server(metrics_port=0, keep_alive=True)
+
+    def teardown(self):
+        self.server.stop()
+
+    def test_it_should_serve_metrics_on_a_side_port(self):
+        response = requests.get(self.server.metrics.url)
+
+        assert_that(self.server.metrics.port, is_not(self.server.port))
+        assert_that(response.headers['Content-Type'], is_(CONTENT_TYPE))
+        assert_that(response.text, contains_string(
+            '# TYPE httptestserver_requests_total counter'))
+        assert_that(self.server.history, is_(empty()))
+
+    def test_it_should_count_requests_by_route_and_status(self):
+        self.server.routes.add('GET', '/users/{id}', content=b'user')
+        requests.get(self.server.url('/users/1'))
+        requests.get(self.server.url('/users/2'))
+
+        assert_that(samples(self.server), has_entries({
+            'httptestserver_requests_total'
+            '{route="GET /users/{id}",status="200"}': '2',
+            'httptestserver_request_duration_seconds_count'
+            '{route="GET /users/{id}",status="200"}': '2',
+            'httptestserver_request_duration_seconds_bucket'
+            '{route="GET /users/{id}",status="200",le="+Inf"}': '2',
+            'httptestserver_history_size': '2'}))
+
+    def test_it_should_export_unmatched_paths_as_one_series(self):
+        for index in range(20):
+            requests.get(self.server.url('/unknown/{}'.format(index)))
+
+        text = requests.get(self.server.metrics.url).text
+        series = [line for line in text.splitlines()
+                  if line.startswith('httptestserver_requests_total{')]
+
+        assert_that(series, is_([
+            'httptestserver_requests_total'
+            '{route="GET <unmatched>",status="200"} 20']))
+        assert_that(text, is_not(contains_string('/unknown/')))
+
+    def test_it_should_count_connections_and_bytes(self):
+        session = requests.Session()
+        session.post(self.server.url('/upload'), data=b'x' * 1000)
+
+        metrics = samples(self.server)
+        assert_that(metrics['httptestserver_connections_in_flight'], is_('1'))
+        assert_that(int(metrics['httptestserver_received_bytes_total']),
+                    greater_than(1000))
+        assert_that(int(metrics['httptestserver_sent_bytes_total']),
+                    greater_than(0))
+
+        session.close()
+        wait_for(lambda: self.server.connection_stats.connections)
+        assert_that(samples(self.server), has_entries({
+            'httptestserver_connections_in_flight': '0',
+            'httptestserver_connections_total': '1'}))
+
+    def test_it_should_keep_active_connections_on_reset(self):
+        connection = socket.create_connection((self.server.host,
+                                               self.server.port))
+        wait_for(lambda: self.server.connection_stats.active)
+
+        self.server.reset()
+
+        assert_that(self.server.connection_stats.active, is_(1))
+        connection.close()
+
+    def test_it_should_not_serve_other_paths(self):
+        response = requests.get(self.server.metrics.url + '/other')
+
+        assert_that(response.status_code, is_(404))
+
+    def test_it_should_stop_along_with_the_server(self):
+        self.server.stop()
+        self.server.join()
+
+        assert_that(self.server.metrics.is_alive(), is_(False))
+
+
+class TestSmtpMetrics(object):
+    def setup(self):
+        self.server = start_smtp_server(metrics_port=0)
+
+    def teardown(self):
+        self.server.stop()
+
+    def test_it_should_count_connections_and_bytes(self):
+        client = smtplib.SMTP(self.server.host, self.server.port)
+        client.ehlo()
+        wait_for(lambda: self.server.connection_stats.active)
+
+        assert_that(samples(self.server), has_entries({
+            'httptestserver_connections_in_flight': '1',
+            'httptestserver_messages_total': '0'}))
+
+        client.quit()
+        wait_for(lambda: self.server.connection_stats.connections)
+        metrics = samples(self.server)
+        assert_that(metrics['httptestserver_connections_in_flight'], is_('0'))
+        assert_that(int(metrics['httptestserver_sent_bytes_total']),
+                    greater_than(0))
+
+    def test_it_should_count_messages(self):
+        client = smtplib.SMTP(self.server.host, self.server.port)
+        client.sendmail('me@host.com', ['you@host.com'], 'message')
+        client.quit()
+
+        assert_that(samples(self.server), has_entries({
+            'httptestserver_messages_total': '1',
+            'httptestserver_history_size': '1'}))
+
+
+class TestExposition(object):
+    def test_it_should_export_coarse_histogram_buckets(self):
+        histogram = Histogram([0.001, 0.01, 0.1])
+        for value in [0.0005, 0.005, 0.05, 5.0]:
+            histogram.observe(value)
+
+        result = histogram_samples(histogram, {'route': 'GET /'},
+                                   bounds=[0.01])
+
+        assert_that(result, is_([
+            ('_bucket', {'route': 'GET /', 'le': '0.01'}, 2),
+            ('_bucket', {'route': 'GET /', 'le': '+Inf'}, 4),
+            ('_sum', {'route': 'GET /'}, 5.0555),
+            ('_count', {'route': 'GET /'}, 4)]))
+
+    def test_it_should_escape_label_values(self):
+        assert_that(escape('a "b"\\\nc'), is_(r'a \"b\"\\\nc'))
+
+    def test_it_should_render_any_server_stats(self):
+        server = start_server()
+        try:
+            text = render(server)
+        finally:
+            server.stop()
+
+        assert_that(text, contains_string('httptestserver_threads '))
+        assert_that(text, ends_with('\n'))
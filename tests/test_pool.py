@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import requests
+from hamcrest import *
+
+from httptestserver import Server, start_server
+from httptestserver.http_server import DEFAULT_IDLE_TIMEOUT
+from httptestserver.pool import ServerPool
+
+
+class TestServerPool(object):
+    def setup(self):
+        self.pool = ServerPool()
+
+    def teardown(self):
+        self.pool.close()
+
+    def test_it_should_lease_started_servers(self):
+        server = self.pool.lease('http')
+
+        response = requests.get(server.url('/pooled'))
+
+        assert_that(response.status_code, is_(200))
+        assert_that(server, instance_of(Server))
+        self.pool.release(server)
+
+    def test_it_should_reuse_released_servers_reset(self):
+        server = self.pool.lease('http')
+        server.data['response_status'] = 201
+        requests.get(server.url('/first'))
+        self.pool.release(server)
+
+        reused = self.pool.lease('http')
+
+        assert_that(reused, is_(same_instance(server)))
+        assert_that(reused.history, is_(empty()))
+        assert_that(reused.config, is_(empty()))
+        assert_that(self.pool, has_properties({'started': 1, 'leases': 2}))
+        self.pool.release(reused)
+
+    def test_it_should_restore_settings_changed_by_tests(self):
+        server = self.pool.lease('http', max_requests=2)
+        server.max_requests = 1
+        server.idle_timeout = None
+        self.pool.release(server)
+
+        reused = self.pool.lease('http', max_requests=2)
+
+        assert_that(reused, has_properties({
+            'max_requests': 2, 'idle_timeout': DEFAULT_IDLE_TIMEOUT}))
+        self.pool.release(reused)
+
+    def test_it_should_lease_servers_by_options(self):
+        server = self.pool.lease('http')
+        self.pool.release(server)
+
+        other = self.pool.lease('http', keep_alive=True)
+
+        assert_that(other, is_not(same_instance(server)))
+        assert_that(other.keep_alive, is_(True))
+        self.pool.release(other)
+
+    def test_it_should_lease_different_servers_at_once(self):
+        first, second = self.pool.lease('http'), self.pool.lease('http')
+
+        assert_that(first, is_not(same_instance(second)))
+        self.pool.release(first)
+        self.pool.release(second)
+
+    def test_it_should_prewarm_servers(self):
+        self.pool.prewarm('http', count=2)
+
+        server = self.pool.lease('http')
+
+        assert_that(self.pool, has_properties({'started': 2, 'idle': 1}))
+        self.pool.release(server)
+
+    def test_it_should_stop_servers_not_leased(self):
+        server = start_server()
+
+        self.pool.release(server)
+
+        assert_that(self.pool.idle, is_(0))
+        server.join(5)
+        assert_that(server.is_alive(), is_(False))
+
+    def test_it_should_stop_idle_servers_when_closed(self):
+        self.pool.prewarm('smtp')
+        server = self.pool.lease('smtp')
+        self.pool.release(server)
+
+        self.pool.close()
+        server.join(5)
+
+        assert_that(server.is_alive(), is_(False))
+        assert_that(self.pool.idle, is_(0))
+
+    def test_it_should_reject_unknown_kinds(self):
+        assert_that(calling(self.pool.lease).with_args('ftp'),
+                    raises(ValueError))
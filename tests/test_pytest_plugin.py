@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import shutil
+import tempfile
+import textwrap
+import subprocess
+
+from hamcrest import *
+
+import httptestserver
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(
+    httptestserver.__file__)))
+
+TESTS = '''
+import requests
+
+servers = []
+
+
+def test_first(http_server):
+    servers.append(http_server)
+    http_server.data['response_status'] = 201
+    http_server.max_requests = 1
+
+    assert requests.get(http_server.url('/first')).status_code == 201
+
+
+def test_second(http_server):
+    servers.append(http_server)
+
+    assert requests.get(http_server.url('/second')).status_code == 200
+    assert http_server.history[0]['path'] == '/second'
+    assert http_server.max_requests is None
+
+
+def test_smtp(smtp_server):
+    assert smtp_server.history == []
+'''
+
+
+class TestPytestPlugin(object):
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, 'test_servers.py'), 'w') as f:
+            f.write(TESTS)
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def pytest(self, *args, **kwargs):
+        tests = kwargs.get('tests')
+        if tests is not None:
+            with open(os.path.join(self.directory, 'test_whole_session.py'), 'w') as f:
+                f.write(textwrap.dedent(tests))
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'pytest', '-p', 'httptestserver.pytest_plugin',
+             '-p', 'no:cacheprovider', '-v'] + list(args),
+            cwd=self.directory, env=env,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        output = process.communicate()[0].decode('utf-8')
+        return process.returncode, output
+
+    def test_it_should_reset_servers_between_tests(self):
+        status, output = self.pytest('test_servers.py')
+
+        assert_that(status, is_(0), output)
+        assert_that(output, contains_string('3 passed'))
+
+    def test_it_should_reuse_servers_for_the_session(self):
+        status, output = self.pytest(tests='''
+            from test_servers import servers
+
+            def test_same_server():
+                assert servers[0] is servers[1]
+                assert servers[0].is_alive()
+        ''')
+
+        assert_that(status, is_(0), output)
+
+    def test_it_should_set_the_scope_of_servers(self):
+        status, output = self.pytest(
+            '--httptestserver-scope=function', tests='''
+            from httptestserver.pool import pool
+
+            def test_leased_per_test():
+                assert pool.leases == 3
+        ''')
+
+        assert_that(status, is_(0), output)
+
+    def test_it_should_report_requests_per_test(self):
+        status, output = self.pytest('test_servers.py',
+                                     '--httptestserver-report')
+
+        assert_that(status, is_(0), output)
+        assert_that(output, string_contains_in_order(
+            'httptestserver',
+            'test_servers.py::test_first: 1 requests, latency mean',
+            'test_servers.py::test_smtp: 0 requests'))
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+import time
+
+import requests
+from hamcrest import *
+
+from httptestserver import HttpResponse
+from httptestserver.routing import RouteTable
+
+from server_classes import server_test_classes
+
+
+class TestRouteTable(object):
+    def setup(self):
+        self.routes = RouteTable()
+
+    def test_it_should_match_literal_paths(self):
+        route = self.routes.add('GET', '/users')
+
+        assert_that(self.routes.match('GET', '/users?page=2'),
+                    is_((route, {})))
+        assert_that(self.routes.match('GET', '/users/'), is_((None, None)))
+
+    def test_it_should_match_parameters(self):
+        route = self.routes.add('GET', '/users/{id}/posts/{post}')
+
+        assert_that(self.routes.match('GET', '/users/1/posts/2'),
+                    is_((route, {'id': '1', 'post': '2'})))
+        assert_that(self.routes.match('GET', '/users//posts/2'),
+                    is_((None, None)))
+
+    def test_it_should_prefer_literal_segments(self):
+        user = self.routes.add('GET', '/users/{id}')
+        me = self.routes.add('GET', '/users/me')
+
+        assert_that(self.routes.match('GET', '/users/me'), is_((me, {})))
+        assert_that(self.routes.match('GET', '/users/1')[0], is_(user))
+
+    def test_it_should_backtrack_to_parameters(self):
+        settings = self.routes.add('GET', '/users/{id}/settings')
+        self.routes.add('GET', '/users/me')
+
+        assert_that(self.routes.match('GET', '/users/me/settings'),
+                    is_((settings, {'id': 'me'})))
+
+    def test_it_should_match_by_method(self):
+        get = self.routes.add('GET', '/users')
+        other = self.routes.add(None, '/users')
+
+        assert_that(self.routes.match('get', '/users')[0], is_(get))
+        assert_that(self.routes.match('POST', '/users')[0], is_(other))
+
+    def test_it_should_replace_routes(self):
+        self.routes.add('GET', '/users', status=200)
+        route = self.routes.add('GET', '/users', status=500)
+
+        assert_that(list(self.routes), is_([route]))
+        assert_that(self.routes.match('GET', '/users')[0], is_(route))
+
+    def test_it_should_reject_conflicting_parameters(self):
+        self.routes.add('GET', '/users/{id}')
+
+        assert_that(calling(self.routes.add).with_args('GET', '/users/{name}'),
+                    raises(ValueError))
+
+    def test_it_should_count_calls(self):
+        route = self.routes.add('GET', '/users/{id}')
+
+        for path in ('/users/1', '/users/2', '/other'):
+            self.routes.match('GET', path)
+
+        assert_that(route.calls, is_(2))
+
+    def test_it_should_clear_routes(self):
+        self.routes.add('GET', '/users')
+
+        self.routes.clear()
+
+        assert_that(self.routes, has_length(0))
+        assert_that(self.routes.match('GET', '/users'), is_((None, None)))
+
+
+class ServerRoutingMixin(object):
+    def test_it_should_respond_with_routes(self):
+        with self.server_context() as server:
+            server.routes.add('GET', '/users/{id}', status=201,
+                              headers={'X-Route': 'user'}, content=b'user')
+
+            response = requests.get(server.url('/users/1'))
+
+        assert_that(response.status_code, is_(201))
+        assert_that(response.headers['X-Route'], is_('user'))
+        assert_that(response.content, is_(b'user'))
+
+    def test_it_should_fall_back_to_data(self):
+        with self.server_context() as server:
+            server.routes.add('GET', '/users/{id}', status=201)
+            server.data['response_content'] = b'data'
+
+            response = requests.get(server.url('/other'))
+
+        assert_that(response.status_code, is_(200))
+        assert_that(response.content, is_(b'data'))
+
+    def test_it_should_build_responses_with_params(self):
+        def user(request, params):
+            return HttpResponse(200, {}, params['id'].encode('ascii'))
+
+        with self.server_context() as server:
+            server.routes.add('GET', '/users/{id}', response=user)
+
+            response = requests.get(server.url('/users/42'))
+
+        assert_that(response.content, is_(b'42'))
+
+    def test_it_should_delay_routes(self):
+        with self.server_context() as server:
+            server.routes.add('GET', '/slow', delay=0.2)
+
+            start = time.time()
+            requests.get(server.url('/slow'))
+            elapsed = time.time() - start
+
+        assert_that(elapsed, is_(greater_than_or_equal_to(0.2)))
+
+    def test_it_should_reset_routes(self):
+        with self.server_context() as server:
+            server.routes.add('GET', '/users', status=201)
+
+            server.reset()
+
+            assert_that(requests.get(server.url('/users')).status_code,
+                        is_(200))
+
+
+TestServerRouting, TestAsyncServerRouting = server_test_classes(
+    ServerRoutingMixin)
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+import time
+
+import requests
+from hamcrest import *
+
+from httptestserver.shaping import NetworkProfile, find_profile
+
+from server_classes import server_test_classes
+
+
+CONTENT = b'0123456789' * 1000
+
+
+class TestShaper(object):
+    def test_it_should_wait_ttfb_only_on_first_write(self):
+        shaper = NetworkProfile(ttfb=0.5).shaper()
+
+        assert_that(shaper.write_schedule(b'head'), is_([(0.5, b'head')]))
+        assert_that(shaper.write_schedule(b'body'), is_([(0, b'body')]))
+
+    def test_it_should_split_writes_by_bandwidth(self):
+        shaper = NetworkProfile(bandwidth=1000).shaper()
+
+        schedule = shaper.write_schedule(CONTENT[:25])
+
+        assert_that(schedule, is_([(0.01, CONTENT[:10]),
+                                   (0.01, CONTENT[10:20]),
+                                   (0.005, CONTENT[20:25])]))
+
+    def test_it_should_compute_read_delays(self):
+        shaper = NetworkProfile(read_bandwidth=1000).shaper()
+
+        assert_that(shaper.read_delay(500), is_(0.5))
+
+    def test_it_should_be_deterministic_with_a_seed(self):
+        def delays(profile):
+            return [profile.shaper().jitter() for _ in range(10)]
+
+        for distribution in ('uniform', 'normal', 'exponential'):
+            first = NetworkProfile(jitter=0.1, distribution=distribution,
+                                   seed=42)
+            second = NetworkProfile(jitter=0.1, distribution=distribution,
+                                    seed=42)
+
+            assert_that(delays(first), is_(delays(second)))
+            assert_that(delays(first), only_contains(
+                greater_than_or_equal_to(0)))
+
+    def test_it_should_vary_jitter_between_requests(self):
+        profile = NetworkProfile(jitter=0.1, seed=42)
+
+        assert_that(profile.shaper().jitter(),
+                    is_not(profile.shaper().jitter()))
+
+    def test_it_should_reject_unknown_distributions(self):
+        assert_that(calling(NetworkProfile).with_args(distribution='pareto'),
+                    raises(ValueError))
+
+    def test_it_should_find_profiles_by_path(self):
+        slow, fast = NetworkProfile(bandwidth=10), NetworkProfile()
+        setting = {'/slow/*': slow, '/*': fast}
+
+        assert_that(find_profile(setting, '/slow/file?q=1'), is_(slow))
+        assert_that(find_profile(setting, '/other'), is_(fast))
+        assert_that(find_profile(slow, '/other'), is_(slow))
+        assert_that(find_profile({'/slow': slow}, '/other'), is_(none()))
+
+
+class ServerShapingMixin(object):
+    def test_it_should_delay_first_byte(self):
+        with self.server_context() as server:
+            server.data['response_profile'] = NetworkProfile(ttfb=0.2)
+
+            start = time.time()
+            requests.get(server.url('/slow'))
+            elapsed = time.time() - start
+
+        assert_that(elapsed, is_(greater_than_or_equal_to(0.2)))
+
+    def test_it_should_throttle_responses(self):
+        with self.server_context() as server:
+            server.data.update(
+                response_content=CONTENT,
+                response_profile=NetworkProfile(bandwidth=len(CONTENT) * 4))
+
+            start = time.time()
+            response = requests.get(server.url('/slow'))
+            elapsed = time.time() - start
+
+        assert_that(elapsed, is_(greater_than_or_equal_to(0.25)))
+        assert_that(response.content, is_(CONTENT))
+
+    def test_it_should_throttle_request_bodies(self):
+        with self.server_context() as server:
+            server.data['response_profile'] = NetworkProfile(
+                read_bandwidth=len(CONTENT) * 4)
+
+            start = time.time()
+            requests.post(server.url('/upload'), data=CONTENT)
+            elapsed = time.time() - start
+
+            assert_that(server.history[0]['body'], is_(CONTENT))
+        assert_that(elapsed, is_(greater_than_or_equal_to(0.25)))
+
+    def test_it_should_shape_by_path(self):
+        with self.server_context() as server:
+            server.data['response_profile'] = {
+                '/slow/*': NetworkProfile(ttfb=0.5)}
+
+            start = time.time()
+            requests.get(server.url('/fast'))
+            elapsed = time.time() - start
+
+        assert_that(elapsed, is_(less_than(0.5)))
+
+
+TestServerShaping, TestAsyncServerShaping = server_test_classes(
+    ServerShapingMixin)
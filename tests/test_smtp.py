@@ -1,11 +1,14 @@
 # -*- coding: utf-8 -*-
 
 import time
+import socket
 import smtplib
+import threading
 import email.message
 
 from hamcrest import (assert_that, is_, instance_of, greater_than,
-                      has_entries, contains, contains_string)
+                      less_than, has_entries, contains,
+                      contains_string, starts_with)
 
 from httptestserver import SmtpServer, SmtpTestServer, smtp_server
 from httptestserver.smtp_server import DEFAULT_HOST, DEFAULT_PORT
@@ -80,6 +83,128 @@ class TestSmtp(SmtpTestServer):
         smtp.sendmail(sender, recipients, message)
 
 
+class SmtpClient(object):
+    """Raw client which sends commands and reads the replies"""
+    def __init__(self, server):
+        self.socket = socket.create_connection((server.host, server.port), 5)
+        self.file = self.socket.makefile('rb')
+        self.greeting = self.reply()
+
+    def reply(self):
+        lines = [self.file.readline().decode('utf-8')]
+        while lines[-1][3:4] == '-':
+            lines.append(self.file.readline().decode('utf-8'))
+        return ''.join(lines)
+
+    def command(self, line):
+        self.socket.sendall(line.encode('utf-8') + b'\r\n')
+        return self.reply()
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+
+class TestSmtpSessions(object):
+    def setup(self):
+        self.server = SmtpServer(DEFAULT_HOST, DEFAULT_PORT,
+                                 data_size_limit=100)
+        self.server.start()
+        self.client = SmtpClient(self.server)
+
+    def teardown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_it_should_greet_clients(self):
+        assert_that(self.client.greeting, starts_with('220 '))
+
+    def test_it_should_advertise_extensions(self):
+        reply = self.client.command('EHLO client')
+
+        assert_that(reply, contains_string('250-SIZE 100'))
+        assert_that(reply, contains_string('250 8BITMIME'))
+
+    def test_it_should_remove_dot_stuffing(self):
+        self.client.command('HELO client')
+        self.client.command('MAIL FROM:<{}>'.format(SENDER))
+        self.client.command('RCPT TO:<{}>'.format(RECIPIENTS[0]))
+        self.client.command('DATA')
+
+        reply = self.client.command('Subject: dots\r\n\r\n..dotted\r\n.')
+
+        assert_that(reply, starts_with('250 '))
+        assert_that(self.server.data, has_entries({
+            'message_data': 'Subject: dots\n\n.dotted',
+            'recipients': [RECIPIENTS[0]]}))
+
+    def test_it_should_reject_large_messages(self):
+        self.client.command('HELO client')
+        self.client.command('MAIL FROM:<{}>'.format(SENDER))
+        self.client.command('RCPT TO:<{}>'.format(RECIPIENTS[0]))
+        self.client.command('DATA')
+
+        reply = self.client.command('x' * 200 + '\r\n.')
+
+        assert_that(reply, starts_with('552 '))
+        assert_that(self.server.history, is_([]))
+
+    def test_it_should_reject_commands_out_of_sequence(self):
+        assert_that(self.client.command('MAIL FROM:<{}>'.format(SENDER)),
+                    starts_with('503 '))
+        assert_that(self.client.command('DATA'), starts_with('503 '))
+
+    def test_it_should_reject_unknown_commands(self):
+        assert_that(self.client.command('HACK'), starts_with('500 '))
+
+    def test_it_should_serve_concurrent_sessions(self):
+        clients = [SmtpClient(self.server) for _ in range(200)]
+        try:
+            assert_that(clients[-1].greeting, starts_with('220 '))
+            assert_that(self.server.sessions, is_(201))
+        finally:
+            for client in clients:
+                client.close()
+
+    def test_it_should_accept_any_size_without_limit(self):
+        self.server.data_size_limit = None
+        client = SmtpClient(self.server)
+        try:
+            reply = client.command('EHLO client')
+        finally:
+            client.close()
+        sender = smtplib.SMTP(self.server.host, self.server.port)
+        sender.sendmail(SENDER, RECIPIENTS, 'x' * 200)
+        sender.quit()
+
+        assert_that(reply, contains_string('250-SIZE\r\n'))
+        assert_that(self.server.data, has_entries({
+            'message_data': 'x' * 200}))
+
+    def test_it_should_stop_at_once(self):
+        started = time.time()
+        self.server.stop()
+
+        assert_that(time.time() - started, less_than(0.1))
+        assert_that(self.server.is_alive(), is_(False))
+        assert_that(self.server.accepting, is_(False))
+
+
+class TestSmtpBoundedHistory(object):
+    def test_it_should_keep_last_messages(self):
+        server = SmtpServer(DEFAULT_HOST, DEFAULT_PORT, history_size=2)
+
+        for message in ('message 1', 'message 2', 'message 3'):
+            server.process_message(('127.0.0.1', 1), SENDER, RECIPIENTS,
+                                   message)
+        server.close()
+
+        assert_that(server.history, contains(
+            has_entries({'message_data': 'message 2'}),
+            has_entries({'message_data': 'message 3'})))
+        assert_that(server.history_evicted, is_(1))
+
+
 class TestServerContext(object):
     def test_it_should_give_a_server(self):
         with smtp_server() as server:
@@ -95,3 +220,16 @@ class TestServerContext(object):
 
         time.sleep(0.02)  # wait for the server to finish
         assert_that(server.is_alive(), is_(False))
+
+    def test_it_should_stop_server_failed_to_start(self):
+        server = SmtpServer(DEFAULT_HOST, DEFAULT_PORT)
+        server.socket.close()  # start_server fails on a closed socket
+        server.start()
+
+        stopping = threading.Thread(target=server.stop)
+        stopping.daemon = True
+        stopping.start()
+        stopping.join(5)
+
+        assert_that(stopping.is_alive(), is_(False))
+        assert_that(server.loop.is_closed(), is_(True))
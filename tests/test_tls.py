@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+import ssl
+import time
+import socket
+
+from hamcrest import *
+
+from httptestserver import https_server
+from httptestserver.http_server import DEFAULT_CERTFILE
+from httptestserver.tls import server_context
+
+
+def client_context():
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def wait_for(condition, timeout=5):
+    """Waits for *condition* to be true on the server threads"""
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def get(server, context, session=None):
+    """Makes a request on a new connection, returns its TLS session"""
+    connection = socket.create_connection((server.host, server.port), 5)
+    connection = context.wrap_socket(connection, session=session)
+    try:
+        connection.sendall(b'GET / HTTP/1.0\r\n\r\n')
+        while connection.recv(4096):
+            pass  # session tickets arrive along with the response
+        return connection.session
+    finally:
+        connection.close()
+
+
+class TestServerContext(object):
+    def test_it_should_be_cached_per_certificate_and_options(self):
+        context = server_context(DEFAULT_CERTFILE)
+
+        assert_that(server_context(DEFAULT_CERTFILE), is_(same_instance(context)))
+        assert_that(server_context(DEFAULT_CERTFILE, ciphers='ECDHE+AESGCM'),
+                    is_not(same_instance(context)))
+
+    def test_it_should_set_tls_versions(self):
+        context = server_context(DEFAULT_CERTFILE,
+                                 min_version=ssl.TLSVersion.TLSv1_2,
+                                 max_version=ssl.TLSVersion.TLSv1_2)
+
+        assert_that(context, has_properties({
+            'minimum_version': ssl.TLSVersion.TLSv1_2,
+            'maximum_version': ssl.TLSVersion.TLSv1_2}))
+
+    def test_it_should_disable_session_tickets(self):
+        context = server_context(DEFAULT_CERTFILE, session_tickets=0)
+
+        assert_that(context.options & ssl.OP_NO_TICKET, is_(ssl.OP_NO_TICKET))
+
+
+class TestTlsSessions(object):
+    def test_it_should_count_full_handshakes(self):
+        with https_server() as server:
+            get(server, client_context())
+            get(server, client_context())
+
+        assert_that(server.tls_stats, has_properties({
+            'handshakes': 2, 'resumed': 0, 'resumption_ratio': 0.0,
+            'handshake_time': has_property('count', 2)}))
+
+    def test_it_should_resume_sessions(self):
+        context = client_context()
+
+        with https_server() as server:
+            session = get(server, context)
+            get(server, context, session)
+
+        assert_that(server.tls_stats, has_properties({
+            'handshakes': 2, 'resumed': 1, 'resumption_ratio': 0.5}))
+
+    def test_it_should_resume_sessions_of_other_servers(self):
+        context = client_context()
+
+        with https_server() as first, https_server() as second:
+            get(second, context, get(first, context))
+
+        assert_that(second.tls_stats, has_property('resumed', 1))
+
+    def test_it_should_resume_tls12_sessions(self):
+        context = client_context()
+        context.maximum_version = ssl.TLSVersion.TLSv1_2
+
+        with https_server(max_version=ssl.TLSVersion.TLSv1_2) as server:
+            get(server, context, get(server, context))
+
+        assert_that(server.tls_stats, has_property('resumed', 1))
+
+    def test_it_should_count_failed_handshakes(self):
+        context = client_context()
+        context.minimum_version = ssl.TLSVersion.TLSv1_3
+
+        with https_server(max_version=ssl.TLSVersion.TLSv1_2) as server:
+            assert_that(calling(get).with_args(server, context),
+                        raises(ssl.SSLError))
+            wait_for(lambda: server.tls_stats.failed)
+
+        assert_that(server.tls_stats, has_properties({
+            'failed': 1, 'timed_out': 0}))
+
+
+class TestTlsHandshakes(object):
+    def test_it_should_accept_while_handshakes_stall(self):
+        with https_server() as server:
+            stalled = socket.create_connection((server.host, server.port))
+
+            get(server, client_context())
+
+            assert_that(server.tls_stats, has_property('handshakes', 1))
+            stalled.close()
+
+    def test_it_should_time_out_stalled_handshakes(self):
+        with https_server(handshake_timeout=0.1) as server:
+            stalled = socket.create_connection((server.host, server.port))
+
+            wait_for(lambda: server.tls_stats.timed_out)
+
+            assert_that(stalled.recv(1), is_(b''))
+            stalled.close()
+        assert_that(server.tls_stats, has_properties({
+            'handshakes': 0, 'failed': 1, 'timed_out': 1}))